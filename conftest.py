@@ -0,0 +1,7 @@
+import sys
+import pathlib
+
+# 添加源文件路径到sys.path，pytest每个会话只执行一次，已存在时不重复添加
+SRC_DIR = str(pathlib.Path(__file__).parent)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -1,15 +1,36 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import mplfinance as mpf
 from matplotlib.ticker import MultipleLocator, FormatStrFormatter
 import logging
 import sys
+import time
 import argparse
 import urllib.request
+import urllib.error
 import json
-from tqdm import tqdm
+import re
+from io import StringIO
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # requests为可选依赖，未安装时使用urllib
+    requests = None
+
+try:
+    from numba import njit
+except ImportError:  # numba为可选依赖，未安装时退化为普通Python函数
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,6 +49,55 @@ API_CONFIG = {
     'DEFAULT_KLINE_SCALE': 1
 }
 
+# 东方财富K线时间字段格式（按klt周期参数区分分钟线和日/周/月线）
+KLINE_DATETIME_FORMATS = {
+    1: '%Y-%m-%d %H:%M',
+    5: '%Y-%m-%d %H:%M',
+    15: '%Y-%m-%d %H:%M',
+    30: '%Y-%m-%d %H:%M',
+    60: '%Y-%m-%d %H:%M',
+    101: '%Y-%m-%d',
+    102: '%Y-%m-%d',
+    103: '%Y-%m-%d'
+}
+
+# HTTP请求头，模拟真实浏览器访问
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': '*/*',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive'
+}
+
+
+def _create_http_session():
+    """创建带连接池的requests会话，所有请求共享TCP/TLS连接"""
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+HTTP_SESSION = _create_http_session() if requests is not None else None
+
+# 网络请求异常类型
+NETWORK_ERRORS = (urllib.error.URLError,) if requests is None else (urllib.error.URLError, requests.exceptions.RequestException)
+
+# K线周期（klt）对应的秒数，用于确定响应缓存的有效期
+KLINE_PERIOD_SECONDS = {
+    1: 60,
+    5: 300,
+    15: 900,
+    30: 1800,
+    60: 3600,
+    101: 86400,
+    102: 604800,
+    103: 2592000
+}
+
 # 缠论参数配置
 CHANLUN_CONFIG = {
     'FRACTAL_BAR_COUNT': 2,
@@ -44,8 +114,488 @@ VISUAL_CONFIG = {
     'VOLUME_ENABLED': True
 }
 
+# 笔方向编码
+DIRECTION_UP = 1
+DIRECTION_DOWN = -1
+
+# 分型类型编码
+FRACTAL_TOP = 1
+FRACTAL_BOTTOM = 0
+
+
+@njit(cache=True)
+def _filter_alternation(kind, price):
+    """
+    分型顶底交替过滤的数值内核
+    
+    参数:
+    kind: 按K线位置排序后的分型类型数组（int8，1为顶分型，0为底分型）
+    price: 对应的分型价格数组
+    
+    返回:
+    保留标记数组（bool），连续同类分型只保留价格最极端的一个
+    """
+    n = kind.shape[0]
+    keep = np.zeros(n, dtype=np.bool_)
+    last = -1
+    last_kind = -1
+    last_price = 0.0
+    for i in range(n):
+        t = kind[i]
+        p = price[i]
+        if last == -1 or t != last_kind:
+            keep[i] = True
+            last = i
+            last_kind = t
+            last_price = p
+        # 顶分型sign为1、底分型为-1，一次乘法比较即可判断新分型是否更极端
+        elif (2 * t - 1) * (p - last_price) > 0:
+            keep[last] = False
+            keep[i] = True
+            last = i
+            last_price = p
+    return keep
+
+
+@njit(cache=True)
+def _argmin3(x0, x1, x2):
+    """
+    三个数中最小值的位置，与min()一致，相同时取靠前的位置
+    
+    参数:
+    x0, x1, x2: 待比较的三个数
+    
+    返回:
+    最小值的位置（0、1或2）
+    """
+    pos = 0
+    lowest = x0
+    if x1 < lowest:
+        pos = 1
+        lowest = x1
+    if x2 < lowest:
+        pos = 2
+    return pos
+
+
+@njit(cache=True)
+def _validate_pens_kernel(direction, end_price, pct, length, max_iterations):
+    """
+    笔验证的数值内核，依次完成同向笔合并、短笔过滤和方向交替检查
+    
+    参数:
+    direction: 笔方向数组（int8，1为向上，-1为向下）
+    end_price: 笔结束价格数组
+    pct: 笔价格变动百分比数组
+    length: 笔长度数组
+    max_iterations: 方向交替检查的最大迭代次数
+    
+    返回:
+    保留下来的笔在原数组中的位置（int64数组）
+    """
+    n = direction.shape[0]
+    keep = np.empty(n, dtype=np.int64)
+    
+    # 阶段1：合并同向笔，保留价格变动更大且端点更极端的笔
+    keep[0] = 0
+    count = 1
+    for i in range(1, n):
+        last = keep[count - 1]
+        if direction[i] == direction[last]:
+            if pct[i] > pct[last]:
+                if direction[i] == 1:
+                    if end_price[i] > end_price[last]:
+                        keep[count - 1] = i
+                elif end_price[i] < end_price[last]:
+                    keep[count - 1] = i
+        else:
+            keep[count] = i
+            count += 1
+    
+    # 阶段2与阶段3合并为一次遍历：读取待处理的笔时直接跳过长度不足1根K线的笔，
+    # 不再单独压缩数组；所有删除都通过读写指针原地完成，没有逐个移动元素的操作
+    # 阶段3：确保笔的方向严格交替，每次移除三笔中价格变动最小的一笔
+    # 单遍栈算法：keep[:top]为已确认方向交替的栈，keep[r:count]为待处理的笔。
+    # 入栈时若与栈顶同向，则最左侧的违规三笔组合必然是栈顶附近的三笔（栈内无违规），
+    # 移除其中价格变动最小的一笔后，把被移除位置之后的笔退回待处理区重新入栈。
+    # 这与原先“每轮从头扫描、移除最左侧违规组合中的最弱笔”的不动点迭代逐步等价，
+    # 且每轮最多移除一笔，因此max_iterations即为最多移除的笔数。
+    top = 0
+    r = 0
+    removed = 0
+    while r < count:
+        if length[keep[r]] < 1:
+            r += 1
+            continue
+        keep[top] = keep[r]
+        top += 1
+        r += 1
+        if removed >= max_iterations or top < 2:
+            continue
+        if direction[keep[top - 2]] != direction[keep[top - 1]]:
+            continue
+        # 违规出现在最前面两笔时，需要再取一笔凑成三笔组合；不足三笔时原逻辑不再处理
+        if top == 2:
+            while r < count and length[keep[r]] < 1:
+                r += 1
+            if r >= count:
+                break
+            keep[top] = keep[r]
+            top += 1
+            r += 1
+        w = top - 3
+        drop = w + _argmin3(pct[keep[w]], pct[keep[w + 1]], pct[keep[w + 2]])
+        # 栈中keep[:top - 2]一定方向交替，回退到该位置与被移除位置中的较小者
+        rollback = min(drop, top - 2)
+        # 将回退区间内未被移除的笔按原顺序退回待处理区（从后往前复制避免覆盖）
+        for j in range(top - 1, rollback - 1, -1):
+            if j != drop:
+                r -= 1
+                keep[r] = keep[j]
+        top = rollback
+        removed += 1
+    
+    return keep[:top]
+
+
+
+@njit(cache=True)
+def _merge_centrals_kernel(high, low, start_index, end_index, max_gap):
+    """
+    中枢合并的数值内核，按顺序把候选中枢并入第一个与之重叠的已有中枢
+    
+    候选中枢需按起始位置非递减排列（由笔的顺序保证）
+    
+    参数:
+    high: 候选中枢上沿数组
+    low: 候选中枢下沿数组
+    start_index: 候选中枢起始K线位置数组
+    end_index: 候选中枢结束K线位置数组
+    max_gap: 判定时间范围连续时允许的最大K线间隔
+    
+    返回:
+    (每个候选中枢归属的中枢编号, 合并后中枢上沿, 合并后中枢下沿, 合并后中枢结束位置)
+    """
+    n = high.shape[0]
+    owner = np.empty(n, dtype=np.int64)
+    merged_high = np.empty_like(high)
+    merged_low = np.empty_like(low)
+    merged_start = np.empty_like(start_index)
+    merged_end = np.empty_like(end_index)
+    count = 0
+    # 候选中枢按起始位置递增，结束位置早于当前起始位置减max_gap的中枢之后不可能再被合并
+    # （其结束位置只会在合并时增长，而合并本身要求满足同一条件）。
+    # 按创建顺序维护仍可能被合并的中枢编号列表，扫描时顺带原地剔除已失效的中枢，
+    # 既保证命中的是创建顺序中第一个重叠的中枢，又让每次只扫描时间上相邻的少量中枢
+    active = np.empty(n, dtype=np.int64)
+    n_active = 0
+    for i in range(n):
+        target = -1
+        kept = 0
+        for r in range(n_active):
+            k = active[r]
+            if merged_end[k] < start_index[i] - max_gap:
+                continue
+            active[kept] = k
+            kept += 1
+            if target != -1:
+                continue
+            # 价格范围重叠且时间范围连续或重叠
+            if merged_high[k] < low[i] or merged_low[k] > high[i]:
+                continue
+            if merged_start[k] > end_index[i] + max_gap:
+                continue
+            target = k
+        n_active = kept
+        if target == -1:
+            merged_high[count] = high[i]
+            merged_low[count] = low[i]
+            merged_start[count] = start_index[i]
+            merged_end[count] = end_index[i]
+            owner[i] = count
+            active[n_active] = count
+            n_active += 1
+            count += 1
+        else:
+            merged_high[target] = max(merged_high[target], high[i])
+            merged_low[target] = min(merged_low[target], low[i])
+            merged_end[target] = max(merged_end[target], end_index[i])
+            owner[i] = target
+    return owner, merged_high[:count], merged_low[:count], merged_end[:count]
+
+
+@njit(cache=True)
+def _ewm_step(weighted, old_wt, cur, alpha):
+    """
+    指数加权移动平均的单步递推，与pandas的ewm(adjust=False).mean()逐位一致
+    
+    参数:
+    weighted: 上一步的加权平均值（尚无有效值时为NaN）
+    old_wt: 上一步的历史权重
+    cur: 当前值
+    alpha: 平滑系数
+    
+    返回:
+    (当前加权平均值, 当前历史权重)
+    """
+    if weighted == weighted:
+        old_wt *= 1.0 - alpha
+        if cur == cur:
+            if weighted != cur:
+                weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+            old_wt = 1.0
+    elif cur == cur:
+        weighted = cur
+    return weighted, old_wt
+
+
+@njit(cache=True)
+def _macd_kernel(close, alpha_fast, alpha_slow, alpha_signal):
+    """
+    MACD的数值内核，一次遍历同时计算快慢EMA、DIF和DEA
+    
+    参数:
+    close: 收盘价数组（float64）
+    alpha_fast: 快速EMA平滑系数
+    alpha_slow: 慢速EMA平滑系数
+    alpha_signal: 信号线平滑系数
+    
+    返回:
+    (快速EMA, 慢速EMA, DIF, DEA)
+    """
+    n = close.shape[0]
+    ema_fast = np.empty(n)
+    ema_slow = np.empty(n)
+    dif = np.empty(n)
+    dea = np.empty(n)
+    fast, fast_wt = np.nan, 1.0
+    slow, slow_wt = np.nan, 1.0
+    signal, signal_wt = np.nan, 1.0
+    for i in range(n):
+        fast, fast_wt = _ewm_step(fast, fast_wt, close[i], alpha_fast)
+        slow, slow_wt = _ewm_step(slow, slow_wt, close[i], alpha_slow)
+        ema_fast[i] = fast
+        ema_slow[i] = slow
+        dif[i] = fast - slow
+        signal, signal_wt = _ewm_step(signal, signal_wt, dif[i], alpha_signal)
+        dea[i] = signal
+    return ema_fast, ema_slow, dif, dea
+
+
+@njit(cache=True, error_model='numpy')
+def _kdj_kernel(high, low, close, window, alpha_k, alpha_d):
+    """
+    KDJ的数值内核，一次遍历完成滚动最高/最低价、RSV和K、D、J的计算
+    
+    参数:
+    high: 最高价数组（float64）
+    low: 最低价数组（float64）
+    close: 收盘价数组（float64）
+    window: RSV计算周期
+    alpha_k: K线平滑系数
+    alpha_d: D线平滑系数
+    
+    返回:
+    (n日最高价, n日最低价, RSV, K, D, J)
+    """
+    n = close.shape[0]
+    highest = np.empty(n)
+    lowest = np.empty(n)
+    rsv = np.empty(n)
+    k = np.empty(n)
+    d = np.empty(n)
+    j = np.empty(n)
+    # 单调队列保存窗口内候选极值的位置，每个位置最多入队出队一次
+    max_queue = np.empty(n, dtype=np.int64)
+    min_queue = np.empty(n, dtype=np.int64)
+    max_head = max_tail = 0
+    min_head = min_tail = 0
+    # 与pandas的rolling一致，窗口内存在NaN时结果为NaN
+    last_nan_high = -1
+    last_nan_low = -1
+    k_val, k_wt = np.nan, 1.0
+    d_val, d_wt = np.nan, 1.0
+    for i in range(n):
+        h = high[i]
+        if h == h:
+            while max_tail > max_head and high[max_queue[max_tail - 1]] <= h:
+                max_tail -= 1
+            max_queue[max_tail] = i
+            max_tail += 1
+        else:
+            last_nan_high = i
+        while max_tail > max_head and max_queue[max_head] <= i - window:
+            max_head += 1
+        
+        lo = low[i]
+        if lo == lo:
+            while min_tail > min_head and low[min_queue[min_tail - 1]] >= lo:
+                min_tail -= 1
+            min_queue[min_tail] = i
+            min_tail += 1
+        else:
+            last_nan_low = i
+        while min_tail > min_head and min_queue[min_head] <= i - window:
+            min_head += 1
+        
+        if i >= window - 1 and i - last_nan_high >= window:
+            highest[i] = high[max_queue[max_head]]
+        else:
+            highest[i] = np.nan
+        if i >= window - 1 and i - last_nan_low >= window:
+            lowest[i] = low[min_queue[min_head]]
+        else:
+            lowest[i] = np.nan
+        
+        rsv[i] = (close[i] - lowest[i]) / (highest[i] - lowest[i]) * 100
+        k_val, k_wt = _ewm_step(k_val, k_wt, rsv[i], alpha_k)
+        d_val, d_wt = _ewm_step(d_val, d_wt, k_val, alpha_d)
+        k[i] = k_val
+        d[i] = d_val
+        j[i] = 3 * k_val - 2 * d_val
+    return highest, lowest, rsv, k, d, j
+
+@dataclass
+class FractalArrays:
+    """
+    分型的列式存储，每个字段为等长数组
+    
+    index: 分型所在K线的位置（int64）
+    price: 分型价格（顶分型为最高价，底分型为最低价）
+    kind: 分型类型编码（int8，FRACTAL_TOP/FRACTAL_BOTTOM）
+    datetime: 分型所在K线的时间
+    """
+    index: np.ndarray
+    price: np.ndarray
+    kind: np.ndarray
+    datetime: pd.Index
+    
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64),
+                   np.empty(0, dtype=np.int8), pd.Index([]))
+    
+    def __len__(self):
+        return len(self.index)
+    
+    def take(self, positions):
+        """按位置或布尔掩码选取子集"""
+        return FractalArrays(self.index[positions], self.price[positions], self.kind[positions], self.datetime[positions])
+
+
+
+@dataclass(slots=True)
+class Pen:
+    """
+    单笔记录，由PenArrays按需生成，字段与旧版笔字典的键一致
+    
+    需要字典或JSON格式时使用dataclasses.asdict转换
+    """
+    start_index: int
+    start_datetime: pd.Timestamp
+    start_price: float
+    start_type: str
+    end_index: int
+    end_datetime: pd.Timestamp
+    end_price: float
+    end_type: str
+    direction: str
+    length: int
+    price_change: float
+    price_change_percent: float
+    high: float
+    low: float
+
+@dataclass
+class PenArrays:
+    """
+    笔的列式存储，每个字段为等长数组
+    
+    start_index/end_index: 起止分型所在K线的位置（int64）
+    start_price/end_price: 起止价格
+    start_type/end_type: 起止分型类型编码（int8，FRACTAL_TOP/FRACTAL_BOTTOM）
+    direction: 笔方向编码（int8，DIRECTION_UP/DIRECTION_DOWN）
+    price_change_percent: 价格变动百分比
+    start_datetime/end_datetime: 起止时间
+    high/low: 笔的最高价和最低价，在创建时由起止价格计算一次
+    length: 笔跨越的K线数量，在创建时计算一次
+    """
+    start_index: np.ndarray
+    end_index: np.ndarray
+    start_price: np.ndarray
+    end_price: np.ndarray
+    start_type: np.ndarray
+    end_type: np.ndarray
+    direction: np.ndarray
+    price_change_percent: np.ndarray
+    start_datetime: pd.Index
+    end_datetime: pd.Index
+    high: np.ndarray = field(init=False)
+    low: np.ndarray = field(init=False)
+    length: np.ndarray = field(init=False)
+    
+    def __post_init__(self):
+        self.high = np.maximum(self.start_price, self.end_price)
+        self.low = np.minimum(self.start_price, self.end_price)
+        self.length = np.abs(self.end_index - self.start_index)
+    
+    @classmethod
+    def empty(cls):
+        return cls.from_dicts([])
+    
+    @classmethod
+    def from_dicts(cls, pens):
+        """由旧版的笔字典列表（或Pen记录列表）构建"""
+        pens = [asdict(p) if isinstance(p, Pen) else p for p in pens]
+        n = len(pens)
+        return cls(np.fromiter((p['start_index'] for p in pens), dtype=np.int64, count=n),
+                   np.fromiter((p['end_index'] for p in pens), dtype=np.int64, count=n),
+                   np.fromiter((p['start_price'] for p in pens), dtype=np.float64, count=n),
+                   np.fromiter((p['end_price'] for p in pens), dtype=np.float64, count=n),
+                   np.fromiter((FRACTAL_TOP if p['start_type'] == 'top' else FRACTAL_BOTTOM for p in pens), dtype=np.int8, count=n),
+                   np.fromiter((FRACTAL_TOP if p['end_type'] == 'top' else FRACTAL_BOTTOM for p in pens), dtype=np.int8, count=n),
+                   np.fromiter((DIRECTION_UP if p['direction'] == 'up' else DIRECTION_DOWN for p in pens), dtype=np.int8, count=n),
+                   np.fromiter((p['price_change_percent'] for p in pens), dtype=np.float64, count=n),
+                   pd.Index([p['start_datetime'] for p in pens]),
+                   pd.Index([p['end_datetime'] for p in pens]))
+    
+    def __len__(self):
+        return len(self.start_index)
+    
+    @property
+    def price_change(self):
+        """笔的价格变动幅度"""
+        return np.abs(self.end_price - self.start_price)
+    
+    def take(self, positions):
+        """按位置或布尔掩码选取子集"""
+        return PenArrays(self.start_index[positions], self.end_index[positions],
+                         self.start_price[positions], self.end_price[positions],
+                         self.start_type[positions], self.end_type[positions],
+                         self.direction[positions], self.price_change_percent[positions],
+                         self.start_datetime[positions], self.end_datetime[positions])
+    
+    def to_records(self):
+        """转换为Pen记录列表"""
+        start_types = np.where(self.start_type == FRACTAL_TOP, 'top', 'bottom').tolist()
+        end_types = np.where(self.end_type == FRACTAL_TOP, 'top', 'bottom').tolist()
+        directions = np.where(self.direction == DIRECTION_UP, 'up', 'down').tolist()
+        return [Pen(*fields) for fields in zip(
+            self.start_index.tolist(), self.start_datetime, self.start_price.tolist(), start_types,
+            self.end_index.tolist(), self.end_datetime, self.end_price.tolist(), end_types,
+            directions, self.length.tolist(), self.price_change.tolist(), self.price_change_percent.tolist(),
+            self.high.tolist(), self.low.tolist())]
+    
+    def to_dicts(self):
+        """转换为旧版的笔字典列表格式"""
+        return [asdict(pen) for pen in self.to_records()]
+
+
 # 股票数据获取模块
 class StockDataFetcher:
+    # K线响应缓存，在所有实例间共享：{(东方财富代码, klt): (时间桶, K线列表)}
+    _kline_cache = {}
+    
     def __init__(self):
         self.base_url = "http://hq.sinajs.cn/list="
     
@@ -108,88 +658,91 @@ class StockDataFetcher:
             logger.debug(f"请求URL: {url}")
             
             # 添加请求头，模拟真实浏览器访问
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': '*/*',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://quote.eastmoney.com/' if market_code != '116' else 'https://finance.sina.com.cn/',
-                'Connection': 'keep-alive'
-            }
+            referer = 'https://quote.eastmoney.com/' if market_code != '116' else 'https://finance.sina.com.cn/'
             
-            # 创建请求对象
-            req = urllib.request.Request(url, headers=headers)
+            # 同一K线周期内的重复请求直接使用缓存，避免重复的网络往返
+            cache_key = (eastmoney_code, klt)
+            end_bucket = int(time.time() // KLINE_PERIOD_SECONDS.get(klt, 60))
+            cached = self._kline_cache.get(cache_key)
             
-            print(f"\n[步骤1.1] 正在从东方财富获取{stock_code}的{period}K线数据...")
-            try:
-                # 使用内置的urllib库获取数据，设置较短的超时时间
-                with urllib.request.urlopen(req, timeout=5) as response:
-                    logger.info(f"响应状态码: {response.getcode()}")
-                    data_str = response.read().decode('utf-8')  # 使用utf-8编码
-                
-                logger.info(f"成功获取到{stock_code}的{period}K线数据，响应长度: {len(data_str)}字符")
-                logger.debug(f"原始响应数据: {data_str[:500]}...")  # 显示更多的响应数据
-                
-                # 解析JSON数据
-                print(f"[步骤1.2] 正在解析JSON数据...")
+            if cached is not None and cached[0] == end_bucket:
+                logger.info(f"使用缓存的{stock_code}的{period}K线数据")
+                klines = cached[1]
+            else:
+                print(f"\n[步骤1.1] 正在从东方财富获取{stock_code}的{period}K线数据...")
                 try:
-                    data = json.loads(data_str)
-                    logger.info(f"成功解析JSON数据")
-                except json.JSONDecodeError as e:
-                    logger.error(f"解析JSON数据失败: {str(e)}")
-                    logger.error(f"原始响应数据: {data_str}")
-                    return self._generate_mock_data(stock_code)
-                
-                # 处理不同交易所的数据格式
-                kline_data = []
-                
-                # 检查响应状态
-                if data.get('rc') != 0:
-                    logger.error(f"东方财富API返回错误: {data.get('msg', '未知错误')}")
-                    return self._generate_mock_data(stock_code)
-                
-                # 提取K线数据
-                klines = data.get('data', {}).get('klines', [])
-                logger.info(f"提取到{len(klines)}条{period}K线数据")
-                
-                if not klines:
-                    logger.warning(f"未获取到{stock_code}的{period}K线数据，将返回模拟数据")
+                    if HTTP_SESSION is not None:
+                        # 复用连接池中的长连接，并启用gzip压缩传输
+                        response = HTTP_SESSION.get(url, headers={'Referer': referer}, timeout=5)
+                        logger.info(f"响应状态码: {response.status_code}")
+                        response.raise_for_status()
+                        data_str = response.text
+                    else:
+                        # 未安装requests时使用内置的urllib库获取数据，设置较短的超时时间
+                        req = urllib.request.Request(url, headers=dict(HTTP_HEADERS, Referer=referer))
+                        with urllib.request.urlopen(req, timeout=5) as response:
+                            logger.info(f"响应状态码: {response.getcode()}")
+                            data_str = response.read().decode('utf-8')  # 使用utf-8编码
+                    
+                    logger.info(f"成功获取到{stock_code}的{period}K线数据，响应长度: {len(data_str)}字符")
+                    logger.debug(f"原始响应数据: {data_str[:500]}...")  # 显示更多的响应数据
+                    
+                    # 解析JSON数据
+                    print(f"[步骤1.2] 正在解析JSON数据...")
+                    try:
+                        data = json.loads(data_str)
+                        logger.info(f"成功解析JSON数据")
+                    except json.JSONDecodeError as e:
+                        logger.error(f"解析JSON数据失败: {str(e)}")
+                        logger.error(f"原始响应数据: {data_str}")
+                        return self._generate_mock_data(stock_code)
+                    
+                    # 检查响应状态
+                    if data.get('rc') != 0:
+                        logger.error(f"东方财富API返回错误: {data.get('msg', '未知错误')}")
+                        return self._generate_mock_data(stock_code)
+                    
+                    # 提取K线数据
+                    klines = data.get('data', {}).get('klines', [])
+                    logger.info(f"提取到{len(klines)}条{period}K线数据")
+                    
+                    if not klines:
+                        logger.warning(f"未获取到{stock_code}的{period}K线数据，将返回模拟数据")
+                        return self._generate_mock_data(stock_code)
+                    
+                    self._kline_cache[cache_key] = (end_bucket, klines)
+                except NETWORK_ERRORS as e:
+                    logger.error(f"网络请求失败: {str(e)}")
+                    if cached is None:
+                        return self._generate_mock_data(stock_code)
+                    # 网络失败时优先使用上一次缓存的旧数据
+                    logger.warning(f"使用缓存的{stock_code}的{period}K线数据（可能不是最新）")
+                    klines = cached[1]
+                except Exception as e:
+                    logger.error(f"获取数据时发生未知错误: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
                     return self._generate_mock_data(stock_code)
-            except urllib.error.URLError as e:
-                logger.error(f"网络请求失败: {str(e)}")
-                return self._generate_mock_data(stock_code)
-            except Exception as e:
-                logger.error(f"获取数据时发生未知错误: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return self._generate_mock_data(stock_code)
             
             # 解析K线数据（适用于上海、深圳和香港证券交易所）
+            # 每条K线格式为"时间,开盘,收盘,最高,最低,成交量,..."，整体交给pandas的C解析器一次完成
+            # 价格使用float32存储，后续分型、MACD、KDJ计算访问的数据量减半；
+            # 成交量超过2^24时float32无法精确表示，且可能带小数点，按float64解析
             print(f"\n[步骤1.1] 正在解析{stock_code}的{period}K线数据...")
-            for kline in tqdm(klines, desc="解析K线数据", unit="条"):
-                parts = kline.split(',')
-                if len(parts) >= 6:
-                    datetime_str = parts[0]
-                    open_price = float(parts[1])
-                    close_price = float(parts[2])
-                    high_price = float(parts[3])
-                    low_price = float(parts[4])
-                    volume = float(parts[5])
-                    
-                    kline_data.append({
-                        'datetime': datetime_str,
-                        'open': open_price,
-                        'close': close_price,
-                        'high': high_price,
-                        'low': low_price,
-                        'volume': volume
-                    })
-            
-            # 转换为DataFrame
-            print(f"\n[步骤1.2] 正在转换数据格式...")
-            df = pd.DataFrame(kline_data)
+            df = pd.read_csv(StringIO('\n'.join(klines)), header=None,
+                             names=['datetime', 'open', 'close', 'high', 'low', 'volume'],
+                             usecols=[0, 1, 2, 3, 4, 5], engine='c',
+                             dtype={'open': np.float32, 'close': np.float32, 'high': np.float32,
+                                    'low': np.float32, 'volume': np.float64})
             
             # 转换时间格式
-            df['datetime'] = pd.to_datetime(df['datetime'])
+            print(f"\n[步骤1.2] 正在转换数据格式...")
+            try:
+                # 使用固定格式解析，避免逐条推断时间格式
+                df['datetime'] = pd.to_datetime(df['datetime'], format=KLINE_DATETIME_FORMATS.get(klt), cache=True)
+            except ValueError:
+                logger.warning(f"K线时间格式与预期不符，改为自动推断格式")
+                df['datetime'] = pd.to_datetime(df['datetime'])
             df.set_index('datetime', inplace=True)
             
             # 只保留需要的列
@@ -203,6 +756,27 @@ class StockDataFetcher:
             traceback.print_exc()
             return self._generate_mock_data(stock_code)
     
+    def fetch_many(self, stock_codes, period='1d', max_workers=8):
+        """并发获取多只股票的K线数据
+        
+        网络等待期间线程会释放GIL，多个请求的往返时间可以相互重叠，
+        所有线程共享同一个HTTP连接池
+        
+        参数:
+        stock_codes: 股票代码列表，格式同fetch_kline_data
+        period: K线周期，默认为日线
+        max_workers: 最大并发线程数，默认与连接池大小一致
+        
+        返回:
+        {股票代码: DataFrame} 字典
+        """
+        stock_codes = list(stock_codes)
+        if not stock_codes:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(stock_codes))) as executor:
+            results = executor.map(lambda code: self.fetch_kline_data(code, period), stock_codes)
+            return dict(zip(stock_codes, results))
+    
     def _generate_mock_data(self, stock_code):
         """生成模拟的1分钟K线数据用于演示"""
         print(f"\n[步骤1.1] 正在生成{stock_code}的模拟K线数据...")
@@ -215,46 +789,115 @@ class StockDataFetcher:
         # 生成价格数据（使用随机游走，添加一些波动以产生分型）
         base_price = 10.0 if not stock_code.startswith('6') else 50.0
         # 添加一些趋势和波动，确保产生足够的分型
-        returns = np.random.normal(0, 0.002, len(times))
+        rng = np.random.default_rng()
+        returns = rng.normal(0, 0.002, len(times))
         
         # 添加一些趋势成分
         print(f"\n[步骤1.2] 正在生成价格趋势数据...")
-        for i in tqdm(range(len(returns)), desc="生成趋势数据", unit="个"):
-            if 20 <= i < 40:
-                returns[i] += 0.003  # 上升趋势
-            elif 60 <= i < 80:
-                returns[i] -= 0.003  # 下降趋势
+        returns[20:40] += 0.003  # 上升趋势
+        returns[60:80] -= 0.003  # 下降趋势
         
         prices = base_price * np.exp(np.cumsum(returns))
         
         # 生成OHLC数据
         opens = prices[:-1]
         closes = prices[1:]
-        highs = np.maximum(opens, closes) + np.random.uniform(0, base_price * 0.005, len(opens))
-        lows = np.minimum(opens, closes) - np.random.uniform(0, base_price * 0.005, len(opens))
-        volumes = np.random.uniform(1000, 10000, len(opens))
-        
-        # 创建DataFrame
-        df = pd.DataFrame()
-        df['datetime'] = pd.to_datetime(times[1:])  # 从第二个时间开始
-        df.set_index('datetime', inplace=True)
-        df['open'] = opens
-        df['high'] = highs
-        df['low'] = lows
-        df['close'] = closes
-        df['volume'] = volumes
+        highs = np.maximum(opens, closes) + rng.uniform(0, base_price * 0.005, len(opens))
+        lows = np.minimum(opens, closes) - rng.uniform(0, base_price * 0.005, len(opens))
+        volumes = rng.uniform(1000, 10000, len(opens))
+        
+        # 一次性创建DataFrame，时间索引从第二个时间开始
+        df = pd.DataFrame({
+            'open': opens,
+            'high': highs,
+            'low': lows,
+            'close': closes,
+            'volume': volumes
+        }, index=pd.DatetimeIndex(times[1:], name='datetime'))
         
         return df
 
+# 中文字体候选列表，系统中找不到中文字体时使用
+DEFAULT_CJK_FONTS = ('SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans', 'WenQuanYi Micro Hei', 'Heiti TC')
+
+
+@lru_cache(maxsize=1)
+def _cjk_fonts():
+    """查找系统中可用的中文字体，只在首次调用时遍历字体列表"""
+    try:
+        # 尝试使用matplotlib的字体管理器来查找合适的中文字体
+        import matplotlib.font_manager as fm
+        chinese_fonts = tuple(font.name for font in fm.fontManager.ttflist
+                              if 'SimHei' in font.name or 'Microsoft YaHei' in font.name or 'Arial Unicode MS' in font.name)
+        if chinese_fonts:
+            return chinese_fonts
+    except Exception:
+        # 如果字体管理器出现问题，使用默认字体列表
+        pass
+    return DEFAULT_CJK_FONTS
+
+
+@lru_cache(maxsize=1)
+def _chart_style():
+    """构建K线图样式，样式不随数据变化，只需创建一次"""
+    mc = mpf.make_marketcolors(up='red', down='green', wick='inherit', edge='inherit', volume='inherit')
+    return mpf.make_mpf_style(marketcolors=mc, gridaxis='both', gridstyle='-.', y_on_right=False,
+                              rc={'font.sans-serif': list(_cjk_fonts())})
+
+
+def _scatter_from_indices(n, idx_arr, price_arr):
+    """
+    构建散点图数据：指定位置为价格，其余位置为NaN
+    
+    参数:
+    n: 数据长度（K线数量）
+    idx_arr: 散点所在K线的位置数组
+    price_arr: 对应的价格数组
+    
+    返回:
+    长度为n的float32数组
+    """
+    arr = np.full(n, np.nan, dtype=np.float32)
+    # 忽略超出数据范围的位置
+    valid = (idx_arr >= 0) & (idx_arr < n)
+    arr[idx_arr[valid]] = price_arr[valid]
+    return arr
+
+
 # 缠论分析模块
 class ChanlunAnalyzer:
     def __init__(self):
-        self.top_fractals = []  # 顶分型
-        self.bottom_fractals = []  # 底分型
-        self.pens = []  # 笔
+        self.top_fractal_arrays = FractalArrays.empty()  # 顶分型
+        self.bottom_fractal_arrays = FractalArrays.empty()  # 底分型
+        self._pens_version = 0  # 笔的版本号，每次替换笔时递增
+        self.pen_arrays = PenArrays.empty()  # 笔
         self.segments = []  # 线段
         self.centrals = []  # 中枢
-        
+        # 线段和中枢的计算结果对应的笔版本（及参数），笔未变化时直接复用
+        self._segments_key = None
+        self._centrals_key = None
+    
+    @property
+    def pen_arrays(self):
+        return self._pen_arrays
+    
+    @pen_arrays.setter
+    def pen_arrays(self, value):
+        self._pen_arrays = value
+        self._pens_view = None
+        self._pens_version += 1
+    
+    @property
+    def pens(self):
+        """笔的记录列表视图（Pen），首次访问时由pen_arrays生成并缓存"""
+        if self._pens_view is None:
+            self._pens_view = self._pen_arrays.to_records()
+        return self._pens_view
+    
+    @pens.setter
+    def pens(self, pens):
+        self.pen_arrays = PenArrays.from_dicts(pens)
+    
     def visualize_all(self, df, show_figure=True, save_path=None):
         """
         可视化K线图及缠论元素（分型、笔、线段、中枢）
@@ -264,33 +907,12 @@ class ChanlunAnalyzer:
         show_figure: 是否显示图表，默认为True
         save_path: 保存图表的路径，默认为None
         """
-        # 设置中文字体，使用更可靠的方法
-        try:
-            # 尝试使用matplotlib的字体管理器来查找合适的中文字体
-            from matplotlib.font_manager import FontProperties
-            import matplotlib.font_manager as fm
-            
-            # 查找系统中可用的中文字体
-            chinese_fonts = []
-            for font in fm.fontManager.ttflist:
-                if 'SimHei' in font.name or 'Microsoft YaHei' in font.name or 'Arial Unicode MS' in font.name:
-                    chinese_fonts.append(font.name)
-            
-            if chinese_fonts:
-                # 使用找到的第一个中文字体
-                plt.rcParams['font.sans-serif'] = chinese_fonts
-            else:
-                # 如果没有找到中文字体，使用默认字体列表
-                plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans', 'WenQuanYi Micro Hei', 'Heiti TC']
-        except Exception as e:
-            # 如果字体管理器出现问题，使用默认字体列表
-            plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans', 'WenQuanYi Micro Hei', 'Heiti TC']
-        
+        # 设置中文字体（字体查找结果在进程内缓存）
+        plt.rcParams['font.sans-serif'] = list(_cjk_fonts())
         plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
         
         # 使用mplfinance绘制K线图
-        mc = mpf.make_marketcolors(up='red', down='green', wick='inherit', edge='inherit', volume='inherit')
-        s = mpf.make_mpf_style(marketcolors=mc, gridaxis='both', gridstyle='-.', y_on_right=False, rc={'font.sans-serif': plt.rcParams['font.sans-serif']})
+        s = _chart_style()
         
         # 计算MACD和KDJ指标
         df = self.calculate_macd(df)
@@ -300,117 +922,72 @@ class ChanlunAnalyzer:
         addplot = []
         
         # 添加分型点
-        if hasattr(self, 'top_fractals') and self.top_fractals:
-            # 直接创建与df等长的数据数组
-            top_data = [np.nan] * len(df)
-            for fractal in self.top_fractals:
-                try:
-                    # 检查数据结构类型
-                    if isinstance(fractal, tuple) and len(fractal) >= 2:
-                        # 元组格式 (index, ..., price, ...)
-                        idx = fractal[0]
-                        value = fractal[2] if len(fractal) > 2 else fractal[1]
-                        if idx >= 0 and idx < len(df):
-                            top_data[idx] = value
-                    elif isinstance(fractal, dict):
-                        # 字典格式，添加键存在性检查
-                        idx = fractal.get('index')
-                        value = fractal.get('high', fractal.get('price'))
-                        if idx is not None and value is not None and idx >= 0 and idx < len(df):
-                            top_data[idx] = value
-                except (KeyError, IndexError, TypeError):
-                    pass  # 忽略数据结构不匹配或索引错误的分型
-            
+        if len(self.top_fractal_arrays):
+            top_data = _scatter_from_indices(len(df), self.top_fractal_arrays.index, self.top_fractal_arrays.price)
             addplot.append(mpf.make_addplot(top_data, type='scatter', markersize=80, marker='^', color='red', label='顶分型'))
             
-        if hasattr(self, 'bottom_fractals') and self.bottom_fractals:
-            # 直接创建与df等长的数据数组
-            bottom_data = [np.nan] * len(df)
-            for fractal in self.bottom_fractals:
-                try:
-                    # 检查数据结构类型
-                    if isinstance(fractal, tuple) and len(fractal) >= 2:
-                        # 元组格式 (index, ..., price, ...)
-                        idx = fractal[0]
-                        value = fractal[2] if len(fractal) > 2 else fractal[1]
-                        if idx >= 0 and idx < len(df):
-                            bottom_data[idx] = value
-                    elif isinstance(fractal, dict):
-                        # 字典格式，添加键存在性检查
-                        idx = fractal.get('index')
-                        value = fractal.get('low', fractal.get('price'))
-                        if idx is not None and value is not None and idx >= 0 and idx < len(df):
-                            bottom_data[idx] = value
-                except (KeyError, IndexError, TypeError):
-                    pass  # 忽略数据结构不匹配或索引错误的分型
-            
+        if len(self.bottom_fractal_arrays):
+            bottom_data = _scatter_from_indices(len(df), self.bottom_fractal_arrays.index, self.bottom_fractal_arrays.price)
             addplot.append(mpf.make_addplot(bottom_data, type='scatter', markersize=80, marker='v', color='green', label='底分型'))
         
         # 添加笔
         if hasattr(self, 'pens') and self.pens:
             for i, pen in enumerate(self.pens):
                 try:
-                    start_idx = pen['start_index']
-                    end_idx = pen['end_index']
-                    start_price = pen['start_price']
-                    end_price = pen['end_price']
+                    start_idx = pen.start_index
+                    end_idx = pen.end_index
+                    start_price = pen.start_price
+                    end_price = pen.end_price
                     # 确保索引在有效范围内
                     if start_idx >= 0 and end_idx < len(df) and start_idx < end_idx:
                         # 缠论笔应该是连接两个分型点的直线
-                        # 填充起点到终点之间的所有值，使用直线连接
-                        pen_data = [np.nan] * len(df)
-                        # 填充起点和终点
-                        pen_data[start_idx] = start_price
-                        pen_data[end_idx] = end_price
-                        # 填充中间点，使用直线插值
-                        for idx in range(start_idx + 1, end_idx):
-                            # 计算直线上的中间点值
-                            pen_data[idx] = start_price + (end_price - start_price) * (idx - start_idx) / (end_idx - start_idx)
+                        # 用linspace一次性填充起点到终点之间的所有值
+                        pen_data = np.full(len(df), np.nan, dtype=np.float32)
+                        pen_data[start_idx:end_idx + 1] = np.linspace(start_price, end_price, end_idx - start_idx + 1)
                         
                         # 根据方向选择颜色
-                        color = 'blue' if pen['direction'] == 'up' else 'purple'
+                        color = 'blue' if pen.direction == 'up' else 'purple'
                         
                         # 添加笔到额外绘图元素
                         if i == 0:
                             addplot.append(mpf.make_addplot(pen_data, type='line', color=color, label='笔'))
                         else:
                             addplot.append(mpf.make_addplot(pen_data, type='line', color=color))
-                except (KeyError, IndexError):
+                except (AttributeError, IndexError):
                     pass  # 忽略数据结构不匹配或索引错误的笔
         
         # 添加线段
         if hasattr(self, 'segments') and self.segments:
             for i, segment in enumerate(self.segments):
                 try:
-                    pens = segment.get('pens', [])
-                    if pens and len(pens) >= 2:
+                    # 线段只记录所含笔在pen_arrays中的位置范围，按需切片取端点
+                    pen_start, pen_end = segment['pen_start'], segment['pen_end']
+                    if pen_end - pen_start >= 2:
                         # 使用与df等长的数据数组
-                        line_data = [np.nan] * len(df)
+                        line_data = np.full(len(df), np.nan, dtype=np.float32)
                         
                         # 线段应该连接各个笔的端点，形成折线
                         # 首先处理第一个笔的起点
-                        first_pen = pens[0]
-                        line_data[first_pen['start_index']] = first_pen['start_price']
+                        line_data[self.pen_arrays.start_index[pen_start]] = self.pen_arrays.start_price[pen_start]
                         
                         # 然后处理所有笔的端点
-                        for pen in pens:
-                            line_data[pen['end_index']] = pen['end_price']
+                        end_indices = self.pen_arrays.end_index[pen_start:pen_end]
+                        end_prices = self.pen_arrays.end_price[pen_start:pen_end]
+                        line_data[end_indices] = end_prices
                         
                         # 对于线段中的相邻笔，连接它们的端点
-                        for j in range(len(pens) - 1):
-                            current_pen = pens[j]
-                            next_pen = pens[j + 1]
-                            
-                            start_idx = current_pen['end_index']
-                            end_idx = next_pen['end_index']
-                            start_price = current_pen['end_price']
-                            end_price = next_pen['end_price']
+                        end_indices = end_indices.tolist()
+                        end_prices = end_prices.tolist()
+                        for j in range(len(end_indices) - 1):
+                            start_idx = end_indices[j]
+                            end_idx = end_indices[j + 1]
+                            start_price = end_prices[j]
+                            end_price = end_prices[j + 1]
                             
                             # 填充相邻笔端点之间的所有值，使用直线连接
-                            for idx in range(start_idx + 1, end_idx):
-                                if 0 <= idx < len(df):
-                                    ratio = (idx - start_idx) / (end_idx - start_idx)
-                                    line_data[idx] = start_price + (end_price - start_price) * ratio
+                            if 0 <= start_idx < end_idx < len(df):
+                                ratio = np.arange(end_idx - start_idx + 1) / (end_idx - start_idx)
+                                line_data[start_idx:end_idx + 1] = start_price + (end_price - start_price) * ratio
                         
                         # 根据方向选择颜色
                         color = 'orange' if segment.get('direction') == 'up' else 'cyan'
@@ -444,14 +1021,12 @@ class ChanlunAnalyzer:
                                 color = 'gray'
                             
                             # 创建与df等长的数据数组
-                            upper_data = [np.nan] * len(df)
-                            lower_data = [np.nan] * len(df)
+                            upper_data = np.full(len(df), np.nan, dtype=np.float32)
+                            lower_data = np.full(len(df), np.nan, dtype=np.float32)
                             
                             # 中枢上限和下限
-                            for idx in range(start_idx, end_idx + 1):
-                                if 0 <= idx < len(df):
-                                    upper_data[idx] = central_high
-                                    lower_data[idx] = central_low
+                            upper_data[start_idx:end_idx + 1] = central_high
+                            lower_data[start_idx:end_idx + 1] = central_low
                             
                             # 使用填充区域来表示中枢，更加直观
                             # 添加中枢上限
@@ -461,10 +1036,8 @@ class ChanlunAnalyzer:
                             # 添加中枢填充区域
                             # 由于mplfinance不直接支持填充区域，我们使用两条线之间的填充
                             # 这里使用中间线来表示填充区域
-                            mid_data = [np.nan] * len(df)
-                            for idx in range(start_idx, end_idx + 1):
-                                if 0 <= idx < len(df):
-                                    mid_data[idx] = (central_high + central_low) / 2
+                            mid_data = np.full(len(df), np.nan, dtype=np.float32)
+                            mid_data[start_idx:end_idx + 1] = (central_high + central_low) / 2
                             # 添加填充区域的中间线，用于视觉参考
                             addplot.append(mpf.make_addplot(mid_data, type='line', color=color, alpha=0.5, linestyle='--', linewidth=1))
                 except (KeyError, IndexError):
@@ -480,7 +1053,7 @@ class ChanlunAnalyzer:
         # 添加DEA线
         addplot.append(mpf.make_addplot(df['dea'], panel=2, type='line', color='yellow', label='DEA'))
         # 添加MACD柱状图
-        macd_colors = ['red' if val >= 0 else 'green' for val in df['macd']]
+        macd_colors = np.where(df['macd'].to_numpy() >= 0, 'red', 'green')
         addplot.append(mpf.make_addplot(df['macd'], panel=2, type='bar', color=macd_colors, label='MACD'))
         
         # 添加KDJ指标到面板3
@@ -491,9 +1064,9 @@ class ChanlunAnalyzer:
         # 添加J线
         addplot.append(mpf.make_addplot(df['j'], panel=3, type='line', color='purple', label='J'))
         # 添加超买线（80）
-        addplot.append(mpf.make_addplot([80] * len(df), panel=3, type='line', color='gray', linestyle='--', label='超买线'))
+        addplot.append(mpf.make_addplot(np.full(len(df), 80, dtype=np.float32), panel=3, type='line', color='gray', linestyle='--', label='超买线'))
         # 添加超卖线（20）
-        addplot.append(mpf.make_addplot([20] * len(df), panel=3, type='line', color='gray', linestyle='--', label='超卖线'))
+        addplot.append(mpf.make_addplot(np.full(len(df), 20, dtype=np.float32), panel=3, type='line', color='gray', linestyle='--', label='超卖线'))
         
         # 绘制图表，启用成交量显示，并配置面板布局
         fig, axlist = mpf.plot(df, type='candle', style=s, title='股票K线图 - 缠论分析', 
@@ -532,45 +1105,54 @@ class ChanlunAnalyzer:
         返回:
         包含分型信息的DataFrame
         """
-        # 创建结果DataFrame，复制原始数据并添加分型标记列
-        result_df = df.copy()
-        result_df['top_fractal'] = 0
-        result_df['bottom_fractal'] = 0
+        # 创建结果DataFrame：浅拷贝与原始数据共享价格列，不复制整份OHLCV数据
+        # 分型标记列在识别完成后一次性写入，不会影响传入的df
+        result_df = df.copy(deep=False)
+        top_arr = np.zeros(len(df), dtype=np.int8)
+        bottom_arr = np.zeros_like(top_arr)
         
-        # 重置顶底分型列表
-        self.top_fractals = []
-        self.bottom_fractals = []
+        # 重置顶底分型
+        self.top_fractal_arrays = FractalArrays.empty()
+        self.bottom_fractal_arrays = FractalArrays.empty()
         
         # 提取价格数据到numpy数组，提高访问速度
-        highs = df['high'].values
-        lows = df['low'].values
+        highs = df['high'].to_numpy(copy=False)
+        lows = df['low'].to_numpy(copy=False)
         
-        # 遍历数据，识别分型
-        print(f"\n正在识别分型...")
-        for i in tqdm(range(bar_count, len(df) - bar_count), desc="识别分型", unit="个"):
-            # 顶分型识别: 中间K线的高点是相邻bar_count根K线中最高的
-            current_high = highs[i]
-            # 使用numpy切片和向量化操作提高效率
-            if (highs[i-bar_count:i] < current_high).all() and (highs[i+1:i+bar_count+1] < current_high).all():
-                result_df.loc[result_df.index[i], 'top_fractal'] = 1
-                self.top_fractals.append({
-                    'index': i,
-                    'datetime': df.index[i],
-                    'price': current_high
-                })
-            
-            # 底分型识别: 中间K线的低点是相邻bar_count根K线中最低的
-            current_low = lows[i]
-            # 使用numpy切片和向量化操作提高效率
-            if (lows[i-bar_count:i] > current_low).all() and (lows[i+1:i+bar_count+1] > current_low).all():
-                result_df.loc[result_df.index[i], 'bottom_fractal'] = 1
-                self.bottom_fractals.append({
-                    'index': i,
-                    'datetime': df.index[i],
-                    'price': current_low
-                })
+        window = 2 * bar_count + 1
+        if len(df) < window:
+            logger.info(f"K线数量不足{window}根，无法识别分型")
+            result_df['top_fractal'] = top_arr
+            result_df['bottom_fractal'] = bottom_arr
+            return result_df
         
-        logger.info(f"识别出 {len(self.top_fractals)} 个顶分型和 {len(self.bottom_fractals)} 个底分型")
+        # 使用滑动窗口一次性比较所有K线，避免逐根循环
+        print(f"\n正在识别分型...")
+        win_h = sliding_window_view(highs, window)
+        win_l = sliding_window_view(lows, window)
+        center_h = win_h[:, bar_count]
+        center_l = win_l[:, bar_count]
+        
+        # 顶分型识别: 中间K线的高点严格高于左右各bar_count根K线的高点
+        is_top = (center_h > win_h[:, :bar_count].max(axis=1)) & (center_h > win_h[:, bar_count+1:].max(axis=1))
+        # 底分型识别: 中间K线的低点严格低于左右各bar_count根K线的低点
+        is_bottom = (center_l < win_l[:, :bar_count].min(axis=1)) & (center_l < win_l[:, bar_count+1:].min(axis=1))
+        
+        top_idx = np.flatnonzero(is_top) + bar_count
+        bottom_idx = np.flatnonzero(is_bottom) + bar_count
+        
+        # 先写入预分配的int8数组，再整列赋值，避免逐行的.loc标签查找
+        top_arr[top_idx] = 1
+        bottom_arr[bottom_idx] = 1
+        result_df['top_fractal'] = top_arr
+        result_df['bottom_fractal'] = bottom_arr
+        
+        self.top_fractal_arrays = FractalArrays(top_idx, highs[top_idx], np.full(len(top_idx), FRACTAL_TOP, dtype=np.int8),
+                                                df.index[top_idx])
+        self.bottom_fractal_arrays = FractalArrays(bottom_idx, lows[bottom_idx], np.full(len(bottom_idx), FRACTAL_BOTTOM, dtype=np.int8),
+                                                   df.index[bottom_idx])
+        
+        logger.info(f"识别出 {len(self.top_fractal_arrays)} 个顶分型和 {len(self.bottom_fractal_arrays)} 个底分型")
         return result_df
     
     def filter_fractals(self, df):
@@ -581,48 +1163,26 @@ class ChanlunAnalyzer:
         df: 包含分型标记的DataFrame
         
         返回:
-        过滤后的分型列表
+        过滤后按K线位置排序、顶底交替的分型（FractalArrays）
         """
-        # 合并并按时间排序所有分型
-        all_fractals = []
-        
-        # 添加顶分型
-        all_fractals.extend((f['index'], f['datetime'], f['price'], 'top') for f in self.top_fractals)
-        # 添加底分型
-        all_fractals.extend((f['index'], f['datetime'], f['price'], 'bottom') for f in self.bottom_fractals)
-        
-        # 按时间排序
-        all_fractals.sort(key=lambda x: x[0])
-        
-        # 过滤分型：确保顶底交替出现
-        filtered_fractals = []
-        last_type = None
-        
-        for idx, dt, price, f_type in all_fractals:
-            # 如果是第一个分型，或者与上一个分型类型不同，则保留
-            if last_type is None or f_type != last_type:
-                filtered_fractals.append((idx, dt, price, f_type))
-                last_type = f_type
-            # 如果与上一个分型类型相同，保留价格更极端的那个
-            elif last_type == 'top' and f_type == 'top':
-                if price > filtered_fractals[-1][2]:  # 新顶分型更高
-                    filtered_fractals[-1] = (idx, dt, price, f_type)
-            elif last_type == 'bottom' and f_type == 'bottom':
-                if price < filtered_fractals[-1][2]:  # 新底分型更低
-                    filtered_fractals[-1] = (idx, dt, price, f_type)
-        
-        # 更新分型列表
-        self.top_fractals = []
-        self.bottom_fractals = []
-        
-        for f in filtered_fractals:
-            fractal_dict = {'index': f[0], 'datetime': f[1], 'price': f[2]}
-            if f[3] == 'top':
-                self.top_fractals.append(fractal_dict)
-            else:
-                self.bottom_fractals.append(fractal_dict)
-        
-        logger.info(f"过滤后剩余 {len(self.top_fractals)} 个顶分型和 {len(self.bottom_fractals)} 个底分型")
+        # 合并顶底分型数组，并按K线位置稳定排序（同一位置顶分型在前）
+        top = self.top_fractal_arrays
+        bottom = self.bottom_fractal_arrays
+        all_fractals = FractalArrays(np.concatenate([top.index, bottom.index]),
+                                     np.concatenate([top.price, bottom.price]),
+                                     np.concatenate([top.kind, bottom.kind]),
+                                     top.datetime.append(bottom.datetime))
+        all_fractals = all_fractals.take(np.argsort(all_fractals.index, kind='stable'))
+        
+        # 过滤分型：确保顶底交替出现，连续同类分型保留价格更极端的那个
+        keep = _filter_alternation(all_fractals.kind, all_fractals.price)
+        
+        # 更新分型数组
+        filtered_fractals = all_fractals.take(keep)
+        self.top_fractal_arrays = filtered_fractals.take(filtered_fractals.kind == FRACTAL_TOP)
+        self.bottom_fractal_arrays = filtered_fractals.take(filtered_fractals.kind == FRACTAL_BOTTOM)
+        
+        logger.info(f"过滤后剩余 {len(self.top_fractal_arrays)} 个顶分型和 {len(self.bottom_fractal_arrays)} 个底分型")
         return filtered_fractals
     
     def divide_pens(self, df, filtered_fractals, threshold_percent=0.005):
@@ -631,137 +1191,72 @@ class ChanlunAnalyzer:
         
         参数:
         df: 包含OHLC数据的DataFrame
-        filtered_fractals: 过滤后的分型列表
+        filtered_fractals: 过滤后的分型（filter_fractals返回的FractalArrays）
         threshold_percent: 笔的最小价格波动阈值百分比，默认为0.5%
         
         返回:
-        笔的列表
+        笔的列式数组（PenArrays）
         """
         if len(filtered_fractals) < 2:
             logger.warning("分型数量不足，无法划分笔")
-            return []
-        
-        self.pens = []
-        current_pen_start = filtered_fractals[0]
-        
-        # 遍历分型，构建笔
-        for current_fractal in filtered_fractals[1:]:
+            return PenArrays.empty()
+        
+        fractals = filtered_fractals
+        prices = fractals.price
+        # 笔的数量不会超过分型数量减一，预先分配起止位置和价格变动百分比数组，最后截断
+        start_positions = np.empty(len(fractals) - 1, dtype=np.int64)
+        end_positions = np.empty_like(start_positions)
+        pen_pcts = np.empty(len(fractals) - 1, dtype=prices.dtype)
+        pen_count = 0
+        current_start = 0
+        
+        # 遍历分型，记录每一笔起止分型的位置
+        for k in range(1, len(fractals)):
             # 计算价格波动幅度
-            price_change = abs(current_fractal[2] - current_pen_start[2])
-            price_change_percent = price_change / current_pen_start[2]
+            price_change_percent = abs(prices[k] - prices[current_start]) / prices[current_start]
             
             # 检查是否满足笔的条件：价格波动超过阈值
             if price_change_percent >= threshold_percent:
-                # 创建笔
-                # 笔的方向应该根据实际价格变化来判断，而不仅仅是分型类型的组合
-                pen_direction = 'up' if current_fractal[2] > current_pen_start[2] else 'down'
-                pen = {
-                    'start_index': current_pen_start[0],
-                    'start_datetime': current_pen_start[1],
-                    'start_price': current_pen_start[2],
-                    'start_type': current_pen_start[3],
-                    'end_index': current_fractal[0],
-                    'end_datetime': current_fractal[1],
-                    'end_price': current_fractal[2],
-                    'end_type': current_fractal[3],
-                    'direction': pen_direction,
-                    'length': abs(current_fractal[0] - current_pen_start[0]),
-                    'price_change': price_change,
-                    'price_change_percent': price_change_percent
-                }
-                
-                self.pens.append(pen)
-                current_pen_start = current_fractal
+                start_positions[pen_count] = current_start
+                end_positions[pen_count] = k
+                pen_pcts[pen_count] = price_change_percent
+                pen_count += 1
+                current_start = k
             else:
                 # 价格波动未超过阈值，继续使用当前分型作为笔的起点
                 # 但记录日志，方便调试
-                logger.debug(f"跳过分型 {current_fractal[1]}，价格波动 {price_change_percent:.4%} 未超过阈值 {threshold_percent:.4%}")
-            
-        logger.info(f"成功划分 {len(self.pens)} 笔")
-        return self.pens
+                logger.debug(f"跳过分型 {fractals.datetime[k]}，价格波动 {price_change_percent:.4%} 未超过阈值 {threshold_percent:.4%}")
+        
+        # 由起止分型一次性构建笔的列式数组
+        start = fractals.take(start_positions[:pen_count])
+        end = fractals.take(end_positions[:pen_count])
+        # 笔的方向应该根据实际价格变化来判断，而不仅仅是分型类型的组合
+        direction = np.where(end.price > start.price, DIRECTION_UP, DIRECTION_DOWN).astype(np.int8)
+        self.pen_arrays = PenArrays(start.index, end.index, start.price, end.price, start.kind, end.kind,
+                                    direction, pen_pcts[:pen_count],
+                                    start.datetime, end.datetime)
+        
+        logger.info(f"成功划分 {len(self.pen_arrays)} 笔")
+        return self.pen_arrays
     
     def validate_pens(self):
         """
         验证笔的有效性，确保笔之间没有重叠或违反缠论规则
         
         返回:
-        有效的笔列表
+        有效的笔（PenArrays）
         """
-        if len(self.pens) < 2:
-            return self.pens
-        
-        valid_pens = [self.pens[0]]
+        pens = self.pen_arrays
+        if len(pens) < 2:
+            return pens
         
-        for i in range(1, len(self.pens)):
-            current_pen = self.pens[i]
-            last_valid_pen = valid_pens[-1]
-            
-            # 检查笔的方向是否交替
-            if current_pen['direction'] == last_valid_pen['direction']:
-                # 如果方向相同，需要更仔细的处理
-                # 保留价格变动更大的笔，并且确保笔的端点更极端
-                if current_pen['price_change_percent'] > last_valid_pen['price_change_percent']:
-                    # 检查笔的端点是否更极端
-                    if current_pen['direction'] == 'up':
-                        # 向上笔，检查结束价格是否更高
-                        if current_pen['end_price'] > last_valid_pen['end_price']:
-                            valid_pens[-1] = current_pen
-                    else:
-                        # 向下笔，检查结束价格是否更低
-                        if current_pen['end_price'] < last_valid_pen['end_price']:
-                            valid_pens[-1] = current_pen
-            else:
-                # 方向不同，直接添加
-                valid_pens.append(current_pen)
-        
-        # 进一步检查笔的完整性，确保笔的起点和终点都是有效的分型
-        final_pens = []
-        for pen in valid_pens:
-            # 确保笔的起点和终点都是有效的分型点
-            # 检查笔的长度是否合理，实时数据中笔的长度可能较短
-            if pen['length'] >= 1:  # 笔至少包含1根K线
-                final_pens.append(pen)
-        
-        # 最终检查：确保笔的方向严格交替
-        if len(final_pens) >= 3:
-            # 多次检查，直到所有笔的方向都交替
-            all_alternating = False
-            max_iterations = 5  # 最大迭代次数，避免无限循环
-            iterations = 0
-            
-            while not all_alternating and iterations < max_iterations:
-                all_alternating = True
-                for i in range(1, len(final_pens) - 1):
-                    prev_pen = final_pens[i-1]
-                    curr_pen = final_pens[i]
-                    next_pen = final_pens[i+1]
-                    
-                    if prev_pen['direction'] == next_pen['direction'] and prev_pen['direction'] != curr_pen['direction']:
-                        # 出现了方向交替的情况，这是正常的，继续检查
-                        continue
-                    else:
-                        # 发现方向不交替的情况，需要移除中间的笔
-                        # 比较三个笔的价格变动，保留价格变动最大的两个笔
-                        max_change_pen = max([prev_pen, curr_pen, next_pen], key=lambda x: x['price_change_percent'])
-                        min_change_pen = min([prev_pen, curr_pen, next_pen], key=lambda x: x['price_change_percent'])
-                        
-                        # 移除价格变动最小的笔
-                        if min_change_pen == prev_pen:
-                            final_pens.pop(i-1)
-                        elif min_change_pen == curr_pen:
-                            final_pens.pop(i)
-                        else:
-                            final_pens.pop(i+1)
-                        
-                        # 标记为需要重新检查
-                        all_alternating = False
-                        break
-                iterations += 1
+        # 直接使用列式数组，交由编译后的内核完成合并、过滤和方向交替检查
+        keep = _validate_pens_kernel(pens.direction, pens.end_price, pens.price_change_percent, pens.length, 5)
         
-        # 更新笔列表
-        self.pens = final_pens
-        logger.info(f"验证后剩余 {len(self.pens)} 笔")
-        return self.pens
+        # 更新笔
+        self.pen_arrays = pens.take(keep)
+        logger.info(f"验证后剩余 {len(self.pen_arrays)} 笔")
+        return self.pen_arrays
     
     def divide_segments(self):
         """
@@ -770,160 +1265,152 @@ class ChanlunAnalyzer:
         返回:
         线段的列表
         """
-        if len(self.pens) < 3:
+        pen_arrays = self.pen_arrays
+        n_pens = len(pen_arrays)
+        if n_pens < 3:
             logger.warning("笔的数量不足，无法划分线段（至少需要3笔）")
             return []
         
+        # 笔未变化时线段结果不变，直接返回上次的结果
+        if self._segments_key == self._pens_version:
+            return self.segments
+        
         self.segments = []
         current_segments = []
         
         # 线段的起始方向由前三笔决定
-        # 收集前三笔
-        first_three_pens = self.pens[:3]
-        
-        # 检查是否有重叠区域
-        if self._has_overlap(first_three_pens):
-            # 确定线段方向（由第一笔方向决定）
-            segment_direction = first_three_pens[0]['direction']
-            
+        # 检查前三笔是否有重叠区域
+        if self._has_overlap(0, 3):
             # 创建初始线段
-            current_segment = {
-                'start_index': first_three_pens[0]['start_index'],
-                'start_datetime': first_three_pens[0]['start_datetime'],
-                'start_price': first_three_pens[0]['start_price'],
-                'end_index': first_three_pens[2]['end_index'],
-                'end_datetime': first_three_pens[2]['end_datetime'],
-                'end_price': first_three_pens[2]['end_price'],
-                'direction': segment_direction,
-                'pens': first_three_pens.copy()
-            }
-            current_segments.append(current_segment)
+            current_segments.append(self._segment_from_pens(0, 3))
+        
+        # 逐笔处理时只读取列式数组中的字段，不再生成笔记录或切片笔列表
+        end_indices = pen_arrays.end_index.tolist()
+        end_prices = pen_arrays.end_price.tolist()
+        directions = pen_arrays.direction.tolist()
+        lows = pen_arrays.low.tolist()
+        highs = pen_arrays.high.tolist()
         
         # 处理剩余的笔
-        for i in range(3, len(self.pens)):
-            current_pen = self.pens[i]
+        for i in range(3, n_pens):
             last_segment = current_segments[-1] if current_segments else None
             
             if last_segment:
                 # 检查是否形成新的线段
                 # 新线段形成的条件：当前笔与线段中的某些笔形成相反方向且破坏原线段
-                if self._is_segment_break(last_segment, current_pen):
+                if self._is_segment_break(last_segment, end_prices[i], directions[i]):
                     # 创建新线段
                     new_segment_direction = 'up' if last_segment['direction'] == 'down' else 'down'
+                    # 新线段由上一线段的最后一笔和当前笔组成，极值直接在笔的高低点数组切片上归约
+                    pen_start = last_segment['pen_end'] - 1
                     new_segment = {
                         'start_index': last_segment['end_index'],
                         'start_datetime': last_segment['end_datetime'],
                         'start_price': last_segment['end_price'],
-                        'end_index': current_pen['end_index'],
-                        'end_datetime': current_pen['end_datetime'],
-                        'end_price': current_pen['end_price'],
+                        'end_index': end_indices[i],
+                        'end_datetime': pen_arrays.end_datetime[i],
+                        'end_price': end_prices[i],
                         'direction': new_segment_direction,
-                        'pens': [last_segment['pens'][-1], current_pen]
+                        'pen_start': pen_start,
+                        'pen_end': i + 1,
+                        'max_low': pen_arrays.low[pen_start:i + 1].max(),
+                        'min_high': pen_arrays.high[pen_start:i + 1].min()
                     }
                     current_segments.append(new_segment)
                 else:
                     # 扩展当前线段
-                    last_segment['end_index'] = current_pen['end_index']
-                    last_segment['end_datetime'] = current_pen['end_datetime']
-                    last_segment['end_price'] = current_pen['end_price']
-                    last_segment['pens'].append(current_pen)
+                    last_segment['end_index'] = end_indices[i]
+                    last_segment['end_datetime'] = pen_arrays.end_datetime[i]
+                    last_segment['end_price'] = end_prices[i]
+                    last_segment['pen_end'] = i + 1
+                    # 线段内笔低点的最大值、高点的最小值随笔的加入单调变化，O(1)更新即可
+                    last_segment['max_low'] = max(last_segment['max_low'], lows[i])
+                    last_segment['min_high'] = min(last_segment['min_high'], highs[i])
             else:
                 # 尝试形成新的初始线段
-                if i + 2 < len(self.pens):
-                    test_pens = self.pens[i:i+3]
-                    if self._has_overlap(test_pens):
-                        segment_direction = test_pens[0]['direction']
-                        new_segment = {
-                            'start_index': test_pens[0]['start_index'],
-                            'start_datetime': test_pens[0]['start_datetime'],
-                            'start_price': test_pens[0]['start_price'],
-                            'end_index': test_pens[2]['end_index'],
-                            'end_datetime': test_pens[2]['end_datetime'],
-                            'end_price': test_pens[2]['end_price'],
-                            'direction': segment_direction,
-                            'pens': test_pens.copy()
-                        }
-                        current_segments.append(new_segment)
+                if i + 2 < n_pens and self._has_overlap(i, i + 3):
+                    current_segments.append(self._segment_from_pens(i, i + 3))
         
         self.segments = current_segments
+        self._segments_key = self._pens_version
         logger.info(f"成功划分 {len(self.segments)} 个线段")
         return self.segments
     
-    def _has_overlap(self, pens):
+    def _segment_from_pens(self, start, stop):
         """
-        检查一组笔是否有价格重叠区域
+        由连续的笔构建线段，线段方向由第一笔方向决定
         
         参数:
-        pens: 笔的列表
+        start: 第一笔在pen_arrays中的位置
+        stop: 最后一笔之后的位置（不包含）
+        
+        返回:
+        线段字典，笔只以位置范围pen_start/pen_end记录
+        """
+        pen_arrays = self.pen_arrays
+        last = stop - 1
+        return {
+            'start_index': int(pen_arrays.start_index[start]),
+            'start_datetime': pen_arrays.start_datetime[start],
+            'start_price': float(pen_arrays.start_price[start]),
+            'end_index': int(pen_arrays.end_index[last]),
+            'end_datetime': pen_arrays.end_datetime[last],
+            'end_price': float(pen_arrays.end_price[last]),
+            'direction': 'up' if pen_arrays.direction[start] == DIRECTION_UP else 'down',
+            'pen_start': start,
+            'pen_end': stop,
+            'max_low': pen_arrays.low[start:stop].max(),
+            'min_high': pen_arrays.high[start:stop].min()
+        }
+    
+    def _has_overlap(self, start, stop):
+        """
+        检查一组连续的笔是否有价格重叠区域
+        
+        参数:
+        start: 第一笔在pen_arrays中的位置
+        stop: 最后一笔之后的位置（不包含）
         
         返回:
         是否有重叠
         """
-        if len(pens) < 2:
+        if stop - start < 2:
             return False
         
-        # 找出所有笔的价格范围
-        all_highs = []
-        all_lows = []
+        # 直接使用创建笔时缓存的高低点
+        highs = self.pen_arrays.high[start:stop]
+        lows = self.pen_arrays.low[start:stop]
         
-        for pen in pens:
-            if pen['direction'] == 'up':
-                all_lows.append(pen['start_price'])
-                all_highs.append(pen['end_price'])
-            else:
-                all_highs.append(pen['start_price'])
-                all_lows.append(pen['end_price'])
-        
-        # 计算整体的最高高点和最低低点
-        max_high = max(all_highs)
-        min_low = min(all_lows)
-        
-        # 检查是否有重叠（至少三笔中任意两笔有重叠）
-        for i in range(len(pens)):
-            for j in range(i+1, len(pens)):
-                pen_i_high = pens[i]['end_price'] if pens[i]['direction'] == 'up' else pens[i]['start_price']
-                pen_i_low = pens[i]['start_price'] if pens[i]['direction'] == 'up' else pens[i]['end_price']
-                
-                pen_j_high = pens[j]['end_price'] if pens[j]['direction'] == 'up' else pens[j]['start_price']
-                pen_j_low = pens[j]['start_price'] if pens[j]['direction'] == 'up' else pens[j]['end_price']
-                
-                # 检查两笔是否有重叠
-                if not (pen_i_high < pen_j_low or pen_i_low > pen_j_high):
-                    return True
-        
-        return False
-    
-    def _is_segment_break(self, segment, new_pen):
+        # 检查是否有重叠（任意两笔有重叠），通过广播一次比较所有笔对
+        overlap = ~((highs[:, None] < lows[None, :]) | (lows[:, None] > highs[None, :]))
+        np.fill_diagonal(overlap, False)
+        return bool(overlap.any())
+    
+    def _is_segment_break(self, segment, new_pen_end, new_pen_dir):
         """
         检查新笔是否破坏了原线段
         
         参数:
         segment: 当前线段
-        new_pen: 新的笔
+        new_pen_end: 新笔的终点价格
+        new_pen_dir: 新笔的方向编码（DIRECTION_UP/DIRECTION_DOWN）
         
         返回:
         是否破坏原线段
         """
+        segment_up = segment['direction'] == 'up'
+        
         # 线段破坏的条件：新笔的方向与线段方向相反，且突破线段的高点或低点
-        if new_pen['direction'] == segment['direction']:
+        if (new_pen_dir == DIRECTION_UP) == segment_up:
             return False
         
         # 检查是否突破线段的极值点
-        if segment['direction'] == 'up':
+        # 低于某一笔的低点即低于各笔低点的最大值，高于某一笔的高点即高于各笔高点的最小值，均在划分线段时维护
+        if segment_up:
             # 向上线段被向下笔破坏的条件：向下笔的低点低于线段中某一笔的低点
-            for pen in segment['pens']:
-                # 由于我们的笔数据中没有存储high和low，这里使用价格范围估计
-                pen_low = min(pen['start_price'], pen['end_price'])
-                if new_pen['end_price'] < pen_low:
-                    return True
-        else:
-            # 向下线段被向上笔破坏的条件：向上笔的高点高于线段中某一笔的高点
-            for pen in segment['pens']:
-                pen_high = max(pen['start_price'], pen['end_price'])
-                if new_pen['end_price'] > pen_high:
-                    return True
-        
-        return False
+            return new_pen_end < segment['max_low']
+        # 向下线段被向上笔破坏的条件：向上笔的高点高于线段中某一笔的高点
+        return new_pen_end > segment['min_high']
     
     def calculate_macd(self, df, fast_period=12, slow_period=26, signal_period=9):
         """
@@ -938,18 +1425,18 @@ class ChanlunAnalyzer:
         返回:
         包含MACD指标的DataFrame
         """
-        # 计算EMA12和EMA26
-        df['ema12'] = df['close'].ewm(span=fast_period, adjust=False).mean()
-        df['ema26'] = df['close'].ewm(span=slow_period, adjust=False).mean()
-        
-        # 计算DIF
-        df['dif'] = df['ema12'] - df['ema26']
+        # 平滑系数与pandas一致：先由span换算质心com=(span-1)/2，再取alpha=1/(1+com)
+        alphas = [1.0 / (1.0 + (period - 1) / 2.0) for period in (fast_period, slow_period, signal_period)]
         
-        # 计算DEA（信号线）
-        df['dea'] = df['dif'].ewm(span=signal_period, adjust=False).mean()
+        # 一次遍历计算EMA12、EMA26、DIF和DEA（信号线）
+        close = df['close'].to_numpy(dtype=np.float64)
+        ema12, ema26, dif, dea = _macd_kernel(close, *alphas)
         
         # 计算MACD柱状图
-        df['macd'] = (df['dif'] - df['dea']) * 2
+        macd = (dif - dea) * 2
+        
+        # 所有结果一次性写回，避免逐列插入DataFrame
+        df[['ema12', 'ema26', 'dif', 'dea', 'macd']] = np.column_stack((ema12, ema26, dif, dea, macd))
         
         return df
     
@@ -966,23 +1453,17 @@ class ChanlunAnalyzer:
         返回:
         包含KDJ指标的DataFrame
         """
-        # 计算n日内最高价
-        df['highest'] = df['high'].rolling(window=n).max()
-        
-        # 计算n日内最低价
-        df['lowest'] = df['low'].rolling(window=n).min()
-        
-        # 计算RSV值
-        df['rsv'] = (df['close'] - df['lowest']) / (df['highest'] - df['lowest']) * 100
-        
-        # 计算K线
-        df['k'] = df['rsv'].ewm(com=m1-1, adjust=False).mean()
-        
-        # 计算D线
-        df['d'] = df['k'].ewm(com=m2-1, adjust=False).mean()
-        
-        # 计算J线
-        df['j'] = 3 * df['k'] - 2 * df['d']
+        # 平滑系数与pandas的ewm(com=m-1)一致：alpha=1/(1+com)
+        alpha_k = 1.0 / (1.0 + (m1 - 1))
+        alpha_d = 1.0 / (1.0 + (m2 - 1))
+        
+        # 一次遍历计算n日内最高价、最低价、RSV值以及K、D、J线
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        close = df['close'].to_numpy(dtype=np.float64)
+        # 所有结果一次性写回，避免逐列插入DataFrame
+        df[['highest', 'lowest', 'rsv', 'k', 'd', 'j']] = np.column_stack(
+            _kdj_kernel(high, low, close, n, alpha_k, alpha_d))
         
         return df
     
@@ -996,142 +1477,149 @@ class ChanlunAnalyzer:
         返回:
         中枢的列表
         """
-        if len(self.pens) < min_pens:
+        pen_arrays = self.pen_arrays
+        if len(pen_arrays) < min_pens:
             logger.warning(f"笔的数量不足，无法识别中枢（至少需要{min_pens}笔）")
             return []
         
+        # 笔和参数未变化时中枢结果不变，直接返回上次的结果
+        if self._centrals_key == (self._pens_version, min_pens):
+            return self.centrals
+        
         self.centrals = []
+        pens = self.pens
+        
+        # 一次性计算所有笔组合窗口的中枢条件和价格范围
+        is_central, central_highs, central_lows, central_types = self._central_windows(min_pens)
         
-        # 遍历所有可能的笔组合来寻找中枢
-        for i in range(len(self.pens) - min_pens + 1):
-            # 获取当前的笔组合
-            pen_group = self.pens[i:i+min_pens]
+        # 只处理满足中枢条件（有重叠区域且方向交替）的笔组合，重叠合并交由编译后的内核完成
+        positions = np.flatnonzero(is_central)
+        owner, merged_highs, merged_lows, merged_ends = _merge_centrals_kernel(
+            central_highs[positions], central_lows[positions],
+            pen_arrays.start_index[positions], pen_arrays.end_index[positions + min_pens - 1], 5)
+        
+        for i, k in zip(positions.tolist(), owner.tolist()):
+            # 只取当前笔组合的首尾两笔，不再复制整组笔
+            first_pen = pens[i]
+            last_pen = pens[i + min_pens - 1]
             
-            # 检查是否满足中枢条件：有重叠区域且方向交替
-            if self._is_central(pen_group):
-                # 计算中枢的价格范围
-                high_prices = []
-                low_prices = []
-                
-                for pen in pen_group:
-                    high_prices.append(max(pen['start_price'], pen['end_price']))
-                    low_prices.append(min(pen['start_price'], pen['end_price']))
-                
-                central_high = min(high_prices)  # 中枢的上沿是各组笔高点的最小值
-                central_low = max(low_prices)    # 中枢的下沿是各组笔低点的最大值
-                central_mid = (central_high + central_low) / 2
-                
-                # 确定中枢类型
-                # 根据笔的方向序列判断是上涨中枢还是下跌中枢
-                directions = [pen['direction'] for pen in pen_group]
-                if directions[0] == 'up' and directions[1] == 'down' and directions[2] == 'up':
-                    central_type = 'up'  # 上涨中枢
-                elif directions[0] == 'down' and directions[1] == 'up' and directions[2] == 'down':
-                    central_type = 'down'  # 下跌中枢
-                else:
-                    central_type = 'neutral'  # 中性中枢
-                
+            if k == len(self.centrals):
                 # 创建中枢
-                central = {
-                    'start_index': pen_group[0]['start_index'],
-                    'start_datetime': pen_group[0]['start_datetime'],
-                    'end_index': pen_group[-1]['end_index'],
-                    'end_datetime': pen_group[-1]['end_datetime'],
+                central_high = central_highs[i]
+                central_low = central_lows[i]
+                self.centrals.append({
+                    'start_index': first_pen.start_index,
+                    'start_datetime': first_pen.start_datetime,
+                    'end_index': last_pen.end_index,
+                    'end_datetime': last_pen.end_datetime,
                     'high': central_high,
                     'low': central_low,
-                    'mid': central_mid,
-                    'type': central_type,
-                    'pens': pen_group.copy(),
+                    'mid': (central_high + central_low) / 2,
+                    'type': str(central_types[i]),
+                    'pen_start': i,
+                    'pen_end': i + min_pens,
                     'range': central_high - central_low
-                }
-                
-                # 检查是否与已存在的中枢重叠，如果重叠则合并
-                merged = False
-                for existing_central in self.centrals:
-                    if self._centrals_overlap(existing_central, central):
-                        # 合并中枢
-                        existing_central['high'] = max(existing_central['high'], central['high'])
-                        existing_central['low'] = min(existing_central['low'], central['low'])
-                        existing_central['mid'] = (existing_central['high'] + existing_central['low']) / 2
-                        existing_central['end_index'] = max(existing_central['end_index'], central['end_index'])
-                        existing_central['end_datetime'] = max(existing_central['end_datetime'], central['end_datetime'])
-                        existing_central['pens'].extend(central['pens'])
-                        merged = True
-                        break
-                
-                if not merged:
-                    self.centrals.append(central)
-        
+                })
+            else:
+                # 合并到已存在的中枢
+                existing_central = self.centrals[k]
+                existing_central['end_datetime'] = max(existing_central['end_datetime'], last_pen.end_datetime)
+                existing_central['pen_end'] = max(existing_central['pen_end'], i + min_pens)
+        
+        # 写回合并后的价格范围和结束位置
+        for central, central_high, central_low, end_index in zip(
+                self.centrals, merged_highs, merged_lows, merged_ends.tolist()):
+            central['high'] = central_high
+            central['low'] = central_low
+            central['mid'] = (central_high + central_low) / 2
+            central['end_index'] = end_index
+        
+        self._centrals_key = (self._pens_version, min_pens)
         logger.info(f"成功识别 {len(self.centrals)} 个中枢")
         return self.centrals
     
-    def _is_central(self, pen_group):
-        """
-        检查一组笔是否形成中枢
-        
-        参数:
-        pen_group: 笔的列表
-        
-        返回:
-        是否形成中枢
-        """
-        if len(pen_group) < 3:
-            return False
-        
-        # 检查是否有重叠区域
-        if not self._has_overlap(pen_group):
-            return False
-        
-        # 检查笔的方向是否符合中枢的基本结构
-        directions = [pen['direction'] for pen in pen_group]
-        
-        if len(pen_group) == 3:
-            # 三笔中枢的基本结构：上-下-上 或 下-上-下
-            if (directions[0] == 'up' and directions[1] == 'down' and directions[2] == 'up') or \
-               (directions[0] == 'down' and directions[1] == 'up' and directions[2] == 'down'):
-                return True
-        else:
-            # 对于更多笔的中枢，检查是否包含基本的三笔中枢结构
-            # 遍历所有可能的三笔组合，检查是否存在基本的中枢结构
-            for i in range(len(pen_group) - 2):
-                sub_directions = directions[i:i+3]
-                if (sub_directions[0] == 'up' and sub_directions[1] == 'down' and sub_directions[2] == 'up') or \
-                   (sub_directions[0] == 'down' and sub_directions[1] == 'up' and sub_directions[2] == 'down'):
-                    return True
-        
-        # 默认返回False
-        return False
-    
-    def _centrals_overlap(self, central1, central2):
+    def _central_windows(self, min_pens):
         """
-        检查两个中枢是否重叠
+        一次性计算所有连续min_pens笔组合的中枢条件和价格范围
         
         参数:
-        central1: 第一个中枢
-        central2: 第二个中枢
+        min_pens: 形成中枢所需的最少笔数量
         
         返回:
-        是否重叠
+        (是否形成中枢的布尔数组, 中枢上沿数组, 中枢下沿数组, 中枢类型数组)，按组合起点位置索引
         """
-        # 检查价格范围是否重叠
-        price_overlap = not (central1['high'] < central2['low'] or central1['low'] > central2['high'])
-        
-        # 检查时间范围是否连续或重叠
-        time_overlap = not (central1['end_index'] < central2['start_index'] - 5 or \
-                           central1['start_index'] > central2['end_index'] + 5)
-        
-        return price_overlap and time_overlap
+        pen_arrays = self.pen_arrays
+        high, low, direction = pen_arrays.high, pen_arrays.low, pen_arrays.direction
+        n_windows = len(pen_arrays) - min_pens + 1
+        
+        # 中枢的上沿是各组笔高点的最小值，下沿是各组笔低点的最大值
+        central_highs = sliding_window_view(high, min_pens).min(axis=1)
+        central_lows = sliding_window_view(low, min_pens).max(axis=1)
+        
+        if min_pens < 3:
+            return np.zeros(n_windows, dtype=bool), central_highs, central_lows, np.full(n_windows, 'neutral')
+        
+        # 检查是否有重叠区域：组合内任意两笔的价格区间相交
+        # 按两笔的间隔逐一计算相交标记，再用滑动窗口判断组合内是否存在相交的笔对
+        has_overlap = np.zeros(n_windows, dtype=bool)
+        for gap in range(1, min_pens):
+            pair_overlap = ~((high[:-gap] < low[gap:]) | (low[:-gap] > high[gap:]))
+            has_overlap |= sliding_window_view(pair_overlap, min_pens - gap).any(axis=1)
+        
+        # 把连续三笔的方向打包成位模式（第k笔向上则第k位为1），上-下-上为0b101，下-上-下为0b010
+        up = (direction == DIRECTION_UP).astype(np.uint8)
+        pattern = up[:-2] | (up[1:-1] << 1) | (up[2:] << 2)
+        
+        # 检查笔的方向是否包含中枢的基本结构：上-下-上 或 下-上-下
+        # 三笔时只检查这一组，更多笔时检查任意连续三笔
+        alternating = (pattern == 0b101) | (pattern == 0b010)
+        has_alternation = sliding_window_view(alternating, min_pens - 2).any(axis=1)
+        
+        # 根据组合前三笔的方向模式判断是上涨中枢、下跌中枢还是中性中枢
+        first_pattern = pattern[:n_windows]
+        central_types = np.where(first_pattern == 0b101, 'up', np.where(first_pattern == 0b010, 'down', 'neutral'))
+        
+        return has_overlap & has_alternation, central_highs, central_lows, central_types
 
-def main(stock_code="sh600000", use_mock_data=False, save_chart=None):
+# 股票代码格式：带交易所前缀（可带点号，如sh.600000）或纯数字代码
+_CODE_RE = re.compile(r'(sh|sz|hk)\.?(.*)|(\d+)')
+
+
+def _normalize_code(stock_code):
     """
-    主程序入口，执行完整的缠论分析流程
+    将多种格式的股票代码转换为标准格式
     
     参数:
-    stock_code: 股票代码，默认为浦发银行(sh600000)
-    use_mock_data: 是否使用模拟数据，默认为False
-    save_chart: 保存图表的路径，默认为None（不保存）
+    stock_code: 原始股票代码，如 sh600000、sh.600000、600000、09988
+    
+    返回:
+    标准格式的股票代码，格式不正确时返回默认代码sh600000
     """
-    # 解析命令行参数
+    code = stock_code.strip().lower().replace('.hk', 'hk')
+    match = _CODE_RE.fullmatch(code)
+    if match is None:
+        logger.warning(f"警告：股票代码{code}格式不正确，将使用默认股票代码")
+        return "sh600000"
+    
+    prefix, rest, digits = match.groups()
+    if prefix:
+        # 移除前缀后的点号
+        return prefix + rest
+    
+    # 添加缺少的前缀
+    if len(digits) == 6:
+        # 上海或深圳证券交易所股票代码（6位数字）
+        return f"sh{digits}" if digits.startswith('6') else f"sz{digits}"
+    if len(digits) in (4, 5):
+        # 香港证券交易所股票代码（4-5位数字）
+        return f"hk{digits}"
+    logger.warning(f"警告：股票代码{digits}格式不正确，将使用默认股票代码")
+    return "sh600000"
+
+
+@lru_cache(maxsize=None)
+def _build_arg_parser(stock_code, use_mock_data, save_chart):
+    """构建命令行参数解析器，相同默认值的解析器只创建一次"""
     parser = argparse.ArgumentParser(description='缠论自动分析系统')
     parser.add_argument('-c', '--code', type=str, default=stock_code, 
                         help='股票代码，支持格式：sh600000（浦发银行）、sz000001（平安银行）、hk09988（阿里巴巴）等')
@@ -1141,6 +1629,20 @@ def main(stock_code="sh600000", use_mock_data=False, save_chart=None):
     parser.add_argument('-p', '--period', type=str, default='1min', 
                         choices=['1min', '5min', '15min', '30min', '60min', '1d', '1w', '1M'],
                         help='K线周期，支持：1min（1分钟）、5min（5分钟）、15min（15分钟）、30min（30分钟）、60min（60分钟）、1d（日线）、1w（周线）、1M（月线）')
+    return parser
+
+
+def main(stock_code="sh600000", use_mock_data=False, save_chart=None):
+    """
+    主程序入口，执行完整的缠论分析流程
+    
+    参数:
+    stock_code: 股票代码，默认为浦发银行(sh600000)
+    use_mock_data: 是否使用模拟数据，默认为False
+    save_chart: 保存图表的路径，默认为None（不保存）
+    """
+    # 解析命令行参数
+    parser = _build_arg_parser(stock_code, use_mock_data, save_chart)
     
     # 打印调试信息
     logger.debug(f"[调试] 原始命令行参数: {sys.argv}")
@@ -1187,30 +1689,7 @@ def main(stock_code="sh600000", use_mock_data=False, save_chart=None):
     if stock_code:
         # 支持多种股票代码格式，自动转换为标准格式
         original_code = stock_code
-        stock_code = stock_code.strip().lower()
-        # 移除可能的前缀
-        stock_code = stock_code.replace('sh.', 'sh')
-        stock_code = stock_code.replace('sz.', 'sz')
-        stock_code = stock_code.replace('hk.', 'hk')
-        stock_code = stock_code.replace('.hk', 'hk')
-        
-        # 添加缺少的前缀
-        if stock_code.isdigit():
-            if len(stock_code) == 6:
-                # 上海或深圳证券交易所股票代码（6位数字）
-                if stock_code.startswith('6'):
-                    stock_code = f"sh{stock_code}"
-                else:
-                    stock_code = f"sz{stock_code}"
-            elif len(stock_code) in [4, 5]:
-                # 香港证券交易所股票代码（4-5位数字）
-                stock_code = f"hk{stock_code}"
-            else:
-                logger.warning(f"警告：股票代码{stock_code}格式不正确，将使用默认股票代码")
-                stock_code = "sh600000"
-        elif not (stock_code.startswith('sh') or stock_code.startswith('sz') or stock_code.startswith('hk')):
-            logger.warning(f"警告：股票代码{stock_code}格式不正确，将使用默认股票代码")
-            stock_code = "sh600000"
+        stock_code = _normalize_code(stock_code)
         
         # 输出处理后的股票代码
         if original_code != stock_code:
@@ -1244,7 +1723,7 @@ def main(stock_code="sh600000", use_mock_data=False, save_chart=None):
         analyzer.identify_fractals(df)
         filtered_fractals = analyzer.filter_fractals(df)
         
-        print(f"识别到 {len([f for f in filtered_fractals if f[3] == 'top'])} 个顶分型，{len([f for f in filtered_fractals if f[3] == 'bottom'])} 个底分型")
+        print(f"识别到 {len(analyzer.top_fractal_arrays)} 个顶分型，{len(analyzer.bottom_fractal_arrays)} 个底分型")
         
         # 4. 划分笔
         print(f"\n[步骤3] 正在划分笔...")
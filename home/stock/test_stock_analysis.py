@@ -0,0 +1,127 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+# 导入被测模块
+import stock_analysis
+
+def reference_frame():
+    """由正弦波叠加生成的确定性日K线，不依赖随机数"""
+    i = np.arange(160)
+    close = np.round(10 + 2 * np.sin(i / 6) + 0.8 * np.sin(i / 1.7) + 0.3 * np.cos(i / 0.9), 2)
+    return pd.DataFrame({'open': np.r_[close[0], close[:-1]], 'close': close,
+                         'high': close + 0.05, 'low': close - 0.05, 'volume': 1000.0},
+                        index=pd.date_range('2024-01-02', periods=len(i), freq='D'))
+
+
+def make_pens(points):
+    """按(K线位置, 价格, 分型类型)端点列表构造首尾相接的笔字典"""
+    times = pd.date_range('2024-01-02', periods=points[-1][0] + 1, freq='D')
+    pens = []
+    for (i0, p0, t0), (i1, p1, t1) in zip(points[:-1], points[1:]):
+        pens.append({'start_index': i0, 'start_datetime': times[i0], 'start_price': p0, 'start_type': t0,
+                     'end_index': i1, 'end_datetime': times[i1], 'end_price': p1, 'end_type': t1,
+                     'direction': 'up' if p1 > p0 else 'down', 'length': abs(i1 - i0),
+                     'price_change': abs(p1 - p0), 'price_change_percent': abs(p1 - p0) / p0})
+    return pens
+
+
+def central_summary(centrals):
+    """中枢的起止位置、价格区间和类型"""
+    return [(c['start_index'], c['end_index'], round(float(c['high']), 2), round(float(c['low']), 2), c['type'])
+            for c in centrals]
+
+
+class TestReferenceOutput:
+    """测试笔和中枢与改写前的逐笔实现在固定数据上的结果一致"""
+
+    def test_pipeline_on_reference_frame(self):
+        """测试分型、笔、中枢的完整流程"""
+        analyzer = stock_analysis.ChanlunAnalyzer()
+        df = analyzer.identify_fractals(reference_frame())
+        analyzer.divide_pens(df, analyzer.filter_fractals(df))
+        analyzer.validate_pens()
+
+        # 笔首尾相接，按K线位置列出所有端点
+        pens = analyzer.pens
+        assert [pen.start_index for pen in pens] + [pens[-1].end_index] == [
+            5, 8, 12, 20, 23, 30, 35, 37, 45, 53, 56, 61, 68, 71, 79,
+            82, 86, 94, 97, 104, 113, 115, 120, 127, 130, 138, 141, 145, 153, 156]
+        assert central_summary(analyzer.identify_centrals()) == [
+            (5, 20, 11.91, 10.84, 'down'), (8, 23, 9.7, 10.84, 'up'), (12, 45, 10.08, 8.7, 'down'),
+            (35, 53, 10.08, 10.67, 'down'), (37, 61, 11.28, 10.67, 'up'), (53, 68, 9.06, 10.67, 'up'),
+            (56, 79, 9.06, 7.89, 'down'), (68, 82, 9.06, 10.72, 'down'), (71, 94, 11.96, 10.72, 'up'),
+            (82, 97, 9.73, 10.72, 'up'), (86, 120, 9.93, 9.06, 'down'), (113, 127, 9.93, 10.62, 'down'),
+            (115, 138, 11.69, 10.62, 'up'), (127, 141, 9.09, 10.62, 'up'), (130, 153, 9.09, 7.75, 'down'),
+            (141, 156, 9.09, 10.73, 'down')]
+
+    def test_validate_and_merge_hand_built_pens(self):
+        """测试同向笔的合并以及重叠中枢的合并"""
+        analyzer = stock_analysis.ChanlunAnalyzer()
+        analyzer.pens = make_pens([
+            (0, 10.0, 'bottom'), (4, 11.0, 'top'), (8, 10.2, 'bottom'), (12, 12.0, 'top'), (15, 12.5, 'top'),
+            (19, 10.6, 'bottom'), (19, 10.4, 'bottom'), (23, 11.8, 'top'), (27, 10.9, 'bottom'), (31, 11.5, 'top'),
+            (35, 9.0, 'bottom'), (38, 8.5, 'bottom'), (42, 9.8, 'top'), (46, 9.1, 'bottom'), (50, 9.6, 'top'),
+            (54, 9.3, 'bottom'), (58, 11.0, 'top')])
+
+        # 第4、6、11笔与前一笔同向且价格变动更小，被去掉
+        analyzer.validate_pens()
+        assert [(pen.start_index, pen.end_index) for pen in analyzer.pens] == [
+            (0, 4), (4, 8), (8, 12), (15, 19), (19, 23), (23, 27), (27, 31), (31, 35),
+            (38, 42), (42, 46), (46, 50), (50, 54), (54, 58)]
+        assert central_summary(analyzer.identify_centrals()) == [
+            (0, 35, 11.8, 10.2, 'up'), (27, 42, 9.8, 10.9, 'up'), (31, 58, 9.8, 9.1, 'down')]
+
+
+class TestValidatePensKernel:
+    """测试笔验证内核的方向交替处理"""
+
+    def test_removes_weakest_of_violating_triple(self):
+        """测试过滤短笔后出现同向笔时，移除三笔中价格变动最小的一笔"""
+        direction = np.array([1, -1, 1, -1, 1], dtype=np.int8)
+        end_price = np.array([11.0, 10.0, 10.5, 9.0, 12.0])
+        pct = np.array([0.05, 0.01, 0.02, 0.03, 0.04])
+        length = np.array([5, 5, 0, 5, 5])
+
+        # 第3笔长度不足被过滤后，第2、4笔同向，三笔组合中第2笔价格变动最小
+        keep = stock_analysis._validate_pens_kernel(direction, end_price, pct, length, 5)
+        assert keep.tolist() == [0, 3, 4]
+
+
+class TestIndicators:
+    """测试技术指标内核与pandas实现结果一致"""
+
+    def test_calculate_macd_matches_pandas_ewm(self):
+        """测试MACD与pandas的ewm实现逐位一致"""
+        rng = np.random.default_rng(2)
+        close = pd.Series(10 + np.cumsum(rng.normal(0, 0.1, 200)))
+        close[[5, 50, 51]] = np.nan
+        df = pd.DataFrame({'close': close})
+
+        result = stock_analysis.ChanlunAnalyzer().calculate_macd(df.copy())
+
+        ema12 = close.ewm(span=12, adjust=False).mean()
+        ema26 = close.ewm(span=26, adjust=False).mean()
+        dea = (ema12 - ema26).ewm(span=9, adjust=False).mean()
+        assert np.array_equal(result['ema12'].to_numpy(), ema12.to_numpy(), equal_nan=True)
+        assert np.array_equal(result['ema26'].to_numpy(), ema26.to_numpy(), equal_nan=True)
+        assert np.array_equal(result['dea'].to_numpy(), dea.to_numpy(), equal_nan=True)
+
+    def test_calculate_kdj_matches_pandas_rolling(self):
+        """测试KDJ与pandas的rolling和ewm实现逐位一致"""
+        rng = np.random.default_rng(3)
+        close = 10 + np.cumsum(rng.normal(0, 0.1, 200))
+        df = pd.DataFrame({'close': close, 'high': close + rng.uniform(0, 0.2, 200),
+                           'low': close - rng.uniform(0, 0.2, 200)})
+        df.loc[[20, 100], 'high'] = np.nan
+
+        result = stock_analysis.ChanlunAnalyzer().calculate_kdj(df.copy())
+
+        highest = df['high'].rolling(window=9).max()
+        lowest = df['low'].rolling(window=9).min()
+        k = ((df['close'] - lowest) / (highest - lowest) * 100).ewm(com=2, adjust=False).mean()
+        d = k.ewm(com=2, adjust=False).mean()
+        assert np.array_equal(result['highest'].to_numpy(), highest.to_numpy(), equal_nan=True)
+        assert np.array_equal(result['lowest'].to_numpy(), lowest.to_numpy(), equal_nan=True)
+        assert np.array_equal(result['k'].to_numpy(), k.to_numpy(), equal_nan=True)
+        assert np.array_equal(result['j'].to_numpy(), (3 * k - 2 * d).to_numpy(), equal_nan=True)
@@ -5,186 +5,325 @@ import numpy as np
 import datetime
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
 import os
+import sys
+import traceback
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib
 import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+from matplotlib.collections import PolyCollection, LineCollection
 import matplotlib.dates as mdates
+from PIL import Image
 import sqlite3
+import io
+import itertools
+import re
+from functools import lru_cache
 import json  # 添加json模块导入
+import logging
+from contextlib import contextmanager
+
+# K线实体计算内核和颜色表与缠论图共用同一份实现
+from stock_chart import BAR_COLORS, _compute_bars
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json（同样可直接解析bytes）
+    _json_loads = json.loads
+
+try:
+    import duckdb
+except ImportError:  # duckdb为可选依赖，未安装时数据库查询只使用SQLite引擎
+    duckdb = None
+
+# 调试输出使用日志记录器：默认不输出DEBUG级别，热路径上不再格式化和打印请求URL、完整响应等调试信息
+logger = logging.getLogger(__name__)
+
+# Windows 10及以上的控制台需要先执行一次空命令以启用ANSI转义序列
+if os.name == 'nt':
+    os.system('')
 
 # 设置中文显示
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+# SQLite连接级参数：synchronous=NORMAL在WAL模式下只在检查点时fsync，临时表放内存，页缓存扩大到64MB并启用内存映射
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+)
+
+# K线图导出分辨率
+CHART_DPI = 100
+
+# 非交互式matplotlib后端，只有这些后端可以在后台线程中安全绘图
+NON_INTERACTIVE_BACKENDS = ('agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template')
+
+# 东方财富K线字段：日期、开盘价、收盘价、最高价、最低价、成交量、成交额（其后的字段不使用）
+KLINE_COLUMNS = ['date', 'open', 'close', 'high', 'low', 'volume', 'amount']
+# 日期字段长度对应的格式：日线及以上、分钟线
+KLINE_DATE_FORMATS = {10: '%Y-%m-%d', 16: '%Y-%m-%d %H:%M', 19: '%Y-%m-%d %H:%M:%S'}
+# 价格使用float32以减少每次重绘的数据量；成交量可能带小数点，先按浮点数解析再转为整数；
+# 成交额位数较多，保留float64
+KLINE_PRICE_COLUMNS = ['open', 'close', 'high', 'low']
+KLINE_DTYPES = {'open': 'float32', 'close': 'float32', 'high': 'float32', 'low': 'float32',
+                'volume': 'float64', 'amount': 'float64'}
+
+def _bar_verts(left, bottom, width, height):
+    """
+    一次性计算一组矩形的顶点，供PolyCollection直接使用，无需逐个创建矩形对象
+    :param left: 矩形左边界数组
+    :param bottom: 矩形底边数组或标量
+    :param width: 矩形宽度
+    :param height: 矩形高度数组
+    :return: 形状为(N, 4, 2)的顶点数组
+    """
+    left = np.asarray(left, dtype=np.float64)
+    top = bottom + np.asarray(height, dtype=np.float64)
+    verts = np.empty((len(left), 4, 2))
+    verts[:, [0, 3], 0] = left[:, None]
+    verts[:, [1, 2], 0] = (left + width)[:, None]
+    verts[:, [0, 1], 1] = np.broadcast_to(bottom, left.shape)[:, None]
+    verts[:, [2, 3], 1] = top[:, None]
+    return verts
+
+# 新浪行情中价格字段的位置，依次为：当前价、昨收价、开盘价、最高价、最低价
+SINA_A_PRICE_INDEX = (3, 2, 1, 4, 5)
+SINA_HK_PRICE_INDEX = (2, 1, 3, 4, 5)
+
+def _f(b):
+    """将字节串转换为浮点数，空字段按0处理（float可直接解析bytes）"""
+    return float(b) if b else 0.0
+
+# 新浪行情响应中的一行：var hq_str_<新浪代码>="<逗号分隔的字段>";
+_SINA_QUOTE_RE = re.compile(rb'hq_str_(\w+)="([^"]*)"')
+
+def _parse_sina_quote(payload, code, price_index, hk=False):
+    """
+    直接在原始字节上解析新浪行情字段，只解码股票名称
+    :param payload: 引号内的行情字段（bytes）
+    :param code: 股票代码
+    :param price_index: 价格字段位置元组
+    :param hk: 是否为港股（港股的日期和时间字段顺序相反）
+    :return: 实时数据字典，如果数据不完整返回None
+    """
+    parts = payload.split(b',')
+    if len(parts) < 10:
+        print(f"行情数据不完整: {parts}")
+        return None
+    
+    price, pre_close, open_p, high, low = map(_f, (parts[i] for i in price_index))
+    date_time = (parts[-2], parts[-3]) if hk else (parts[-3], parts[-2])
+    return {
+        'symbol': code,
+        'name': parts[0].decode('gbk'),
+        'price': price,
+        'pre_close': pre_close,
+        'open': open_p,
+        'high': high,
+        'low': low,
+        'volume': int(parts[8]) if parts[8] else 0,
+        'amount': _f(parts[9]),
+        'time': b' '.join(date_time).decode('ascii')
+    }
+
+# 六位A股代码的前缀对应的市场：先按前两位查找，再按首位查找，都没有时为港股
+MARKET_BY_PREFIX = {'00': 'sz', '30': 'sz', '60': 'sh', '4': 'bj', '8': 'bj'}
+
+def _market_code(code):
+    """
+    根据股票代码判断市场类型，用前缀查表代替逐个startswith判断
+    :param code: 股票代码
+    :return: 市场类型（sh/sz/bj/hk）
+    """
+    if len(code) != 6:
+        return 'hk'
+    return MARKET_BY_PREFIX.get(code[:2]) or MARKET_BY_PREFIX.get(code[0], 'hk')
+
+@lru_cache(maxsize=2048)
+def _stock_config(code, time_range):
+    """
+    根据股票代码和时间范围生成东方财富网的请求配置，按参数缓存
+    :param code: 股票代码
+    :param time_range: 时间范围
+    :return: 包含市场代码、referer、secid、klt、lmt的配置字典（调用方不应修改）
+    """
+    if code.startswith('6'):
+        # 上证股票
+        market_code = '1'
+        referer = 'https://quote.eastmoney.com/'
+    elif code.startswith(('00', '000', '001', '002', '003', '30')) and len(code) == 6:
+        # 深证股票：000xxx（深市主板）、002xxx（中小板）、300xxx（创业板）
+        market_code = '0'
+        referer = 'https://quote.eastmoney.com/'
+    else:
+        # 港股股票（通常是5位或6位数字）
+        market_code = '116'
+        referer = 'https://hkstock.eastmoney.com/'
+    
+    # 构建东方财富网的secid
+    secid = f"{market_code}.{code}"
+    
+    # 设置时间周期参数
+    if time_range == 'year':
+        klt = 104  # 年线
+        lmt = 20  # 约20年的年线数据
+    elif time_range == 'month':
+        klt = 103  # 月线
+        lmt = 36  # 约3年的月线数据
+    elif time_range == 'week':
+        klt = 102  # 周线
+        lmt = 250  # 约5年的周线数据
+    elif time_range == 'day':
+        klt = 101  # 日线
+        lmt = 100  # 约100个交易日的数据
+    elif time_range == '60min':
+        klt = 60  # 60分钟线
+        lmt = 100  # 默认获取100条60分钟数据
+    elif time_range == '30min':
+        klt = 30  # 30分钟线
+        lmt = 200  # 默认获取200条30分钟数据
+    elif time_range == '15min':
+        klt = 15  # 15分钟线
+        lmt = 300  # 默认获取300条15分钟数据
+    elif time_range == '5min':
+        klt = 5  # 5分钟线
+        lmt = 500  # 默认获取500条5分钟数据
+    elif time_range == '1min':
+        klt = 1  # 1分钟线
+        lmt = 1000  # 默认获取1000条1分钟数据
+    else:
+        klt = 101  # 默认使用日线
+        lmt = 100
+    
+    return {
+        'market_code': market_code,
+        'referer': referer,
+        'secid': secid,
+        'klt': klt,
+        'lmt': lmt
+    }
+
 class StockDataFetcher:
     """股票数据获取器类，封装所有数据获取方法"""
     
-    def __init__(self):
-        """初始化会话"""
+    # 新浪财经行情接口的请求头
+    sina_headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': '*/*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Referer': 'https://finance.sina.com.cn/',
+        'Connection': 'keep-alive',
+        # 只声明urllib3能够解压的编码：未安装brotli时声明br会收到无法解码的响应
+        'Accept-Encoding': ACCEPT_ENCODING
+    }
+    
+    def __init__(self, cache_ttl=60):
+        """
+        初始化会话
+        :param cache_ttl: K线缓存有效期（秒），过期后只增量获取最近几条K线
+        """
         self.session = requests.Session()
+        # 复用连接池，并对临时性网络错误和服务端错误做退避重试
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.today_data = None
+        # K线缓存：(股票代码, 时间范围) -> DataFrame / 上次获取时间
+        self.cache_ttl = cache_ttl
+        self._kline_cache = {}
+        self._kline_ts = {}
         # 添加更完整的请求头，模拟浏览器请求
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'http://quote.eastmoney.com/',
-            'Accept-Encoding': 'gzip, deflate',
+            'Accept-Encoding': ACCEPT_ENCODING,
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'Connection': 'keep-alive'
         })
     
     def get_market_code(self, code):
         """根据股票代码判断市场类型"""
-        if (code.startswith('00') or code.startswith('30')) and len(code) == 6:
-            return 'sz'
-        elif code.startswith('60') and len(code) == 6:
-            return 'sh'
-        elif (code.startswith('8') or code.startswith('4')) and len(code) == 6:
-            return 'bj'
-        else:
-            return 'hk'
+        return _market_code(code)
 
     def get_real_time_data(self, code):
         """
         获取港股或A股实时数据
         """
-        try:
-            if not code:
-                print("股票代码为空")
-                return None
-
-            print(f"获取{code}的实时数据开始")
-            market_code = self.get_market_code(code)
-            print(f"market_code: {market_code}")
-            
-            if market_code == 'hk':
-                # 优先使用新浪财经接口获取港股实时数据
-                real_time_data = self._get_hk_stock_data_from_sina(code)
-                if real_time_data:
-                    return real_time_data
-                else:
-                    # 新浪财经接口失败，尝试使用东方财富网接口
-                    print("新浪财经接口获取失败，尝试使用东方财富网接口")
-                    return self._get_hk_stock_data_from_eastmoney(code)
-            else:
-                # 获取A股实时数据
-                if market_code == 'sh':
-                    sina_code = f"sh{code}"
-                elif market_code == 'sz':
-                    sina_code = f"sz{code}"
-                elif market_code == 'bj':
-                    sina_code = f"bj{code}"
-                else:
-                    print(f"未知的市场代码: {market_code}")
-                    return None
-                
-                url = f"https://hq.sinajs.cn/list={sina_code}"
-                print(f"A股URL: {url}")
-                
-                # 构建完整的请求头
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Accept': '*/*',
-                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                    'Referer': 'https://finance.sina.com.cn/',
-                    'Connection': 'keep-alive',
-                    'Accept-Encoding': 'gzip, deflate, br'
-                }
-                
-                response = self.session.get(url, headers=headers)
-                print(f"响应状态码: {response.status_code}")
-                print(f"响应内容类型: {response.headers.get('Content-Type')}")
-                
-                if response.status_code == 200:
-                    # 解码响应内容
-                    response.encoding = 'gb2312'
-                    content = response.text
-                    print(f"响应内容长度: {len(content)}")
-                    print(f"响应内容: {content[:200]}...")
-                    
-                    # A股数据格式：var hq_str_sh600000="浦发银行,10.15,10.16,10.13,10.18,10.12,10.13,10.14,11443414,116052386.000,306800,10.13,125100,10.12,157500,10.11,123900,10.10,470400,10.14,301400,10.15,250400,10.16,138700,10.17,81700,10.18,2024-11-29,15:00:00,00"
-                    data_str = content.split('"')[1]
-                    data_list = data_str.split(',')
-                    print(f"A股数据列表长度: {len(data_list)}")
-                    
-                    if len(data_list) >= 10:
-                        return {
-                            'symbol': code,
-                            'name': data_list[0],
-                            'price': float(data_list[3]),
-                            'pre_close': float(data_list[2]),
-                            'open': float(data_list[1]),
-                            'high': float(data_list[4]),
-                            'low': float(data_list[5]),
-                            'volume': int(data_list[8]),
-                            'amount': float(data_list[9]),
-                            'time': data_list[-3] + ' ' + data_list[-2]
-                        }
-                    else:
-                        print(f"A股数据不完整: {data_list}")
-                        return None
-                else:
-                    print(f"请求失败，状态码: {response.status_code}")
-                    # 打印响应内容以了解更多信息
-                    print(f"响应内容: {response.text[:500]}...")
-                    return None
-        except Exception as e:
-            print(f"获取实时数据错误: {e}")
-            import traceback
-            traceback.print_exc()
+        if not code:
+            print("股票代码为空")
             return None
+        return self.get_real_time_data_batch([code]).get(code)
     
-    def _get_hk_stock_data_from_sina(self, code):
+    def get_real_time_data_batch(self, codes):
         """
-        使用新浪财经接口获取港股数据
+        通过新浪财经的list=接口一次请求获取多只股票（A股和港股）的实时数据
+        港股在新浪财经接口中没有数据时，再单独使用东方财富网接口获取
+        :param codes: 股票代码列表
+        :return: {股票代码: 实时数据字典}，获取失败的股票不在结果中
         """
-        url = f"https://hq.sinajs.cn/list=r_hk{code}"
-        print(f"港股新浪财经URL: {url}")
-        
-        # 构建完整的请求头
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': '*/*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://finance.sina.com.cn/',
-            'Connection': 'keep-alive',
-            'Accept-Encoding': 'gzip, deflate, br'
-        }
-        
-        response = self.session.get(url, headers=headers)
-        print(f"新浪财经响应状态码: {response.status_code}")
+        result = {}
+        # 新浪代码 -> (股票代码, 价格字段位置, 是否为港股)
+        sina_codes = {}
+        for code in codes:
+            market_code = self.get_market_code(code)
+            if market_code == 'hk':
+                sina_codes[f"r_hk{code}"] = (code, SINA_HK_PRICE_INDEX, True)
+            else:
+                sina_codes[f"{market_code}{code}"] = (code, SINA_A_PRICE_INDEX, False)
+        if not sina_codes:
+            return result
         
-        if response.status_code == 200:
-            # 解码响应内容
-            response.encoding = 'gb2312'
-            content = response.text
-            print(f"新浪财经响应内容长度: {len(content)}")
-            print(f"新浪财经响应内容: {content[:200]}...")
+        try:
+            url = f"https://hq.sinajs.cn/list={','.join(sina_codes)}"
+            logger.debug("新浪财经URL: %s", url)
             
-            # 解析港股数据
-            # 港股数据格式：var hq_str_r_hk00700="腾讯控股,351.600,351.600,349.200,351.800,346.000,349.200,349.400,24364946,8512798280,83900,349.200,11400,349.000,7900,348.800,1800,348.600,2700,348.400,15000,349.400,5200,349.600,2100,349.800,2300,350.000,1900,350.200,2024-11-29,16:08:01,00"
-            if '"' in content:
-                data_str = content.split('"')[1]
-                data_list = data_str.split(',')
-                print(f"港股数据列表长度: {len(data_list)}")
-                
-                if len(data_list) >= 10:
-                    return {
-                        'symbol': code,
-                        'name': data_list[0],
-                        'price': float(data_list[2]),
-                        'pre_close': float(data_list[1]),
-                        'open': float(data_list[3]),
-                        'high': float(data_list[4]),
-                        'low': float(data_list[5]),
-                        'volume': int(data_list[8]),
-                        'amount': float(data_list[9]),
-                        'time': data_list[-2] + ' ' + data_list[-3]
-                    }
-                else:
-                    print(f"港股数据不完整: {data_list}")
-        return None
+            response = self.session.get(url, headers=self.sina_headers)
+            
+            if response.status_code == 200:
+                # 每只股票一行，格式：var hq_str_sh600000="浦发银行,10.15,10.16,10.13,10.18,10.12,10.13,10.14,11443414,116052386.000,306800,10.13,125100,10.12,157500,10.11,123900,10.10,470400,10.14,301400,10.15,250400,10.16,138700,10.17,81700,10.18,2024-11-29,15:00:00,00";
+                # 港股格式：var hq_str_r_hk00700="腾讯控股,351.600,351.600,349.200,351.800,346.000,349.200,349.400,24364946,8512798280,83900,349.200,11400,349.000,7900,348.800,1800,348.600,2700,348.400,15000,349.400,5200,349.600,2100,349.800,2300,350.000,1900,350.200,2024-11-29,16:08:01,00";
+                # 一次正则扫描取出所有股票的新浪代码和引号内的字段
+                for match in _SINA_QUOTE_RE.finditer(response.content):
+                    entry = sina_codes.get(match.group(1).decode('ascii'))
+                    if entry is None:
+                        continue
+                    code, price_index, hk = entry
+                    real_time_data = _parse_sina_quote(match.group(2), code, price_index, hk)
+                    if real_time_data:
+                        result[code] = real_time_data
+            else:
+                print(f"请求失败，状态码: {response.status_code}")
+                # 打印响应内容以了解更多信息
+                print(f"响应内容: {response.text[:500]}...")
+        except Exception as e:
+            print(f"获取实时数据错误: {e}")
+            traceback.print_exc()
         
+        # 新浪财经接口未返回数据的港股，尝试使用东方财富网接口
+        for code, _, hk in sina_codes.values():
+            if hk and code not in result:
+                print("新浪财经接口获取失败，尝试使用东方财富网接口")
+                try:
+                    real_time_data = self._get_hk_stock_data_from_eastmoney(code)
+                except Exception as e:
+                    print(f"获取实时数据错误: {e}")
+                    traceback.print_exc()
+                    continue
+                if real_time_data:
+                    result[code] = real_time_data
+        return result
+    
     def _get_hk_stock_data_from_eastmoney(self, code):
         """
         使用东方财富网接口获取港股数据
@@ -194,7 +333,7 @@ class StockDataFetcher:
         
         # 实时行情接口
         url = f"http://push2.eastmoney.com/api/qt/stock/get?fields=f1,f2,f3,f4,f5,f6,f43,f44,f45,f46,f57,f58,f59,f60,f61&secid={secid}&ut=f057cbcbce2a86e2866ab8877db1d059&fltt=2&invt=2"
-        print(f"港股东方财富网URL: {url}")
+        logger.debug("港股东方财富网URL: %s", url)
         
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -202,30 +341,26 @@ class StockDataFetcher:
             'Accept': '*/*',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'Connection': 'keep-alive',
-            'Accept-Encoding': 'gzip, deflate, br'
+            'Accept-Encoding': ACCEPT_ENCODING
         }
         
         response = self.session.get(url, headers=headers)
-        print(f"东方财富网响应状态码: {response.status_code}")
+        logger.debug("东方财富网响应状态码: %s", response.status_code)
         
         if response.status_code == 200:
-            # 解码响应内容
-            response.encoding = 'utf-8'
-            content = response.text
-            print(f"东方财富网响应内容长度: {len(content)}")
-            print(f"东方财富网响应内容: {content[:200]}...")
+            content = response.content
+            logger.debug("东方财富网响应内容长度: %d", len(content))
+            logger.debug("东方财富网响应内容: %r...", content[:200])
             
-            # 解析JSON数据
+            # 直接解析响应字节，省去解码为字符串的步骤
             try:
-                import json
-                data = json.loads(content)
-                print(f"东方财富网JSON解析结果状态码: {data.get('rc')}")
+                data = _json_loads(content)
+                logger.debug("东方财富网JSON解析结果状态码: %s", data.get('rc'))
                 
                 if data.get('rc') == 0 and 'data' in data and data['data']:
                     stock_data = data['data']
                     
                     # 获取当前时间
-                    import datetime
                     current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     
                     return {
@@ -243,8 +378,9 @@ class StockDataFetcher:
                 else:
                     print(f"东方财富网未获取到有效数据: {data.get('msg')}")
                     if 'data' in data:
-                        print(f"数据部分: {data['data']}")
-            except json.JSONDecodeError as e:
+                        logger.debug("数据部分: %s", data['data'])
+            except ValueError as e:
+                # json.JSONDecodeError和orjson.JSONDecodeError都是ValueError的子类
                 print(f"东方财富网JSON解析失败: {e}")
         return None
 
@@ -255,61 +391,8 @@ class StockDataFetcher:
         :param time_range: 时间范围
         :return: 包含市场代码、referer、secid、klt、lmt的配置字典
         """
-        if code.startswith('6'):
-            # 上证股票
-            market_code = '1'
-            referer = 'https://quote.eastmoney.com/'
-        elif code.startswith(('00', '000', '001', '002', '003', '30')) and len(code) == 6:
-            # 深证股票：000xxx（深市主板）、002xxx（中小板）、300xxx（创业板）
-            market_code = '0'
-            referer = 'https://quote.eastmoney.com/'
-        else:
-            # 港股股票（通常是5位或6位数字）
-            market_code = '116'
-            referer = 'https://hkstock.eastmoney.com/'
-        
-        # 构建东方财富网的secid
-        secid = f"{market_code}.{code}"
-        
-        # 设置时间周期参数
-        if time_range == 'year':
-            klt = 104  # 年线
-            lmt = 20  # 约20年的年线数据
-        elif time_range == 'month':
-            klt = 103  # 月线
-            lmt = 36  # 约3年的月线数据
-        elif time_range == 'week':
-            klt = 102  # 周线
-            lmt = 250  # 约5年的周线数据
-        elif time_range == 'day':
-            klt = 101  # 日线
-            lmt = 100  # 约100个交易日的数据
-        elif time_range == '60min':
-            klt = 60  # 60分钟线
-            lmt = 100  # 默认获取100条60分钟数据
-        elif time_range == '30min':
-            klt = 30  # 30分钟线
-            lmt = 200  # 默认获取200条30分钟数据
-        elif time_range == '15min':
-            klt = 15  # 15分钟线
-            lmt = 300  # 默认获取300条15分钟数据
-        elif time_range == '5min':
-            klt = 5  # 5分钟线
-            lmt = 500  # 默认获取500条5分钟数据
-        elif time_range == '1min':
-            klt = 1  # 1分钟线
-            lmt = 1000  # 默认获取1000条1分钟数据
-        else:
-            klt = 101  # 默认使用日线
-            lmt = 100
-        
-        return {
-            'market_code': market_code,
-            'referer': referer,
-            'secid': secid,
-            'klt': klt,
-            'lmt': lmt
-        }
+        # 返回缓存配置的副本，调用方可以修改其中的lmt等参数
+        return dict(_stock_config(code, time_range))
     
     def fetch_kline_data(self, secid, klt, lmt, referer, start_date=None, end_date=None):
         """
@@ -357,29 +440,28 @@ class StockDataFetcher:
         try:
             response = self.session.get(url, headers=headers, timeout=5)
             response.raise_for_status()  # 抛出HTTP错误
-            data_str = response.text
+            content = response.content
         except Exception as e:
             print(f"API请求失败: {e}")
-            import traceback
             traceback.print_exc()
             return None
         
-        # 解析JSON响应
+        # 直接解析响应字节，省去解码为字符串的步骤
         try:
-            data = json.loads(data_str)
+            data = _json_loads(content)
         except Exception as e:
             print(f"JSON解析失败: {e}")
-            print(f"原始响应数据: {data_str}")
+            logger.debug("原始响应数据: %r", content)
             return None
         
         # 检查响应状态
         if data.get('rc') != 0:
             print(f"东方财富API返回错误: {data.get('msg', '未知错误')}")
-            print(f"完整响应数据: {data}")
+            logger.debug("完整响应数据: %s", data)
             return None
         
-        # 调试：打印完整响应数据
-        print(f"API响应数据: {data}")
+        # 调试：记录完整响应数据（只在启用DEBUG级别时格式化）
+        logger.debug("API响应数据: %s", data)
         
         return data
     
@@ -390,47 +472,77 @@ class StockDataFetcher:
         :param code: 股票代码
         :return: 包含K线数据的DataFrame
         """
-        # 解析K线数据
-        stock_data = []
-        for kline in klines:
-            kline_data = kline.split(',')
-            if len(kline_data) < 7:
-                continue
-            
-            # 解析日期、开盘价、收盘价、最高价、最低价、成交量、成交额
-            stock_data.append({
-                'date': kline_data[0],
-                'open': float(kline_data[1]) if kline_data[1] != '' else 0,
-                'close': float(kline_data[2]) if kline_data[2] != '' else 0,
-                'high': float(kline_data[3]) if kline_data[3] != '' else 0,
-                'low': float(kline_data[4]) if kline_data[4] != '' else 0,
-                'volume': int(float(kline_data[5])) if kline_data[5] != '' else 0,
-                'amount': float(kline_data[6]) if kline_data[6] != '' else 0,
-                'code': code
-            })
-        
-        # 创建DataFrame
-        df = pd.DataFrame(stock_data)
-        
-        # 设置索引为datetime类型，保留原始时间格式
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # 使用reset_index避免索引重复问题
-        df.reset_index(drop=True, inplace=True)
+        # 跳过字段不足7个的K线
+        klines = [kline for kline in klines if kline.count(',') >= 6]
+        
+        # 同一批K线的日期格式相同，按第一条的日期长度指定格式，免去逐批推断
+        date_format = KLINE_DATE_FORMATS.get(klines[0].index(',')) if klines else None
+        
+        # 使用pandas的C解析器一次性解析所有K线
+        df = pd.read_csv(io.StringIO('\n'.join(klines)), header=None, names=KLINE_COLUMNS,
+                         usecols=range(len(KLINE_COLUMNS)), dtype=KLINE_DTYPES, parse_dates=['date'],
+                         date_format=date_format)
+        
+        # 空字段按0处理
+        df = df.fillna(dict.fromkeys(KLINE_DTYPES, 0))
+        # 成交量在int32范围内时使用int32
+        df['volume'] = df['volume'].astype('int32' if df['volume'].max() <= np.iinfo(np.int32).max else 'int64')
+        df['code'] = code
         
         # 设置日期为索引
         df.set_index('date', inplace=True)
         
         return df
     
+    def update_cached_klines(self, code, time_range, cached, lmt=5):
+        """
+        只获取最近几条K线并合并到缓存数据中
+        :param code: 股票代码
+        :param time_range: 时间范围
+        :param cached: 缓存的K线数据
+        :param lmt: 获取的K线条数
+        :return: 合并后的DataFrame，如果获取失败或新数据与缓存不衔接返回None
+        """
+        config = self.get_stock_config(code, time_range)
+        data = self.fetch_kline_data(config['secid'], config['klt'], lmt, config['referer'])
+        if not data or 'data' not in data or data['data'] is None or not data['data'].get('klines', []):
+            return None
+        
+        tail = self.parse_kline_data(data['data']['klines'], code)
+        # 新数据与缓存之间有缺口时（刷新间隔过长或程序挂起），无法增量合并，交由调用方重新全量获取
+        if tail.empty or tail.index[0] > cached.index[-1]:
+            return None
+        
+        # 最后一根K线可能尚未走完，新数据包含的K线以新数据为准
+        # 缓存和新数据都已按时间排序，先去掉缓存中被新数据覆盖的K线再拼接，
+        # 通常拼接结果已经有序，无需去重和重新排序
+        head = cached[~cached.index.isin(tail.index)]
+        df = pd.concat([head, tail])
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        return df
+    
     def get_stock_data_by_time_range(self, code, time_range, start_date=None, end_date=None):
         """
         获取不同时间范围的股票数据，支持分页查询以获取完整数据
+        未指定日期范围时使用缓存，缓存过期后只增量获取最近的K线
         """
         try:
             if not code or not time_range:
                 return None
 
+            key = (code, time_range)
+            use_cache = start_date is None and end_date is None
+            if use_cache and key in self._kline_cache:
+                cached = self._kline_cache[key]
+                if time.monotonic() - self._kline_ts[key] < self.cache_ttl:
+                    return cached
+                df = self.update_cached_klines(code, time_range, cached)
+                if df is not None:
+                    self._kline_cache[key] = df
+                    self._kline_ts[key] = time.monotonic()
+                    return df
+
             print(f"正在获取{code}的{time_range}数据...")
             if start_date:
                 print(f"开始日期：{start_date}")
@@ -454,7 +566,7 @@ class StockDataFetcher:
                 config['lmt'] = 10000  # 获取更多数据
                 
                 print(f"\n--- 获取所有可用的1分钟数据 ---")
-                print(f"  查询参数: lmt={config['lmt']}")
+                logger.debug("查询参数: lmt=%s", config['lmt'])
                 
                 # 从API获取所有1分钟K线数据（不指定日期范围，让API返回最近的所有数据）
                 data = self.fetch_kline_data(config['secid'], config['klt'], config['lmt'], config['referer'])
@@ -492,7 +604,7 @@ class StockDataFetcher:
                     
                     # 增加lmt参数以获取更多历史数据
                     config['lmt'] = 1000  # 获取更多历史数据
-                    print(f"  查询参数: lmt={config['lmt']}")
+                    logger.debug("查询参数: lmt=%s", config['lmt'])
                     
                     # 不指定日期范围，让API返回最近的所有数据
                     data = self.fetch_kline_data(config['secid'], config['klt'], config['lmt'], config['referer'])
@@ -529,26 +641,251 @@ class StockDataFetcher:
                 df = df[df.index < end_dt]
             
             print(f"成功解析并去重后，得到{len(df)}条{time_range}数据")
+            if use_cache:
+                self._kline_cache[key] = df
+                self._kline_ts[key] = time.monotonic()
             return df
         except Exception as e:
             print(f"获取{code}的{time_range}数据失败: {e}")
-            import traceback
             traceback.print_exc()
             return None
+    
+    def get_stock_data_batch(self, keys, start_date=None, end_date=None, max_workers=8):
+        """
+        并发获取多组股票数据，总耗时约为最慢一次请求的耗时，而不是各次请求耗时之和
+        :param keys: (股票代码, 时间范围)元组列表
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param max_workers: 最大并发请求数
+        :return: {(股票代码, 时间范围): DataFrame}，获取失败的值为None
+        """
+        keys = list(dict.fromkeys(keys))
+        if len(keys) <= 1:
+            return {key: self.get_stock_data_by_time_range(*key, start_date, end_date) for key in keys}
+        # 网络请求期间释放GIL，线程池即可让各请求的等待时间重叠
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as pool:
+            results = pool.map(lambda key: self.get_stock_data_by_time_range(*key, start_date, end_date), keys)
+            return dict(zip(keys, results))
+
+# 表名只允许字母、数字和下划线，保证可以安全地拼接到SQL语句中
+_TABLE_NAME_RE = re.compile(r'[A-Za-z0-9_]+')
+
+def _check_table_name(table_name):
+    """
+    校验表名
+    :param table_name: 表名
+    :return: 表名
+    """
+    if not _TABLE_NAME_RE.fullmatch(table_name):
+        raise ValueError(f"非法的表名: {table_name}")
+    return table_name
+
+@lru_cache(maxsize=256)
+def _insert_sql(table_name, columns, chunk_rows, conflict=None):
+    """
+    生成表的多行和单行INSERT语句，相同参数复用同一字符串
+    :param table_name: 表名
+    :param columns: 列名元组
+    :param chunk_rows: 多行语句的行数
+    :param conflict: 唯一键列名元组；为None时使用INSERT OR REPLACE，
+                     否则冲突时只更新取值有变化的行（UPSERT），未变化的行不产生写入
+    :return: (多行语句, 单行语句)
+    """
+    placeholder = '(' + ', '.join('?' * len(columns)) + ')'
+    if conflict is None:
+        head = f"INSERT OR REPLACE INTO `{_check_table_name(table_name)}` ({', '.join(columns)}) VALUES "
+        return head + ', '.join([placeholder] * chunk_rows), head + placeholder
+    head = f"INSERT INTO `{_check_table_name(table_name)}` ({', '.join(columns)}) VALUES "
+    updates = [column for column in columns if column not in conflict]
+    tail = (f" ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET "
+            + ', '.join(f'{column} = excluded.{column}' for column in updates)
+            + ' WHERE ' + ' OR '.join(f'{column} IS NOT excluded.{column}' for column in updates))
+    return head + ', '.join([placeholder] * chunk_rows) + tail, head + placeholder + tail
+
+@lru_cache(maxsize=256)
+def _select_sql(table_name, has_start, has_end, schema=None):
+    """
+    生成K线表的查询语句，相同参数复用同一字符串
+    :param table_name: 表名
+    :param has_start: 是否按开始日期过滤
+    :param has_end: 是否按结束日期过滤
+    :param schema: 表所在的数据库别名，DuckDB挂载SQLite数据库时使用
+    :return: 查询语句
+    """
+    # 使用SQLite和DuckDB都支持的标准双引号引用表名
+    source = f'"{_check_table_name(table_name)}"'
+    if schema:
+        source = f'{schema}.{source}'
+    query = f'''
+    SELECT open, close, high, low, volume, timestamp
+    FROM {source}
+    WHERE 1=1
+    '''
+    if has_start:
+        query += ' AND date >= ?'
+    if has_end:
+        query += ' AND date <= ?'
+    # date与timestamp由同一时间生成，两者顺序一致；按date排序可直接沿日期唯一索引读取，
+    # 无需为timestamp额外建索引，也不会生成临时B树排序
+    return query + ' ORDER BY date ASC'
 
 class StockDatabaseManager:
     """股票数据库管理器类，封装所有数据库操作"""
     
+    # K线表的数据列
+    kline_columns = ('date', 'open', 'close', 'high', 'low', 'volume', 'timestamp')
+    # 多行INSERT语句每条写入的行数
+    multi_insert_rows = 100
+    # 新建表的价格列以整数存储价格×price_scale，变长整数编码通常只占3-4字节，而REAL固定占8字节
+    price_scale = 10000
+    
+    # 固定的SQL文本，sqlite3按语句文本缓存预编译结果，复用同一字符串可避免重复解析
+    # 当天数据按时间戳范围过滤，可直接使用(symbol, timestamp)唯一索引做范围查找，
+    # 而不必读出该股票历史上所有天的行再逐行比较date列
+    _today_delete_stmt = '''
+    DELETE FROM today_stock_data
+    WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+    '''
+    _today_stamps_stmt = '''
+    SELECT timestamp FROM today_stock_data
+    WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+    '''
+    _today_delete_one_stmt = '''
+    DELETE FROM today_stock_data WHERE symbol = ? AND timestamp = ?
+    '''
+    _today_select_stmt = '''
+    SELECT open, close, high, low, volume, timestamp
+    FROM today_stock_data
+    WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp ASC
+    '''
+    
     def __init__(self, db_path):
         """初始化数据库连接"""
         self.db_path = db_path
+        # 唯一的写连接：自动提交模式，写操作在写锁保护下由_transaction显式开启事务
+        self._write_conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        for pragma in SQLITE_PRAGMAS:
+            self._write_conn.execute(pragma)
+        # WAL文件累计约1000页后自动检查点，限制WAL文件大小
+        self._write_conn.execute('PRAGMA wal_autocheckpoint=1000')
+        # 单条语句的参数个数上限（旧版本SQLite为999）
+        if hasattr(self._write_conn, 'getlimit'):
+            self._max_variables = self._write_conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        else:
+            self._max_variables = 999
+        self._write_lock = threading.Lock()
+        # 每个线程独立的只读连接，WAL模式下读取不会阻塞写入
+        self._tl = threading.local()
+        self._reader_conns = []
+        # 各表价格列的存储倍数缓存，表结构创建后不再变化
+        self._price_scales = {}
+        # 已存在的表名集合，初始化时从sqlite_master读取一次，建表事务提交后同步更新
+        self._known_tables = set()
+        # 当前写事务中新建、尚未提交的表名，提交后才加入已存在的表名集合
+        self._pending_tables = set()
+        # 当天时间戳范围缓存：(缓存失效的真实时间, (当天0点时间戳, 次日0点时间戳))
+        self._today_cache = (0.0, None)
         self.init_database()
     
+    def _reader(self):
+        """
+        获取当前线程的只读连接，首次使用时创建
+        :return: sqlite3连接
+        """
+        tl = self._tl
+        if not hasattr(tl, 'conn'):
+            tl.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in SQLITE_PRAGMAS:
+                tl.conn.execute(pragma)
+            tl.conn.execute('PRAGMA query_only=1')
+            with self._write_lock:
+                self._reader_conns.append(tl.conn)
+        return tl.conn
+    
+    def _duckdb(self):
+        """
+        获取当前线程的DuckDB连接，首次使用时创建并以只读方式挂载SQLite数据库
+        :return: duckdb连接，duckdb不可用或挂载失败时返回None
+        """
+        tl = self._tl
+        if not hasattr(tl, 'duck'):
+            tl.duck = None
+            if duckdb is not None:
+                conn = duckdb.connect()
+                try:
+                    conn.execute('INSTALL sqlite')
+                    conn.execute('LOAD sqlite')
+                    path = self.db_path.replace("'", "''")
+                    conn.execute(f"ATTACH '{path}' AS s (TYPE SQLITE, READ_ONLY)")
+                except Exception as e:
+                    print(f"DuckDB挂载数据库失败，改用SQLite查询: {e}")
+                    conn.close()
+                else:
+                    tl.duck = conn
+                    with self._write_lock:
+                        self._reader_conns.append(conn)
+        return tl.duck
+    
+    def close(self):
+        """关闭所有数据库连接"""
+        with self._write_lock:
+            for conn in self._reader_conns:
+                conn.close()
+            self._reader_conns.clear()
+            self._write_conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """
+        在写锁保护下执行一个写事务，异常时回滚
+        :return: 数据库游标
+        """
+        with self._write_lock:
+            cursor = self._write_conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                # 回滚会撤销事务中新建的表
+                self._pending_tables.clear()
+                raise
+            cursor.execute('COMMIT')
+            # 提交后新建的表才对读取线程可见
+            self._known_tables.update(self._pending_tables)
+            self._pending_tables.clear()
+    
     def init_database(self):
         """初始化SQLite数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 启用WAL日志模式：写入时不阻塞读取，提交时无需每次fsync（该设置持久保存在数据库文件中）
+        # 日志模式不能在事务中切换，需单独执行
+        with self._write_lock:
+            self._write_conn.execute('PRAGMA journal_mode=WAL')
+        
+        # 所有建表和建索引语句在同一个事务中提交
+        with self._transaction() as cursor:
+            self._create_tables(cursor)
+            self._known_tables = self._load_table_names(cursor)
         
+        # 更新现有表结构，添加唯一约束以确保数据去重
+        self.update_existing_tables()
+    
+    @staticmethod
+    def _load_table_names(cursor):
+        """
+        读取数据库中所有表名
+        :param cursor: 数据库游标
+        :return: 表名集合
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        return {row[0] for row in cursor.fetchall()}
+    
+    def _create_tables(self, cursor):
+        """
+        创建系统表和当天数据表
+        :param cursor: 写事务中的数据库游标
+        """
         # 创建系统表
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS system_info (
@@ -558,44 +895,33 @@ class StockDatabaseManager:
         )
         ''')
         
-        # 创建分钟数据表
+        # 创建当天数据表
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS minute_stock_data (
+        CREATE TABLE IF NOT EXISTS today_stock_data (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             symbol TEXT NOT NULL,
             date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            open REAL NOT NULL,
-            close REAL NOT NULL,
-            high REAL NOT NULL,
-            low REAL NOT NULL,
+            open INTEGER NOT NULL,
+            close INTEGER NOT NULL,
+            high INTEGER NOT NULL,
+            low INTEGER NOT NULL,
             volume INTEGER NOT NULL,
             timestamp INTEGER NOT NULL
         )
         ''')
         
-        # 创建当天数据表
+        # 当天数据按(股票代码, 时间戳)去重，使每次重复保存都是幂等的覆盖写入
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS today_stock_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT NOT NULL,
-            date TEXT NOT NULL,
-            open REAL NOT NULL,
-            close REAL NOT NULL,
-            high REAL NOT NULL,
-            low REAL NOT NULL,
-            volume INTEGER NOT NULL,
-            timestamp INTEGER NOT NULL
+        DELETE FROM today_stock_data WHERE id NOT IN (
+            SELECT MAX(id) FROM today_stock_data GROUP BY symbol, timestamp
         )
         ''')
+        cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_today_stock_data_symbol_timestamp
+        ON today_stock_data (symbol, timestamp)
+        ''')
         
         # 不再创建单一的历史数据表，而是根据需要动态创建表
-        
-        conn.commit()
-        conn.close()
-        
-        # 更新现有表结构，添加唯一约束以确保数据去重
-        self.update_existing_tables()
     
     def save_today_data_to_db(self, symbol, data):
         """保存当天股票数据到数据库"""
@@ -604,40 +930,157 @@ class StockDatabaseManager:
             return False
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 清除当天旧数据
-            today = datetime.datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('DELETE FROM today_stock_data WHERE symbol = ? AND date = ?', (symbol, today))
+            data = self._with_datetime_index(data)
             
-            # 批量插入新数据
-            rows = []
-            for index, row in data.iterrows():
-                rows.append((
-                    symbol,
-                    index.strftime('%Y-%m-%d'),
-                    row['open'],
-                    row['close'],
-                    row['high'],
-                    row['low'],
-                    int(row['volume']),
-                    int(index.timestamp())
-                ))
-            
-            cursor.executemany('''
-            INSERT INTO today_stock_data (symbol, date, open, close, high, low, volume, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', rows)
+            day_start, day_end = self._today_range()
+            with self._transaction() as cursor:
+                rows = self._kline_rows(data, '%Y-%m-%d', symbol, self._price_scale(cursor, 'today_stock_data'))
+                # 新数据替换当天全部旧数据：只删除当天不在新数据中的旧行，其余行由UPSERT原地更新
+                stamps = data.index.values.astype('datetime64[s]').astype(np.int64)
+                if len(stamps):
+                    old = np.fromiter((row[0] for row in cursor.execute(self._today_stamps_stmt, (symbol, day_start, day_end))),
+                                      dtype=np.int64)
+                    stale = np.setdiff1d(old, stamps, assume_unique=True)
+                    cursor.executemany(self._today_delete_one_stmt, zip(itertools.repeat(symbol), stale.tolist()))
+                else:
+                    cursor.execute(self._today_delete_stmt, (symbol, day_start, day_end))
+                # 批量写入新数据：已存在且未变化的行不产生写入
+                self._insert_rows(cursor, 'today_stock_data', ('symbol',) + self.kline_columns, rows,
+                                  conflict=('symbol', 'timestamp'))
             
-            conn.commit()
-            conn.close()
-            print(f"成功保存{len(rows)}条当天数据")
+            print(f"成功保存{len(data)}条当天数据")
             return True
         except Exception as e:
             print(f"保存当天数据失败: {e}")
             return False
     
+    def _today_range(self):
+        """
+        获取当天的时间戳范围，时间戳与写入时一致，按本地时间的秒数计算
+        结果缓存到本地时间次日0点，监控循环中每次调用只需比较一次当前时间
+        :return: (当天0点时间戳, 次日0点时间戳)
+        """
+        expires, today_range = self._today_cache
+        if time.time() < expires:
+            return today_range
+        today = datetime.date.today()
+        day_start = int(np.datetime64(today, 's').astype(np.int64))
+        today_range = (day_start, day_start + 86400)
+        # 按本地时区换算次日0点的真实时间，跨夏令时也能在当地0点准时失效
+        tomorrow = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        self._today_cache = (time.mktime(tomorrow.timetuple()), today_range)
+        return today_range
+    
+    @staticmethod
+    def _kline_frame(rows, scale=1):
+        """
+        将查询结果转换为以时间为索引的K线DataFrame
+        REAL/INTEGER列按Python float/int读出，已是float64/int64，无需再做类型转换
+        索引由整数时间戳生成，查询时不再读取date文本列，省去每行一个字符串对象的创建
+        :param rows: (open, close, high, low, volume, timestamp)行列表
+        :param scale: 价格列的存储倍数，整数价格整列一次性除以该倍数还原
+        :return: DataFrame
+        """
+        df = pd.DataFrame.from_records(rows, columns=StockDatabaseManager.kline_columns[1:])
+        return StockDatabaseManager._finish_kline_frame(df, scale)
+    
+    @staticmethod
+    def _finish_kline_frame(df, scale=1):
+        """
+        将timestamp列转换为时间索引，并按存储倍数还原价格
+        :param df: 包含open、close、high、low、volume、timestamp列的DataFrame
+        :param scale: 价格列的存储倍数
+        :return: DataFrame
+        """
+        df.index = pd.to_datetime(df.pop('timestamp'), unit='s').rename('date')
+        if scale != 1:
+            df[KLINE_PRICE_COLUMNS] = df[KLINE_PRICE_COLUMNS] / scale
+        return df
+    
+    def _price_scale(self, cursor, table_name):
+        """
+        获取表中价格列的存储倍数：整数价格列为price_scale，旧版本创建的REAL价格列为1
+        :param cursor: 数据库游标
+        :param table_name: 表名
+        :return: 存储倍数，表不存在时返回None
+        """
+        scale = self._price_scales.get(table_name)
+        if scale is None:
+            types = {row[1]: row[2] for row in cursor.execute(f"PRAGMA table_info(`{_check_table_name(table_name)}`)")}
+            if not types:
+                return None
+            scale = self.price_scale if types['open'].upper() == 'INTEGER' else 1
+            self._price_scales[table_name] = scale
+        return scale
+    
+    @staticmethod
+    def _with_datetime_index(data):
+        """
+        确保K线数据以DatetimeIndex为索引，索引为字符串等类型时一次性整体转换
+        :param data: K线DataFrame
+        :return: 以DatetimeIndex为索引的DataFrame
+        """
+        if isinstance(data.index, pd.DatetimeIndex):
+            return data
+        return data.set_axis(pd.to_datetime(data.index))
+    
+    @staticmethod
+    def _kline_rows(data, date_format, symbol=None, scale=1):
+        """
+        将K线数据转换为待插入数据库的行
+        :param data: 以日期为索引的K线DataFrame
+        :param date_format: 日期列的格式
+        :param symbol: 股票代码，提供时作为第一列
+        :param scale: 价格列的存储倍数，不为1时价格按倍数取整后以整数写入
+        :return: 行元组迭代器
+        """
+        # 每列一次性转换为Python标量列表，再按行拼接，避免逐行构造Series
+        columns = [data.index.strftime(date_format).tolist()]
+        for column in KLINE_PRICE_COLUMNS:
+            values = data[column].to_numpy()
+            if scale != 1:
+                # 四舍五入到最近的整数，消除float32/float64的表示误差
+                values = np.rint(values.astype(np.float64) * scale).astype(np.int64)
+            elif values.dtype == np.float32:
+                # float32价格经最短十进制表示转回float64，避免写入10.149999618530273这类值
+                values = values.astype(str).astype(np.float64)
+            columns.append(values.tolist())
+        columns.append(data['volume'].to_numpy().astype(np.int64).tolist())
+        columns.append(data.index.values.astype('datetime64[s]').astype(np.int64).tolist())
+        if symbol is not None:
+            columns.insert(0, itertools.repeat(symbol))
+        return zip(*columns)
+    
+    def _insert_rows(self, cursor, table_name, columns, rows, conflict=None):
+        """
+        使用多行VALUES的INSERT语句批量写入数据
+        :param cursor: 写事务中的数据库游标
+        :param table_name: 表名
+        :param columns: 列名元组
+        :param rows: 行元组的可迭代对象
+        :param conflict: 唯一键列名元组，提供时使用UPSERT，否则使用INSERT OR REPLACE
+        """
+        chunk_rows = max(1, min(self.multi_insert_rows, self._max_variables // len(columns)))
+        multi_sql, single_sql = _insert_sql(table_name, columns, chunk_rows, conflict)
+        
+        remainder = []
+        
+        def chunks():
+            # 逐块从行迭代器中取出chunk_rows行并展平为一条语句的参数，
+            # 与SQLite的参数绑定交替进行，内存中只保留当前一块，不物化全部行
+            it = iter(rows)
+            while True:
+                chunk = list(itertools.islice(it, chunk_rows))
+                if len(chunk) < chunk_rows:
+                    remainder.extend(chunk)
+                    return
+                yield list(itertools.chain.from_iterable(chunk))
+        
+        cursor.executemany(multi_sql, chunks())
+        if remainder:
+            # 剩余不足一块的行使用单行语句，保持语句文本固定以复用预编译结果
+            cursor.executemany(single_sql, remainder)
+    
     def get_table_name(self, symbol, time_range, date=None):
         """
         根据时间范围和日期获取表名
@@ -664,289 +1107,327 @@ class StockDatabaseManager:
                 date_str = date.strftime('%Y%m')
             return f"{symbol_safe}_{date_str}_{time_range_short}"
     
-    def create_table_if_not_exists(self, cursor, table_name):
+    def create_table_if_not_exists(self, cursor, table_name, unique=True):
         """
         如果表不存在则创建表
         :param cursor: 数据库游标
         :param table_name: 表名
+        :param unique: 是否在建表时声明日期唯一约束；为False时由调用方在写入数据后再建唯一索引
         """
+        if table_name in self._known_tables or table_name in self._pending_tables:
+            return
+        # 添加唯一约束，确保同一时间点的数据不会重复
+        unique_clause = ',\n            UNIQUE(date)' if unique else ''
         # 使用反引号引用表名，确保特殊字符被正确处理
         cursor.execute(f'''
-        CREATE TABLE IF NOT EXISTS `{table_name}` (
+        CREATE TABLE IF NOT EXISTS `{_check_table_name(table_name)}` (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             date TEXT NOT NULL,
-            open REAL NOT NULL,
-            close REAL NOT NULL,
-            high REAL NOT NULL,
-            low REAL NOT NULL,
+            open INTEGER NOT NULL,
+            close INTEGER NOT NULL,
+            high INTEGER NOT NULL,
+            low INTEGER NOT NULL,
             volume INTEGER NOT NULL,
-            timestamp INTEGER NOT NULL,
-            UNIQUE(date)  -- 添加唯一约束，确保同一时间点的数据不会重复
+            timestamp INTEGER NOT NULL{unique_clause}
         )
         ''')
+        self._pending_tables.add(table_name)
+    
+    def _save_table(self, cursor, table_name, data, date_format, bulk_mode=False):
+        """
+        将K线数据写入一张表
+        :param cursor: 写事务中的数据库游标
+        :param table_name: 表名
+        :param data: K线DataFrame
+        :param date_format: 日期列的格式
+        :param bulk_mode: 批量导入模式，新表先写入数据再一次性建立唯一索引
+        """
+        if not bulk_mode or table_name in self._known_tables or table_name in self._pending_tables:
+            self.create_table_if_not_exists(cursor, table_name)
+            rows = self._kline_rows(data, date_format, scale=self._price_scale(cursor, table_name))
+            self._insert_rows(cursor, table_name, self.kline_columns, rows)
+            return
+        
+        # 新表：不带唯一约束建表，写入后再一次性建立唯一索引，避免逐行维护B树
+        self.create_table_if_not_exists(cursor, table_name, unique=False)
+        # 没有唯一约束时不会按日期覆盖，先按日期去重并保留最后一条
+        data = data[~data.index.strftime(date_format).duplicated(keep='last')]
+        rows = self._kline_rows(data, date_format, scale=self._price_scale(cursor, table_name))
+        self._insert_rows(cursor, table_name, self.kline_columns, rows)
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS `idx_{table_name}_date` ON `{table_name}` (date)")
     
     def update_existing_tables(self):
         """
         更新现有表结构，添加唯一约束以确保数据去重
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 获取所有表名
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
-            
-            # 过滤掉系统表和不需要添加约束的表
-            for table in tables:
-                table_name = table[0]
-                if table_name.startswith('sqlite_') or table_name in ['system_tables', 'system_info', 'today_stock_data']:
-                    continue
+            with self._transaction() as cursor:
+                # 一条查询找出所有缺少唯一索引的数据表（过滤掉系统表和不需要添加约束的表），
+                # 按股票和月份分表后表的数量很多，避免启动时逐表执行PRAGMA index_list
+                cursor.execute('''
+                SELECT name FROM sqlite_master AS m
+                WHERE type = 'table'
+                  AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+                  AND name NOT IN ('system_tables', 'system_info', 'today_stock_data')
+                  AND NOT EXISTS (SELECT 1 FROM pragma_index_list(m.name) WHERE "unique" = 1)
+                ''')
+                tables = cursor.fetchall()
                 
-                try:
-                    # 检查表是否已经有唯一约束
-                    cursor.execute(f"PRAGMA index_list(`{table_name}`);")
-                    indexes = cursor.fetchall()
-                    has_unique_constraint = any(index[2] == 1 for index in indexes)  # 1表示唯一索引
-                    
-                    if not has_unique_constraint:
+                for table in tables:
+                    table_name = table[0]
+                    try:
                         # 添加唯一约束
                         cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS `idx_{table_name}_date` ON `{table_name}` (date);")
                         print(f"为表 `{table_name}` 添加了唯一约束")
-                except Exception as e:
-                    print(f"处理表 `{table_name}` 时出错: {e}")
+                    except Exception as e:
+                        print(f"处理表 `{table_name}` 时出错: {e}")
             
-            conn.commit()
-            conn.close()
             print("现有表结构更新完成")
             return True
         except Exception as e:
             print(f"更新现有表结构失败: {e}")
             return False
     
-    def save_data_to_db(self, symbol, data, time_range='day'):
-        """保存股票数据到数据库"""
-        if data is None:
+    def save_data_to_db(self, symbol, data, time_range='day', bulk_mode=False):
+        """
+        保存股票数据到数据库
+        :param symbol: 股票代码
+        :param data: K线DataFrame
+        :param time_range: 时间范围
+        :param bulk_mode: 批量导入模式，适用于历史数据的首次导入
+        """
+        return self.save_many({symbol: data}, time_range, bulk_mode)
+    
+    def save_many(self, items, time_range='day', bulk_mode=False):
+        """
+        在同一个事务中保存多只股票的数据，所有表的写入只提交一次
+        :param items: {股票代码: K线DataFrame}字典，值为None的股票会被跳过
+        :param time_range: 时间范围
+        :param bulk_mode: 批量导入模式，适用于历史数据的首次导入
+        """
+        items = {symbol: data for symbol, data in items.items() if data is not None}
+        if not items:
             print("没有数据可保存")
             return False
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._transaction() as cursor:
+                for symbol, data in items.items():
+                    self._save_symbol(cursor, symbol, self._with_datetime_index(data), time_range, bulk_mode)
             
-            # 根据时间范围分组数据
-            if time_range in ['day', 'week', 'month', 'year']:
-                # 日、周、月、年数据：所有数据保存在一个表中
-                table_name = self.get_table_name(symbol, time_range)
-                self.create_table_if_not_exists(cursor, table_name)
-                
-                # 批量插入数据
-                rows = []
-                for index, row in data.iterrows():
-                    rows.append((
-                        index.strftime('%Y-%m-%d'),
-                        row['open'],
-                        row['close'],
-                        row['high'],
-                        row['low'],
-                        int(row['volume']),
-                        int(index.timestamp())
-                    ))
-                
-                cursor.executemany(f'''
-                INSERT OR REPLACE INTO `{table_name}` (date, open, close, high, low, volume, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', rows)
-            else:
-                # 分钟级别数据：按月份分组保存
-                # 按月份分组数据
-                data['month'] = data.index.strftime('%Y%m')
-                for month, month_data in data.groupby('month'):
-                    table_name = self.get_table_name(symbol, time_range, pd.Timestamp(f"{month}01"))
-                    self.create_table_if_not_exists(cursor, table_name)
-                    
-                    # 批量插入数据
-                    rows = []
-                    for index, row in month_data.iterrows():
-                        rows.append((
-                            index.strftime('%Y-%m-%d %H:%M:%S'),
-                            row['open'],
-                            row['close'],
-                            row['high'],
-                            row['low'],
-                            int(row['volume']),
-                            int(index.timestamp())
-                        ))
-                    
-                    cursor.executemany(f'''
-                    INSERT OR REPLACE INTO `{table_name}` (date, open, close, high, low, volume, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', rows)
-                
-                # 删除临时添加的month列
-                del data['month']
-            
-            conn.commit()
-            conn.close()
-            print(f"成功保存{len(data)}条{time_range}数据")
+            print(f"成功保存{sum(len(data) for data in items.values())}条{time_range}数据")
             return True
         except Exception as e:
             print(f"保存{time_range}数据失败: {e}")
             return False
     
+    def _save_symbol(self, cursor, symbol, data, time_range, bulk_mode=False):
+        """
+        在写事务中保存一只股票的K线数据
+        :param cursor: 写事务中的数据库游标
+        :param symbol: 股票代码
+        :param data: 以DatetimeIndex为索引的K线DataFrame
+        :param time_range: 时间范围
+        :param bulk_mode: 批量导入模式
+        """
+        # 根据时间范围分组数据
+        if time_range in ['day', 'week', 'month', 'year']:
+            # 日、周、月、年数据：所有数据保存在一个表中
+            table_name = self.get_table_name(symbol, time_range)
+            self._save_table(cursor, table_name, data, '%Y-%m-%d', bulk_mode)
+        else:
+            # 分钟级别数据：按月份分组保存
+            # 用整数年月作为分组键，避免逐行strftime
+            year_month = data.index.year.to_numpy() * 100 + data.index.month.to_numpy()
+            for month, month_data in data.groupby(year_month, sort=False):
+                table_name = self.get_table_name(symbol, time_range, pd.Timestamp(year=month // 100, month=month % 100, day=1))
+                self._save_table(cursor, table_name, month_data, '%Y-%m-%d %H:%M:%S', bulk_mode)
+    
     def get_today_data_from_db(self, symbol):
         """从数据库获取当天股票数据"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            today = datetime.datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('''
-            SELECT date, open, close, high, low, volume, timestamp
-            FROM today_stock_data
-            WHERE symbol = ? AND date = ?
-            ORDER BY timestamp ASC
-            ''', (symbol, today))
-            
-            data = cursor.fetchall()
-            conn.close()
+            cursor = self._reader().cursor()
+            data = cursor.execute(self._today_select_stmt, (symbol, *self._today_range())).fetchall()
             
             if data:
-                df = pd.DataFrame(data, columns=['date', 'open', 'close', 'high', 'low', 'volume', 'timestamp'])
-                df['date'] = pd.to_datetime(df['timestamp'], unit='s')
-                df = df.set_index('date')
-                df = df[['open', 'close', 'high', 'low', 'volume']]
-                return df
+                return self._kline_frame(data, self._price_scale(cursor, 'today_stock_data'))
             else:
                 return None
         except Exception as e:
             print(f"获取当天数据失败: {e}")
             return None
     
-    def get_data_from_db(self, symbol, time_range='day', start_date=None, end_date=None):
-        """从数据库获取指定时间范围的股票数据"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+    def _query_table_names(self, symbol, time_range, start_date=None, end_date=None):
+        """
+        获取查询时间范围涉及的、已存在的表名，按时间顺序排列
+        :param symbol: 股票代码
+        :param time_range: 时间范围
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 表名列表
+        """
+        if time_range in ['day', 'week', 'month', 'year']:
+            # 日、周、月、年数据：从单一表中查询
+            table_names = [self.get_table_name(symbol, time_range)]
+        else:
+            # 分钟级别数据：需要查询多个月份的表
             
-            if time_range in ['day', 'week', 'month', 'year']:
-                # 日、周、月、年数据：从单一表中查询
-                table_name = self.get_table_name(symbol, time_range)
-                
-                query = f'''
-                SELECT date, open, close, high, low, volume, timestamp
-                FROM `{table_name}`
-                WHERE 1=1
-                '''
-                params = []
-                
-                if start_date:
-                    query += ' AND date >= ?'
-                    params.append(start_date)
-                if end_date:
-                    query += ' AND date <= ?'
-                    params.append(end_date)
-                
-                query += ' ORDER BY timestamp ASC'
-                
-                try:
-                    cursor.execute(query, params)
-                    data = cursor.fetchall()
-                except sqlite3.OperationalError:
-                    # 表不存在
-                    data = []
+            # 确定需要查询的月份范围
+            if start_date:
+                start_month = pd.Timestamp(start_date).strftime('%Y%m')
             else:
-                # 分钟级别数据：需要查询多个月份的表
-                data = []
-                
-                # 确定需要查询的月份范围
-                if start_date:
-                    start_month = pd.Timestamp(start_date).strftime('%Y%m')
-                else:
-                    # 默认查询当前月份
-                    start_month = datetime.datetime.now().strftime('%Y%m')
-                
-                if end_date:
-                    end_month = pd.Timestamp(end_date).strftime('%Y%m')
+                # 默认查询当前月份
+                start_month = datetime.datetime.now().strftime('%Y%m')
+            
+            if end_date:
+                end_month = pd.Timestamp(end_date).strftime('%Y%m')
+            else:
+                # 默认查询当前月份
+                end_month = datetime.datetime.now().strftime('%Y%m')
+            
+            # 生成需要查询的所有月份
+            months = []
+            current_month = start_month
+            while current_month <= end_month:
+                months.append(current_month)
+                # 计算下一个月份
+                year = int(current_month[:4])
+                month = int(current_month[4:])
+                if month == 12:
+                    year += 1
+                    month = 1
                 else:
-                    # 默认查询当前月份
-                    end_month = datetime.datetime.now().strftime('%Y%m')
-                
-                # 生成需要查询的所有月份
-                months = []
-                current_month = start_month
-                while current_month <= end_month:
-                    months.append(current_month)
-                    # 计算下一个月份
-                    year = int(current_month[:4])
-                    month = int(current_month[4:])
-                    if month == 12:
-                        year += 1
-                        month = 1
-                    else:
-                        month += 1
-                    current_month = f"{year}{month:02d}"
-                
-                # 查询每个月份的表
-                for month in months:
-                    table_name = f"{symbol.replace('.', '_')}_{month}_{time_range.replace('min', 'm')}"
-                    query = f'''
-                    SELECT date, open, close, high, low, volume, timestamp
-                    FROM `{table_name}`
-                    WHERE 1=1
-                    '''
-                    params = []
-                    
-                    if start_date:
-                        query += ' AND date >= ?'
-                        params.append(start_date)
-                    if end_date:
-                        query += ' AND date <= ?'
-                        params.append(end_date)
-                    
-                    query += ' ORDER BY timestamp ASC'
-                    
-                    try:
-                        cursor.execute(query, params)
-                        data.extend(cursor.fetchall())
-                    except sqlite3.OperationalError:
-                        # 表不存在，跳过
-                        continue
+                    month += 1
+                current_month = f"{year}{month:02d}"
+            
+            table_names = [self.get_table_name(symbol, time_range, pd.Timestamp(f"{month}01")) for month in months]
+        
+        # 其他进程可能新建了表，不在已知表名集合中的表名用一次sqlite_master查询确认
+        unknown = [table_name for table_name in table_names if table_name not in self._known_tables]
+        if unknown:
+            placeholders = ','.join('?' * len(unknown))
+            rows = self._reader().execute(
+                f"SELECT name FROM sqlite_master WHERE type='table' AND name IN ({placeholders})", unknown).fetchall()
+            self._known_tables.update(row[0] for row in rows)
+        
+        # 跳过不存在的表，无需逐表尝试查询
+        return [table_name for table_name in table_names if table_name in self._known_tables]
+    
+    def get_data_from_db(self, symbol, time_range='day', start_date=None, end_date=None, engine='sqlite', chunksize=None):
+        """
+        从数据库获取指定时间范围的股票数据
+        :param symbol: 股票代码
+        :param time_range: 时间范围
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param engine: 查询引擎，'sqlite'或'duckdb'；duckdb以列式向量化方式扫描同一数据库文件，
+                       适合读取大量历史数据，不可用时自动使用sqlite
+        :param chunksize: 每块的行数；提供时返回逐块生成DataFrame的迭代器，内存占用不超过一块
+        :return: DataFrame，或chunksize不为None时的DataFrame迭代器
+        """
+        if chunksize is not None:
+            return self._iter_data_from_db(symbol, time_range, start_date, end_date, chunksize)
+        
+        try:
+            cursor = self._reader().cursor()
+            duck = self._duckdb() if engine == 'duckdb' else None
+            # 每张表的价格存储倍数可能不同（新旧表结构），按表分别转换后再拼接
+            frames = []
             
-            conn.close()
+            # 按时间顺序查询每个表，日期条件在各表内通过日期索引过滤，结果依次拼接即按时间有序
+            params = [d for d in (start_date, end_date) if d]
+            for table_name in self._query_table_names(symbol, time_range, start_date, end_date):
+                scale = self._price_scale(cursor, table_name)
+                if duck is not None:
+                    # DuckDB直接生成列式DataFrame，不经过逐行的Python对象
+                    df = duck.execute(_select_sql(table_name, bool(start_date), bool(end_date), 's'), params).df()
+                    if len(df):
+                        frames.append(self._finish_kline_frame(df, scale))
+                else:
+                    cursor.execute(_select_sql(table_name, bool(start_date), bool(end_date)), params)
+                    rows = cursor.fetchall()
+                    if rows:
+                        frames.append(self._kline_frame(rows, scale))
             
-            if data:
-                df = pd.DataFrame(data, columns=['date', 'open', 'close', 'high', 'low', 'volume', 'timestamp'])
-                df['date'] = pd.to_datetime(df['timestamp'], unit='s')
-                df = df.set_index('date')
-                df = df[['open', 'close', 'high', 'low', 'volume']]
-                return df
+            if len(frames) == 1:
+                return frames[0]
+            elif frames:
+                return pd.concat(frames)
             else:
                 return None
         except Exception as e:
             print(f"获取{time_range}数据失败: {e}")
             return None
+    
+    def _iter_data_from_db(self, symbol, time_range, start_date, end_date, chunksize):
+        """
+        按时间顺序逐块读取股票数据
+        :param symbol: 股票代码
+        :param time_range: 时间范围
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param chunksize: 每块的最大行数
+        :return: DataFrame生成器
+        """
+        # 使用独立游标，迭代期间当前线程的其他查询不会打断本次读取
+        cursor = self._reader().cursor()
+        params = [d for d in (start_date, end_date) if d]
+        for table_name in self._query_table_names(symbol, time_range, start_date, end_date):
+            scale = self._price_scale(cursor, table_name)
+            cursor.execute(_select_sql(table_name, bool(start_date), bool(end_date)), params)
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield self._kline_frame(rows, scale)
 
 class RealTimeStockMonitor:
-    def __init__(self, symbol, interval=60, with_gui=True):
+    # 实时数据环形缓冲区容量，列依次为价格、最高价、最低价、成交量
+    max_ticks = 60
+    # 导出K线图图片的间隔（绘制次数）
+    chart_save_every = 5
+    
+    def __init__(self, symbol, interval=60, with_gui=True, save_chart=False):
         """
         实时股票监控器
         :param symbol: 股票代码
         :param interval: 数据更新间隔（秒）
         :param with_gui: 是否启用图形输出
+        :param save_chart: 是否定期导出K线图图片
         """
         self.symbol = symbol
         self.interval = interval
         self.with_gui = with_gui
-        self.data = []  # 存储实时数据
+        self.save_chart = save_chart
+        self._tick_count = 0  # 绘制次数，用于控制图片导出频率
+        self._tick_labels_key = None  # 当前刻度标签对应的数据范围
+        self._tick_labels = []  # 当前刻度标签，数据追加时只格式化新增部分
+        self._plotted_data = None  # 上次整图重绘时的当天数据
+        self._background = None  # 上次整图重绘后不含实时信息文本的画布背景，用于blit
+        # 存储实时数据：固定大小的环形缓冲区，写满后覆盖最旧的一条
+        self._ring = np.empty((self.max_ticks, 4), dtype=np.float64)
+        self._ts = np.empty(self.max_ticks, dtype='datetime64[us]')
+        self._head = 0
+        self._filled = 0
         self.today_data = None  # 存储当天的1分钟数据
+        self._today_lock = threading.Lock()  # 保护today_data引用的替换和读取
+        self._last_update_minute = None  # 上次更新当天数据所在的分钟
         self.running = False
+        
+        # 后台线程池：数据库保存和（非交互式后端下的）绘图不阻塞数据获取
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._futures = {}
+        self._plot_in_background = matplotlib.get_backend().lower() in NON_INTERACTIVE_BACKENDS
         self.db_path = 'stock_data.db'  # SQLite数据库文件路径
         
         # 初始化数据获取器和数据库管理器
-        self.data_fetcher = StockDataFetcher()
+        self.data_fetcher = StockDataFetcher(cache_ttl=max(interval, 60))
         self.db_manager = StockDatabaseManager(self.db_path)
         
+        # 图形窗口只创建一次，后续只更新图元数据
+        if self.with_gui:
+            self.init_chart()
+        
         # 初始化时获取当天的历史1分钟数据
         self.update_today_data()
     
@@ -954,9 +1435,13 @@ class RealTimeStockMonitor:
         """
         更新当天的日线数据
         """
-        self.today_data = self.data_fetcher.get_stock_data_by_time_range(self.symbol, 'day')
-        if self.today_data is not None:
-            print(f"获取了{len(self.today_data)}条当天日线数据")
+        self._last_update_minute = datetime.datetime.now().replace(second=0, microsecond=0)
+        today_data = self.data_fetcher.get_stock_data_by_time_range(self.symbol, 'day')
+        # 获取到的DataFrame构建后不再修改，只需在替换引用时加锁
+        with self._today_lock:
+            self.today_data = today_data
+        if today_data is not None:
+            print(f"获取了{len(today_data)}条当天日线数据")
         else:
             print("未能获取当天数据")
     
@@ -967,20 +1452,41 @@ class RealTimeStockMonitor:
         """
         return self.data_fetcher.get_real_time_data(self.symbol)
 
+    def get_today_data(self):
+        """
+        获取当前的当天数据
+        :return: DataFrame
+        """
+        with self._today_lock:
+            return self.today_data
+    
+    def submit_task(self, name, func, *args):
+        """
+        将任务提交到后台线程池，同名任务尚未完成时跳过本次提交
+        :param name: 任务名称
+        :param func: 任务函数
+        :param args: 任务参数
+        """
+        future = self._futures.get(name)
+        if future is not None and not future.done():
+            return
+        self._futures[name] = self._pool.submit(func, *args)
+    
     def save_today_data_to_db(self):
         """
         将当天股票数据保存到SQLite数据库
         """
-        return self.db_manager.save_today_data_to_db(self.symbol, self.today_data)
+        return self.db_manager.save_today_data_to_db(self.symbol, self.get_today_data())
 
-    def save_data_to_db(self, data, time_range='day'):
+    def save_data_to_db(self, data, time_range='day', bulk_mode=False):
         """
         将指定时间范围的股票数据保存到SQLite数据库
         :param data: DataFrame数据
         :param time_range: 时间范围，可选值：day/week/month/year/60min/30min/15min/5min/1min
+        :param bulk_mode: 批量导入模式，新表写入数据后再建立唯一索引
         :return: bool
         """
-        return self.db_manager.save_data_to_db(self.symbol, data, time_range)
+        return self.db_manager.save_data_to_db(self.symbol, data, time_range, bulk_mode)
 
     def get_today_data_from_db(self):
         """
@@ -989,7 +1495,7 @@ class RealTimeStockMonitor:
         """
         return self.db_manager.get_today_data_from_db(self.symbol)
 
-    def get_data_from_db(self, time_range='day', start_date=None, end_date=None):
+    def get_data_from_db(self, time_range='day', start_date=None, end_date=None, engine='sqlite', chunksize=None):
         """
         从SQLite数据库获取指定时间范围的股票数据
         - 1分钟数据从按股票代码和月份分表中获取
@@ -997,16 +1503,37 @@ class RealTimeStockMonitor:
         :param time_range: 时间范围，可选值：day/week/month/year/60min/30min/15min/5min/1min
         :param start_date: 开始日期，格式为YYYY-MM-DD或YYYY-MM-DD HH:MM:SS
         :param end_date: 结束日期，格式为YYYY-MM-DD或YYYY-MM-DD HH:MM:SS
+        :param engine: 查询引擎，可选值：sqlite/duckdb
+        :param chunksize: 每块的行数，提供时返回DataFrame迭代器
         :return: DataFrame
         """
-        return self.db_manager.get_data_from_db(self.symbol, time_range, start_date, end_date)
+        return self.db_manager.get_data_from_db(self.symbol, time_range, start_date, end_date, engine, chunksize)
 
+    def append_tick(self, real_time):
+        """
+        将一条实时数据写入环形缓冲区
+        :param real_time: 实时数据字典
+        """
+        self._ring[self._head] = (real_time['price'], real_time['high'], real_time['low'], real_time['volume'])
+        self._ts[self._head] = np.datetime64(datetime.datetime.now())
+        self._head = (self._head + 1) % self.max_ticks
+        self._filled = min(self.max_ticks, self._filled + 1)
+    
+    def get_recent_ticks(self):
+        """
+        按时间顺序获取缓冲区中的实时数据
+        :return: (时间数组, 数据数组)，数据数组每行为价格、最高价、最低价、成交量
+        """
+        if self._filled < self.max_ticks:
+            return self._ts[:self._filled], self._ring[:self._filled]
+        # 缓冲区已写满时，最旧的一条位于写指针处
+        order = np.roll(np.arange(self.max_ticks), -self._head)
+        return self._ts[order], self._ring[order]
+    
     def clear_terminal(self):
-        """清除终端屏幕"""
-        if os.name == 'nt':  # Windows
-            os.system('cls')
-        else:  # Linux/macOS
-            os.system('clear')
+        """清除终端屏幕：直接输出ANSI清屏序列，避免每次启动cls/clear子进程"""
+        sys.stdout.write('\x1b[2J\x1b[H')
+        sys.stdout.flush()
     
     def display_real_time_data(self, data):
         """显示实时数据"""
@@ -1039,69 +1566,67 @@ class RealTimeStockMonitor:
         print(f"{'='*60}")
         print("按 Ctrl+C 停止监控...")
     
-    def update_display(self):
-        """更新终端显示"""
-        print("=== update_display开始 ===")
+    def update_display(self, deadline=None):
+        """
+        更新终端显示
+        :param deadline: 本轮更新的截止时间（time.time()时间戳），已超时则跳过绘图
+        """
         # 获取实时数据
         real_time = self.get_real_time_data()
-        print(f"获取到的实时数据: {real_time}")
         if real_time:
-            print("有实时数据，开始更新显示")
-            # 更新当天数据
-            self.update_today_data()
+            # 同一分钟内K线数据不会变化，每分钟只更新一次当天数据
+            if datetime.datetime.now().replace(second=0, microsecond=0) != self._last_update_minute:
+                self.update_today_data()
             
-            # 添加到实时数据列表
-            self.data.append({
-                'time': datetime.datetime.now(),
-                'price': real_time['price'],
-                'high': real_time['high'],
-                'low': real_time['low'],
-                'volume': real_time['volume']
-            })
-            
-            # 只保留最近60条数据
-            if len(self.data) > 60:
-                self.data = self.data[-60:]
+            # 写入实时数据环形缓冲区
+            self.append_tick(real_time)
             
             # 清除终端并显示实时数据
-            self.clear_terminal()
             self.display_real_time_data(real_time)
             
-            # 绘制K线图（如果启用了图形输出）
-            if self.with_gui:
-                print("正在绘制K线图...")
-                self.plot_kline_chart(real_time)
+            # 在后台保存当天数据
+            self.submit_task('save', self.save_today_data_to_db)
+            
+            # 绘制K线图（如果启用了图形输出），已落后于下一个周期时跳过本次重绘
+            if self.with_gui and (deadline is None or time.time() < deadline):
+                # 交互式后端只能在主线程中绘图
+                if self._plot_in_background:
+                    self.submit_task('plot', self.plot_kline_chart, real_time)
+                else:
+                    self.plot_kline_chart(real_time)
         else:
             print("没有获取到实时数据")
-        print("=== update_display结束 ===")
+    
+    def next_tick_time(self):
+        """
+        计算下一个与更新间隔对齐的时间点，使更新落在整分钟等K线边界上
+        :return: 下一个时间点（time.time()时间戳）
+        """
+        return (time.time() // self.interval + 1) * self.interval
     
     def main_loop(self):
         """
-        主循环，持续更新数据和显示
+        主循环，在每个对齐的时间点更新数据和显示
         """
-        print(f"main_loop开始，初始running状态: {self.running}")
         iteration = 0
         try:
             # 设置running为True，开始循环
             self.running = True
             while self.running:
                 iteration += 1
-                print(f"\n=== 主循环迭代 {iteration} 开始 ===")
-                print(f"当前时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                print(f"running状态: {self.running}")
+                next_tick = self.next_tick_time()
                 
                 # 更新显示
-                self.update_display()
+                self.update_display(deadline=next_tick)
                 
-                # 等待指定间隔
-                print(f"等待 {self.interval} 秒...")
-                time.sleep(self.interval)
+                # 等待到下一个对齐的时间点，而不是固定休眠，避免耗时累积造成漂移
+                next_tick = self.next_tick_time()
+                time.sleep(max(0.0, next_tick - time.time()))
                 
         except KeyboardInterrupt:
             print("\n收到中断信号，即将退出主循环")
         except Exception as e:
             print(f"主循环出错: {e}")
-            import traceback
             traceback.print_exc()
         finally:
             print(f"主循环结束，iteration: {iteration}")
@@ -1113,12 +1638,69 @@ class RealTimeStockMonitor:
         print(f"更新间隔: {self.interval} 秒")
         print("按 Ctrl+C 停止监控")
         
+        # 启用交互式模式并显示图形窗口
+        if self.with_gui:
+            plt.ion()
+            plt.show(block=False)
+        
         # 直接调用主循环
         self.main_loop()
         
         # 主循环结束后停止监控
         self.stop()
     
+    def init_chart(self):
+        """
+        创建K线图的图形、坐标轴和空的图元集合
+        """
+        self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(15, 12), gridspec_kw={'height_ratios': [3, 1]}, dpi=CHART_DPI)
+        # 两个坐标轴共用x轴，刻度和标签只需在ax1上设置一次
+        self.ax2.sharex(self.ax1)
+        for ax in (self.ax1, self.ax2):
+            ax.tick_params(axis='x', labelrotation=45)
+        
+        # 实体、影线和成交量各用一个集合，更新时只替换其中的路径和颜色
+        self.body_coll = PolyCollection([], edgecolor='black')
+        self.wick_coll = LineCollection([], colors='black', linewidths=0.5)
+        self.volume_coll = PolyCollection([], linewidth=0)
+        self.ax1.add_collection(self.body_coll)
+        self.ax1.add_collection(self.wick_coll)
+        self.ax2.add_collection(self.volume_coll)
+        # 与bar一致，成交量坐标轴底部固定在0
+        self.volume_coll.sticky_edges.y.append(0)
+        
+        self.ax1.set_ylabel('价格 (元)')
+        self.ax1.grid(True, linestyle='--', alpha=0.7)
+        self.ax2.set_ylabel('成交量')
+        self.ax2.grid(True, linestyle='--', alpha=0.7)
+        
+        # 实时信息文本每次更新都会变化，设为animated不参与整图重绘，由_on_draw和blit单独绘制
+        self.info_text = self.fig.text(0.1, 0.02, '', fontsize=12, bbox=dict(facecolor='yellow', alpha=0.5), animated=True)
+        self.info_text.set_visible(False)
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+    
+    def _on_draw(self, event):
+        """
+        整图重绘后的回调：保存不含实时信息文本的背景供之后blit使用，再把文本画到画布上
+        :param event: 绘制事件
+        """
+        canvas = self.fig.canvas
+        if canvas.is_saving():
+            # savefig可能以其他分辨率重绘画布，旧背景作废，下次整图重绘时再保存
+            self._background = None
+        elif canvas.supports_blit:
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        self.info_text.draw(event.renderer)
+    
+    def _update_info_text(self, real_time_data):
+        """
+        更新实时数据信息文本
+        :param real_time_data: 实时数据
+        """
+        if real_time_data:
+            self.info_text.set_text(f'实时价格: {real_time_data["price"]:.2f}元 | 涨跌幅: {(real_time_data["price"]/real_time_data["pre_close"]-1)*100:.2f}% | 成交量: {real_time_data["volume"]:,}股')
+            self.info_text.set_visible(True)
+    
     def plot_kline_chart(self, real_time_data=None):
         """
         绘制当天的K线图，包括成交量
@@ -1129,94 +1711,127 @@ class RealTimeStockMonitor:
             print("图形输出已禁用，跳过绘制K线图")
             return
             
-        if self.today_data is None:
+        today_data = self.get_today_data()
+        if today_data is None:
             print("没有当天数据，无法绘制K线图")
             return
         
         print("正在绘制K线图...")
         
-        # 检查是否已经创建了图形窗口
-        if not hasattr(self, 'fig') or not hasattr(self, 'ax1') or not hasattr(self, 'ax2'):
-            # 创建图形和坐标轴（只创建一次）
-            self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(15, 12), gridspec_kw={'height_ratios': [3, 1]})
-            plt.ion()  # 启用交互式模式
-        else:
-            # 清除之前的绘图内容
-            self.ax1.clear()
-            self.ax2.clear()
-        
-        self.fig.suptitle(f'{real_time_data["name"]}({real_time_data["symbol"]}) 当天K线图', fontsize=16)
-        
-        # 绘制K线图
-        for i, date in enumerate(self.today_data.index):
-            open_p = self.today_data['open'].iloc[i]
-            close_p = self.today_data['close'].iloc[i]
-            high_p = self.today_data['high'].iloc[i]
-            low_p = self.today_data['low'].iloc[i]
-            volume = self.today_data['volume'].iloc[i]
-            
-            # 阳线（红）和阴线（绿）
-            if close_p >= open_p:
-                color = 'red'
-                bottom = open_p
-                height = close_p - open_p
-            else:
-                color = 'green'
-                bottom = close_p
-                height = open_p - close_p
-            
-            # 绘制实体
-            rect = Rectangle((i, bottom), 0.3, height, facecolor=color, edgecolor='black')
-            self.ax1.add_patch(rect)
-            
-            # 绘制上下影线
-            self.ax1.plot([i, i], [low_p, high_p], color='black', linewidth=0.5)
-            
-            # 绘制成交量柱状图
-            if close_p >= open_p:
-                color = 'red'
-            else:
-                color = 'green'
-            self.ax2.bar(i, volume, color=color, width=0.3)
+        canvas = self.fig.canvas
+        if today_data is self._plotted_data and self._background is not None:
+            # K线数据在同一分钟内不变（同一个DataFrame对象），只有实时信息文本变化：
+            # 恢复上次整图重绘保存的背景，只重画文本并blit，不重新绘制坐标轴和K线
+            self._update_info_text(real_time_data)
+            canvas.restore_region(self._background)
+            self.fig.draw_artist(self.info_text)
+            canvas.blit(self.fig.bbox)
+            self._after_plot()
+            canvas.flush_events()
+            return
         
-        # 设置坐标轴
-        self.ax1.set_xticks(range(len(self.today_data)))
-        self.ax1.set_xticklabels([date.strftime('%H:%M') for date in self.today_data.index], rotation=45)
-        self.ax1.set_ylabel('价格 (元)')
-        self.ax1.grid(True, linestyle='--', alpha=0.7)
+        if real_time_data:
+            self.fig.suptitle(f'{real_time_data["name"]}({real_time_data["symbol"]}) 当天K线图', fontsize=16)
         
-        self.ax2.set_xticks(range(len(self.today_data)))
-        self.ax2.set_xticklabels([date.strftime('%H:%M') for date in self.today_data.index], rotation=45)
-        self.ax2.set_ylabel('成交量')
-        self.ax2.grid(True, linestyle='--', alpha=0.7)
+        # 一次性取出各列数组
+        opens = today_data['open'].to_numpy(dtype=np.float64)
+        closes = today_data['close'].to_numpy(dtype=np.float64)
+        highs = today_data['high'].to_numpy()
+        lows = today_data['low'].to_numpy()
+        volumes = today_data['volume'].to_numpy()
+        x = np.arange(len(opens))
         
-        # 添加实时数据信息
-        if hasattr(self, 'info_text'):
-            self.info_text.remove()  # 移除之前的文本
-        if real_time_data:
-            self.info_text = self.fig.text(0.1, 0.02, f'实时价格: {real_time_data["price"]:.2f}元 | 涨跌幅: {(real_time_data["price"]/real_time_data["pre_close"]-1)*100:.2f}% | 成交量: {real_time_data["volume"]:,}股', fontsize=12, bbox=dict(facecolor='yellow', alpha=0.5))
+        # 阳线（红）和阴线（绿）
+        bottoms, heights, up = _compute_bars(opens, closes)
+        colors = BAR_COLORS[up.view(np.uint8)]
+        
+        # 更新实体
+        self.body_coll.set_verts(_bar_verts(x, bottoms, 0.3, heights))
+        self.body_coll.set_facecolor(colors)
+        
+        # 更新上下影线
+        wicks = np.stack([np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1)
+        self.wick_coll.set_segments(wicks)
+        
+        # 更新成交量柱状图（柱体以x为中心）
+        self.volume_coll.set_verts(_bar_verts(x - 0.15, 0, 0.3, volumes))
+        self.volume_coll.set_facecolor(colors)
+        
+        # 集合不参与relim，按新数据重新计算坐标范围
+        self.ax1.ignore_existing_data_limits = True
+        self.ax1.update_datalim(wicks.reshape(-1, 2))
+        self.ax1.autoscale_view()
+        self.ax2.ignore_existing_data_limits = True
+        self.ax2.update_datalim(np.column_stack([np.concatenate([x - 0.15, x + 0.15]), np.concatenate([np.zeros(len(x)), volumes])]))
+        self.ax2.autoscale_view()
         
-        # 保存图片
-        plt.tight_layout()
-        plt.savefig(f'{self.symbol}_kline.png', dpi=300, bbox_inches='tight')
-        print(f"K线图已保存为 {self.symbol}_kline.png")
+        # 设置坐标轴：数据范围不变时复用已有的刻度标签
+        index = today_data.index
+        labels_key = (len(today_data), index[0], index[-1]) if len(today_data) else None
+        if labels_key != self._tick_labels_key:
+            # 当天数据只在末尾追加新K线时，已格式化的标签保持不变，只格式化新增部分
+            cached = len(self._tick_labels)
+            old_key = self._tick_labels_key
+            if not (old_key and cached <= len(index) and index[0] == old_key[1] and index[cached - 1] == old_key[2]):
+                self._tick_labels = []
+                cached = 0
+            self._tick_labels.extend(index[cached:].strftime('%H:%M'))
+            self.ax1.set_xticks(x, self._tick_labels)
+            self._tick_labels_key = labels_key
         
-        # 更新显示
-        plt.pause(0.1)
+        # 更新实时数据信息
+        self._update_info_text(real_time_data)
         
+        self.fig.tight_layout()
+        
+        # 旧背景已与新数据不符，等重绘完成后由_on_draw重新保存
+        self._plotted_data = today_data
+        self._background = None
+        self._after_plot()
+        
+        # 请求重绘并处理界面事件
+        canvas.draw_idle()
+        canvas.flush_events()
+    
+    def _after_plot(self):
+        """
+        按需保存图片，每chart_save_every次绘制导出一次
+        """
+        if self.save_chart and self._tick_count % self.chart_save_every == 0:
+            self.export_chart(f'{self.symbol}_kline.png')
+            print(f"K线图已保存为 {self.symbol}_kline.png")
+        self._tick_count += 1
+        
+    def export_chart(self, filename):
+        """
+        将K线图导出为PNG图片：直接编码Agg渲染缓冲区，并使用低压缩级别
+        :param filename: 图片文件名
+        """
+        canvas = self.fig.canvas
+        if not hasattr(canvas, 'buffer_rgba'):
+            # 非Agg画布没有渲染缓冲区，退回到savefig
+            self.fig.savefig(filename, dpi=CHART_DPI)
+            return
+        canvas.draw()
+        Image.fromarray(np.asarray(canvas.buffer_rgba())).save(filename, compress_level=1)
+    
     def stop(self):
         """停止监控"""
         if self.running:
             self.running = False
+            # 等待后台任务完成后再关闭数据库连接
+            self._pool.shutdown(wait=True)
+            self.db_manager.close()
             # 关闭交互式模式
             plt.ioff()
-            plt.close()
+            if self.with_gui:
+                plt.close(self.fig)
             print("实时股票监控已停止")
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='实时股票监控工具')
-    parser.add_argument('--symbol', type=str, default='600000', help='股票代码')
+    parser.add_argument('--symbol', type=str, default='600000', help='股票代码，配合--save-to-db时可用逗号分隔多个代码')
     parser.add_argument('--interval', type=int, default=5, help='数据更新间隔（秒）')
     parser.add_argument('--time-range', type=str, default='day', choices=['day', 'week', 'month', 'year', '60min', '30min', '15min', '5min', '1min'], help='数据时间范围')
     parser.add_argument('--start-date', type=str, default=None, help='开始日期，格式为YYYY-MM-DD或YYYYMMDD')
@@ -1225,9 +1840,12 @@ def main():
     parser.add_argument('--load-from-db', action='store_true', help='从数据库加载数据')
     parser.add_argument('--with-gui', action='store_true', help='启用图形输出')
     parser.add_argument('--no-gui', action='store_false', dest='with_gui', help='禁用图形输出')
+    parser.add_argument('--save-chart', action='store_true', help='定期导出K线图图片')
+    parser.add_argument('--verbose', action='store_true', help='输出请求URL、响应内容等调试信息')
     parser.set_defaults(with_gui=True)  # 默认启用图形输出
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
     
     symbol = args.symbol
     interval = args.interval
@@ -1247,18 +1865,25 @@ def main():
         print(f"结束日期：{end_date}")
     print(f"图形输出：{'启用' if with_gui else '禁用'}")
     
+    symbols = symbol.split(',') if args.save_to_db else [symbol]
+    
     # 创建监控实例
-    monitor = RealTimeStockMonitor(symbol, interval, with_gui)
+    monitor = RealTimeStockMonitor(symbols[0], interval, with_gui, args.save_chart)
     
     if args.save_to_db:
-        # 获取指定时间范围的股票数据并保存到数据库
+        # 并发获取各股票指定时间范围的数据，全部获取后在同一个事务中保存到数据库
         print(f"正在获取{time_range}的股票数据...")
-        data = monitor.data_fetcher.get_stock_data_by_time_range(symbol, time_range, start_date, end_date)
-        if data is not None:
-            print(f"成功获取{len(data)}条{time_range}数据")
-            monitor.save_data_to_db(data, time_range)
-        else:
-            print(f"获取{time_range}数据失败")
+        results = monitor.data_fetcher.get_stock_data_batch([(code, time_range) for code in symbols], start_date, end_date)
+        items = {}
+        for (code, _), data in results.items():
+            if data is not None:
+                print(f"成功获取{code}的{len(data)}条{time_range}数据")
+                items[code] = data
+            else:
+                print(f"获取{code}的{time_range}数据失败")
+        if items:
+            monitor.db_manager.save_many(items, time_range, bulk_mode=True)
+        monitor.db_manager.close()
     elif args.load_from_db:
         # 从数据库加载指定时间范围的数据并绘制K线图
         print(f"正在从数据库加载{time_range}的股票数据...")
@@ -1279,9 +1904,12 @@ def main():
             # 设置today_data用于绘图
             monitor.today_data = data
             if with_gui:
+                # 从数据库加载时为一次性绘制，总是导出图片
+                monitor.save_chart = True
                 monitor.plot_kline_chart(real_time)
         else:
             print(f"从数据库加载{time_range}数据失败")
+        monitor.db_manager.close()
     else:
         # 启动实时监控
         monitor.start()
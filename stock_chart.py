@@ -4,11 +4,24 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.patches import Rectangle
+from matplotlib.collections import PolyCollection, LineCollection
 import datetime
 import os
+import glob
+import io
+import time
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
+try:
+    from numba import njit
+except ImportError:  # numba为可选依赖，未安装时退化为普通Python函数
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
 # 设置中文显示
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
@@ -19,10 +32,125 @@ price_cache = {}
 # 缓存有效期，单位：秒
 CACHE_EXPIRY = 3600  # 1小时
 
+# 1分钟K线缓存，存储(股票代码, 天数)和对应的(时间段编号, DataFrame)对
+kline_cache = {}
+# K线缓存有效期，单位：秒；同一时间段内重复获取直接使用缓存
+KLINE_CACHE_EXPIRY = 60  # 1分钟
+# K线磁盘缓存目录，多次运行之间复用同一时间段内已下载的数据
+KLINE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'stock')
+
+# 保存缠论分析图的默认分辨率
+CHART_DPI = 100
+
 # 初始化新浪股票API相关配置
 # 使用更可靠的新浪财经API格式
 SINA_STOCK_API = "https://finance.sina.com.cn/realstock/company/"
 
+# 请求超时时间，单位：秒
+REQUEST_TIMEOUT = 5
+# 东方财富网请求共用一个会话：复用连接池保持长连接，避免每次请求重新握手
+session = requests.Session()
+session.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Referer': 'http://quote.eastmoney.com/'
+})
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
+
+# 交易时段，两端均包含
+# 港股交易时间：9:30-12:00和13:00-16:00
+# A股交易时间：9:30-11:30和13:00-15:00
+HK_SESSIONS = (('09:30:00', '12:00:00'), ('13:00:00', '16:00:00'))
+A_SHARE_SESSIONS = (('09:30:00', '11:30:00'), ('13:00:00', '15:00:00'))
+
+def _trading_hours_mask(index, sessions):
+    """
+    计算时间索引中落在交易时段内的布尔掩码
+    结果与逐段between_time后合并排序一致，但只需一次按位比较，不产生中间DataFrame
+    :param index: DatetimeIndex
+    :param sessions: 交易时段列表，每项为(开始时间, 结束时间)
+    :return: 布尔数组
+    """
+    # 直接在datetime64数组上减去当天0点得到当天时刻，不经过pandas的时间解析和切片
+    values = index.to_numpy()
+    time_of_day = values - values.astype('datetime64[D]')
+    mask = np.zeros(len(index), dtype=bool)
+    for start, end in sessions:
+        mask |= (time_of_day >= pd.Timedelta(start).to_timedelta64()) & (time_of_day <= pd.Timedelta(end).to_timedelta64())
+    return mask
+
+def fetch_quotes(pairs):
+    """
+    通过东方财富网的批量行情接口，一次请求获取多只股票的实时行情
+    :param pairs: (市场代码, 股票代码)列表
+    :return: 股票代码到行情字段的映射，f43为最新价、f44最高价、f45最低价、f46开盘价；请求失败时返回空字典
+    """
+    secids = ','.join(f"{market}.{symbol}" for market, symbol in pairs)
+    url = f"http://push2.eastmoney.com/api/qt/ulist.np/get?fields=f12,f43,f44,f45,f46&secids={secids}&ut=f057cbcbce2a86e2866ab8877db1d059&fltt=2&invt=2"
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        return {}
+    
+    data = response.json().get('data') or {}
+    rows = data.get('diff') or []
+    # 接口有时以序号为键返回字典
+    if isinstance(rows, dict):
+        rows = rows.values()
+    return {row['f12']: row for row in rows}
+
+def _kline_cache_path(symbol, days, bucket):
+    """
+    获取K线磁盘缓存文件路径
+    :param symbol: 股票代码
+    :param days: 天数
+    :param bucket: 时间段编号
+    :return: 缓存文件路径
+    """
+    return os.path.join(KLINE_CACHE_DIR, f"{symbol}_{days}_{bucket}.pkl")
+
+def load_cached_minute_data(symbol, days):
+    """
+    从内存或磁盘缓存中读取当前时间段内的1分钟K线数据
+    :param symbol: 股票代码
+    :param days: 天数
+    :return: DataFrame的副本，缓存不存在或已过期时返回None
+    """
+    bucket = int(time.time() // KLINE_CACHE_EXPIRY)
+    cached = kline_cache.get((symbol, days))
+    if cached is not None and cached[0] == bucket:
+        return cached[1].copy()
+    
+    path = _kline_cache_path(symbol, days, bucket)
+    if os.path.exists(path):
+        try:
+            df = pd.read_pickle(path)
+        except Exception as e:
+            print(f"读取K线缓存失败: {type(e).__name__}: {e}")
+            return None
+        kline_cache[(symbol, days)] = (bucket, df)
+        return df.copy()
+    return None
+
+def store_cached_minute_data(symbol, days, df):
+    """
+    把1分钟K线数据写入内存和磁盘缓存，并清理同一股票的旧缓存文件
+    :param symbol: 股票代码
+    :param days: 天数
+    :param df: K线数据
+    """
+    bucket = int(time.time() // KLINE_CACHE_EXPIRY)
+    kline_cache[(symbol, days)] = (bucket, df.copy())
+    try:
+        os.makedirs(KLINE_CACHE_DIR, exist_ok=True)
+        path = _kline_cache_path(symbol, days, bucket)
+        for old_path in glob.glob(_kline_cache_path(symbol, days, '*')):
+            if old_path != path:
+                os.remove(old_path)
+        df.to_pickle(path)
+    except OSError as e:
+        print(f"写入K线缓存失败: {type(e).__name__}: {e}")
+
 def get_minute_data(symbol, days=1):
     """
     获取股票的1分钟级别交易数据
@@ -32,6 +160,12 @@ def get_minute_data(symbol, days=1):
     """
     global price_cache
     
+    # 同一时间段内已获取过的数据直接从缓存返回，不再重复请求
+    df = load_cached_minute_data(symbol, days)
+    if df is not None:
+        print(f"从缓存中获取 {symbol} 的1分钟数据，共 {len(df)} 条")
+        return df
+    
     try:
         print(f"正在尝试获取股票 {symbol} 的1分钟数据...")
         
@@ -55,16 +189,12 @@ def get_minute_data(symbol, days=1):
         
         # 构造东方财富网的1分钟K线数据接口
         url = f"http://push2his.eastmoney.com/api/qt/stock/kline/get?fields1=f1,f2,f3,f4,f5,f6&fields2=f51,f52,f53,f54,f55,f56,f57&beg={beg_str}&end={end_str}&ut=fa5fd1943c7b386f172d6893dbfba10b&secid={market}.{symbol}&klt=1&fqt=1"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Referer': 'http://quote.eastmoney.com/'
-        }
         
         print(f"尝试从东方财富网获取 {symbol} 的1分钟K线数据...")
         print(f"请求URL: {url}")
         
         # 发送请求获取数据
-        response = requests.get(url, headers=headers)
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
         response.encoding = 'utf-8'
         
         print(f"东方财富网API响应状态: {response.status_code}")
@@ -78,41 +208,23 @@ def get_minute_data(symbol, days=1):
                 
                 # 解析K线数据
                 # 东方财富返回的K线数据格式为："时间,开盘价,收盘价,最高价,最低价,成交量,成交额"
-                kline_list = []
-                for kline in kline_data:
-                    parts = kline.split(',')
-                    if len(parts) >= 6:
-                        kline_list.append({
-                            'date': parts[0],
-                            'open': float(parts[1]),
-                            'close': float(parts[2]),
-                            'high': float(parts[3]),
-                            'low': float(parts[4]),
-                            'volume': float(parts[5])
-                        })
-                
-                # 转换为DataFrame
-                df = pd.DataFrame(kline_list)
-                df['date'] = pd.to_datetime(df['date'])
+                # 跳过字段不足6个的K线，其余用pandas的C解析器一次性解析
+                # 价格使用float32以减少后续每次遍历的数据量；成交量可能带小数点，先按浮点数解析再转为整数
+                kline_data = [kline for kline in kline_data if kline.count(',') >= 5]
+                df = pd.read_csv(io.StringIO('\n'.join(kline_data)), header=None,
+                                 names=['date', 'open', 'close', 'high', 'low', 'volume'], usecols=range(6),
+                                 dtype={**dict.fromkeys(['open', 'close', 'high', 'low'], 'float32'), 'volume': 'float64'},
+                                 parse_dates=['date'], date_format='%Y-%m-%d %H:%M')
+                df['volume'] = df['volume'].astype('int32' if df['volume'].max() <= np.iinfo(np.int32).max else 'int64')
                 df.set_index('date', inplace=True)
-                df = df.rename(columns={'volume': 'volume'})
                 
-                # 过滤掉休市时间的数据
-                # 港股交易时间：9:30-12:00和13:00-16:00
-                # A股交易时间：9:30-11:30和13:00-15:00
-                if market == '116':
-                    # 港股交易时间
-                    morning_data = df.between_time('09:30:00', '12:00:00')
-                    afternoon_data = df.between_time('13:00:00', '16:00:00')
-                else:
-                    # A股交易时间
-                    morning_data = df.between_time('09:30:00', '11:30:00')
-                    afternoon_data = df.between_time('13:00:00', '15:00:00')
-                df = pd.concat([morning_data, afternoon_data]).sort_index()
+                # 过滤掉休市时间的数据：K线本身按时间排序，一次布尔筛选即可，无需分段拼接后再排序
+                df = df[_trading_hours_mask(df.index, HK_SESSIONS if market == '116' else A_SHARE_SESSIONS)]
                 
                 print(f"过滤后数据条数: {len(df)}")
                 print(f"数据示例: {df.head()}")
                 
+                store_cached_minute_data(symbol, days, df)
                 return df
             else:
                 print(f"东方财富网返回K线数据为空")
@@ -148,24 +260,14 @@ def get_minute_data(symbol, days=1):
     if current_price is None:
         try:
             # 使用东方财富网的实时行情接口获取当前价格
-            url = f"http://push2.eastmoney.com/api/qt/stock/get?fields=f43,f46,f44,f45&secid={market}.{symbol}&ut=f057cbcbce2a86e2866ab8877db1d059&fltt=2&invt=2"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Referer': 'http://quote.eastmoney.com/'
-            }
-            
             print(f"尝试从东方财富网获取 {symbol} 的当前价格...")
-            response = requests.get(url, headers=headers)
-            response.encoding = 'utf-8'
-            
-            if response.status_code == 200:
-                data_json = response.json()
-                if data_json['data']:
-                    # f43: 最新价
-                    current_price = float(data_json['data']['f43'])
-                    print(f"成功获取 {symbol} 的当前价格: {current_price}")
-                    # 更新缓存
-                    price_cache[symbol] = (current_price, current_time)
+            quote = fetch_quotes([(market, symbol)]).get(symbol)
+            if quote:
+                # f43: 最新价
+                current_price = float(quote['f43'])
+                print(f"成功获取 {symbol} 的当前价格: {current_price}")
+                # 更新缓存
+                price_cache[symbol] = (current_price, current_time)
         except Exception as e:
             print(f"无法从东方财富网获取 {symbol} 的当前价格: {type(e).__name__}: {e}")
     
@@ -195,7 +297,8 @@ def generate_simulation_data(symbol, days=1, current_price=None):
     # 生成随机价格数据
     # 根据股票代码生成动态随机种子，确保不同股票生成不同数据
     seed = hash(symbol) % 1000000  # 使用股票代码的哈希值作为种子
-    np.random.seed(seed)  # 设置基于股票代码的随机种子
+    # 使用独立的随机数生成器，不修改全局随机状态，多只股票并行生成时互不影响
+    rng = np.random.default_rng(seed)
     
     # 为不同股票设置不同的基准价格
     if current_price is not None:
@@ -207,45 +310,37 @@ def generate_simulation_data(symbol, days=1, current_price=None):
         base_price = 10.0 + (seed % 100) * 0.1  # 基准价格在10-20之间
         print(f"使用随机基准价格 {base_price} 生成模拟数据")
     
-    price_changes = np.random.normal(0, 0.01, total_minutes + 1)
-    prices = base_price + np.cumsum(price_changes)
+    # 原地缩放和累加，随机游走只占用一个数组
+    prices = rng.standard_normal(total_minutes + 1)
+    prices *= 0.01
+    np.cumsum(prices, out=prices)
+    prices += base_price
     
     # 生成开盘价、最高价、最低价、收盘价
     open_prices = prices[:-1]
     close_prices = prices[1:]
     
-    # 生成最高价和最低价（在开盘价和收盘价的基础上添加随机波动）
-    high_prices = np.maximum(open_prices, close_prices) + np.random.uniform(0, 0.02, total_minutes)
-    low_prices = np.minimum(open_prices, close_prices) - np.random.uniform(0, 0.02, total_minutes)
+    # 生成最高价和最低价（在开盘价和收盘价的基础上添加随机波动），原地累加随机波动减少临时数组
+    high_prices = np.maximum(open_prices, close_prices)
+    high_prices += rng.uniform(0, 0.02, total_minutes)
+    low_prices = np.minimum(open_prices, close_prices)
+    low_prices -= rng.uniform(0, 0.02, total_minutes)
     
     # 生成成交量（随机整数）
-    volumes = np.random.randint(10000, 1000000, total_minutes)
+    volumes = rng.integers(10000, 1000000, total_minutes, dtype=np.int32)
     
-    # 创建DataFrame
+    # 过滤掉休市时间的数据：根据股票代码判断是港股还是A股
+    # 时间索引本身有序，一次布尔筛选即可，无需分段拼接后再排序
+    mask = _trading_hours_mask(index, HK_SESSIONS if len(symbol) == 5 else A_SHARE_SESSIONS)
+    
+    # 创建DataFrame，列名为小写，与原有代码兼容；价格使用float32，成交量使用int32，与真实数据一致
     df = pd.DataFrame({
-        'Open': open_prices,
-        'High': high_prices,
-        'Low': low_prices,
-        'Close': close_prices,
-        'Volume': volumes
-    }, index=index)
-    
-    # 重命名列名为小写，与原有代码兼容
-    df.columns = [col.lower() for col in df.columns]
-    
-    # 过滤掉休市时间的数据
-    # 根据股票代码判断是港股还是A股
-    # 港股交易时间：9:30-12:00和13:00-16:00
-    # A股交易时间：9:30-11:30和13:00-15:00
-    if len(symbol) == 5:
-        # 港股交易时间
-        morning_data = df.between_time('09:30:00', '12:00:00')
-        afternoon_data = df.between_time('13:00:00', '16:00:00')
-    else:
-        # A股交易时间
-        morning_data = df.between_time('09:30:00', '11:30:00')
-        afternoon_data = df.between_time('13:00:00', '15:00:00')
-    df = pd.concat([morning_data, afternoon_data]).sort_index()
+        'open': open_prices[mask].astype(np.float32),
+        'high': high_prices[mask].astype(np.float32),
+        'low': low_prices[mask].astype(np.float32),
+        'close': close_prices[mask].astype(np.float32),
+        'volume': volumes[mask]
+    }, index=index[mask])
     
     return df
 
@@ -256,24 +351,24 @@ def identify_fractals(df):
     :param df: 包含high和low列的DataFrame
     :return: 添加了顶分型和底分型标记的DataFrame
     """
-    df['top_fractal'] = False
-    df['bottom_fractal'] = False
-    
-    # 识别顶分型：中间K线最高价高于相邻两根K线
-    for i in range(2, len(df)-2):
-        if (df['high'].iloc[i] > df['high'].iloc[i-1] and 
-            df['high'].iloc[i] > df['high'].iloc[i+1] and
-            df['high'].iloc[i-1] > df['high'].iloc[i-2] and
-            df['high'].iloc[i+1] > df['high'].iloc[i+2]):
-            df.loc[df.index[i], 'top_fractal'] = True
-    
-    # 识别底分型：中间K线最低价低于相邻两根K线
-    for i in range(2, len(df)-2):
-        if (df['low'].iloc[i] < df['low'].iloc[i-1] and 
-            df['low'].iloc[i] < df['low'].iloc[i+1] and
-            df['low'].iloc[i-1] < df['low'].iloc[i-2] and
-            df['low'].iloc[i+1] < df['low'].iloc[i+2]):
-            df.loc[df.index[i], 'bottom_fractal'] = True
+    high = df['high'].to_numpy()
+    low = df['low'].to_numpy()
+    top = np.zeros(len(df), dtype=bool)
+    bottom = np.zeros(len(df), dtype=bool)
+    
+    if len(df) > 4:
+        # 用错位切片一次比较所有K线：h0为中间K线，hm1/hm2为前1/2根，hp1/hp2为后1/2根
+        h0, hm1, hm2, hp1, hp2 = high[2:-2], high[1:-3], high[:-4], high[3:-1], high[4:]
+        l0, lm1, lm2, lp1, lp2 = low[2:-2], low[1:-3], low[:-4], low[3:-1], low[4:]
+        
+        # 识别顶分型：中间K线最高价高于相邻两根K线
+        top[2:-2] = (h0 > hm1) & (h0 > hp1) & (hm1 > hm2) & (hp1 > hp2)
+        
+        # 识别底分型：中间K线最低价低于相邻两根K线
+        bottom[2:-2] = (l0 < lm1) & (l0 < lp1) & (lm1 < lm2) & (lp1 < lp2)
+    
+    df['top_fractal'] = top
+    df['bottom_fractal'] = bottom
     
     return df
 
@@ -285,49 +380,61 @@ def identify_pens(df):
     :return: 笔的列表，每个笔包含起始点、结束点和方向
     """
     pens = []
-    fractals = []
     
-    # 收集所有分型点
-    for i in range(len(df)):
-        if df['top_fractal'].iloc[i]:
-            fractals.append((df.index[i], df['high'].iloc[i], 'top'))
-        elif df['bottom_fractal'].iloc[i]:
-            fractals.append((df.index[i], df['low'].iloc[i], 'bottom'))
+    # 收集所有分型点：同一根K线同时是顶分型和底分型时按顶分型处理
+    top = df['top_fractal'].to_numpy(dtype=bool)
+    bottom = df['bottom_fractal'].to_numpy(dtype=bool)
+    idx = np.flatnonzero(top | bottom)
+    is_top = top[idx]
+    price = np.where(is_top, df['high'].to_numpy()[idx], df['low'].to_numpy()[idx])
     
     # 识别笔：顶底交替，且有一定涨幅
-    if len(fractals) < 2:
+    if len(idx) < 2:
         return pens
     
-    current_type = fractals[0][2]
-    current_point = fractals[0]
-    
-    for i in range(1, len(fractals)):
-        next_point = fractals[i]
-        next_type = next_point[2]
-        
-        # 顶底交替
-        if next_type != current_type:
-            # 计算笔的幅度
-            amplitude = abs(next_point[1] - current_point[1])
-            
-            # 简单过滤：幅度大于0
-            if amplitude > 0:
-                direction = 'up' if next_type == 'top' else 'down'
-                # 计算笔的最高价和最低价
-                high = max(current_point[1], next_point[1])
-                low = min(current_point[1], next_point[1])
-                pens.append({
-                    'start': current_point,
-                    'end': next_point,
-                    'direction': direction,
-                    'high': high,
-                    'low': low
-                })
-                current_type = next_type
-                current_point = next_point
+    # 笔首尾相接，内核只返回依次相连的笔端点在分型数组中的位置
+    points = _pens_kernel(price, is_top.view(np.int8))
+    
+    # 只为笔端点构造(时间, 价格, 类型)元组，相邻笔共用同一个端点
+    times = df.index[idx[points]]
+    point_prices = price[points]
+    point_tops = is_top[points]
+    endpoints = [(times[k], point_prices[k], 'top' if point_tops[k] else 'bottom') for k in range(len(points))]
+    highs = np.maximum(point_prices[:-1], point_prices[1:])
+    lows = np.minimum(point_prices[:-1], point_prices[1:])
+    for k in range(len(points) - 1):
+        pens.append({
+            'start': endpoints[k],
+            'end': endpoints[k + 1],
+            'direction': 'up' if point_tops[k + 1] else 'down',
+            'high': highs[k],
+            'low': lows[k]
+        })
     
     return pens
 
+@njit(cache=True)
+def _pens_kernel(price, kind):
+    """
+    笔识别的数值内核：从第一个分型开始，依次寻找与当前端点类型相反且价格不同的下一个分型
+    :param price: 分型价格数组
+    :param kind: 分型类型数组，1为顶分型，0为底分型
+    :return: 笔端点在分型数组中的位置，第k笔从第k个端点到第k+1个端点；没有笔时为空数组
+    """
+    n = len(price)
+    points = np.empty(n, dtype=np.int64)
+    points[0] = 0
+    count = 1
+    for i in range(1, n):
+        current = points[count - 1]
+        # 顶底交替，且幅度大于0
+        if kind[i] != kind[current] and abs(price[i] - price[current]) > 0:
+            points[count] = i
+            count += 1
+    if count < 2:
+        return points[:0]
+    return points[:count]
+
 # 识别缠论中枢
 def identify_zhongshu(pens):
     """
@@ -341,57 +448,61 @@ def identify_zhongshu(pens):
     if len(pens) < 3:
         return zhongshus
     
-    # 遍历所有可能的笔组合，寻找中枢
-    for i in range(len(pens) - 2):
-        # 取连续的3个笔
-        pen1 = pens[i]
-        pen2 = pens[i + 1]
-        pen3 = pens[i + 2]
-        
-        # 计算这三个笔的价格区间
-        high1 = pen1['high']
-        low1 = pen1['low']
-        high2 = pen2['high']
-        low2 = pen2['low']
-        high3 = pen3['high']
-        low3 = pen3['low']
-        
-        # 计算三个笔的最高高点和最低低点
-        combined_high = min(high1, high2, high3)  # 中枢上沿是三个笔高点的最小值
-        combined_low = max(low1, low2, low3)      # 中枢下沿是三个笔低点的最大值
+    # 取出所有笔的高低点数组
+    highs = np.fromiter((pen['high'] for pen in pens), dtype=np.float64, count=len(pens))
+    lows = np.fromiter((pen['low'] for pen in pens), dtype=np.float64, count=len(pens))
+    
+    first_pens, end_pens, zs_highs, zs_lows = _zhongshu_kernel(highs, lows)
+    for k in range(len(first_pens)):
+        first, end = first_pens[k], end_pens[k]
+        zhongshus.append({
+            'start': pens[first]['start'][0],
+            'end': pens[end - 1]['end'][0],
+            'high': zs_highs[k],
+            'low': zs_lows[k],
+            'pens': list(range(first, end))
+        })
+    
+    return zhongshus
+
+@njit(cache=True)
+def _zhongshu_kernel(highs, lows):
+    """
+    中枢识别的数值内核：从左到右扫描一遍，已并入中枢的笔不再作为新中枢的起点
+    :param highs: 笔的最高价数组
+    :param lows: 笔的最低价数组
+    :return: (中枢第一笔序号, 中枢最后一笔之后的序号, 中枢上沿, 中枢下沿)
+    """
+    n = len(highs)
+    first_pens = np.empty(n, dtype=np.int64)
+    end_pens = np.empty(n, dtype=np.int64)
+    zs_highs = np.empty(n, dtype=np.float64)
+    zs_lows = np.empty(n, dtype=np.float64)
+    count = 0
+    i = 0
+    while i <= n - 3:
+        # 中枢上沿是三个笔高点的最小值，下沿是三个笔低点的最大值
+        high = min(highs[i], highs[i + 1], highs[i + 2])
+        low = max(lows[i], lows[i + 1], lows[i + 2])
         
         # 如果存在重叠，即中枢上沿大于中枢下沿，则形成中枢
-        if combined_high > combined_low:
-            # 初始中枢
-            zhongshu = {
-                'start': pen1['start'][0],
-                'end': pen3['end'][0],
-                'high': combined_high,
-                'low': combined_low,
-                'pens': [i, i + 1, i + 2]
-            }
-            
-            # 检查后续笔是否继续扩展该中枢
+        if high > low:
+            # 后续笔与当前中枢有重叠时扩展中枢，并收窄中枢区间
             j = i + 3
-            while j < len(pens):
-                next_pen = pens[j]
-                next_high = next_pen['high']
-                next_low = next_pen['low']
-                
-                # 如果后续笔与当前中枢有重叠，则扩展中枢
-                if next_high > zhongshu['low'] and next_low < zhongshu['high']:
-                    # 更新中枢区间
-                    zhongshu['high'] = min(zhongshu['high'], next_high)
-                    zhongshu['low'] = max(zhongshu['low'], next_low)
-                    zhongshu['end'] = pens[j]['end'][0]
-                    zhongshu['pens'].append(j)
-                    j += 1
-                else:
-                    break
-            
-            zhongshus.append(zhongshu)
-    
-    return zhongshus
+            while j < n and highs[j] > low and lows[j] < high:
+                high = min(high, highs[j])
+                low = max(low, lows[j])
+                j += 1
+            first_pens[count] = i
+            end_pens[count] = j
+            zs_highs[count] = high
+            zs_lows[count] = low
+            count += 1
+            # 跳过已并入中枢的笔
+            i = j
+        else:
+            i += 1
+    return first_pens[:count], end_pens[:count], zs_highs[:count], zs_lows[:count]
 
 # 识别缠论线段
 def identify_segments(df, pens):
@@ -439,82 +550,85 @@ def identify_segments(df, pens):
     
     return segments
 
+# K线颜色表，按是否为阳线索引：阴线为绿色，阳线为红色
+BAR_COLORS = np.array(['green', 'red'])
+
+@njit(cache=True)
+def _compute_bars(opens, closes):
+    """
+    计算K线实体的底部、高度和涨跌标记
+    :param opens: 开盘价数组
+    :param closes: 收盘价数组
+    :return: (实体底部, 实体高度, 是否为阳线)
+    """
+    n = len(opens)
+    bottoms = np.empty(n, dtype=np.float64)
+    heights = np.empty(n, dtype=np.float64)
+    up = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        up[i] = closes[i] >= opens[i]
+        if up[i]:
+            bottoms[i] = opens[i]
+            heights[i] = closes[i] - opens[i]
+        else:
+            bottoms[i] = closes[i]
+            heights[i] = opens[i] - closes[i]
+    return bottoms, heights, up
+
 # 绘制K线图并标记缠论结构
-def plot_candlestick_with_chan(df, pens, segments, zhongshus):
+def plot_candlestick_with_chan(df, pens, segments, zhongshus, save_path='chan_analysis.png', dpi=CHART_DPI):
     """
     绘制K线图并标记缠论的分型、笔、线段和中枢
     :param df: 分钟数据
     :param pens: 笔的列表
     :param segments: 线段的列表
     :param zhongshus: 中枢列表
+    :param save_path: 图片保存路径，为None时不保存
+    :param dpi: 保存图片的分辨率
     """
     # 创建图形和坐标轴
     fig, ax = plt.subplots(figsize=(15, 10))
     
     # 创建一个新的索引，用于在图形上跳过中午休市时间
     # 将时间转换为数值，并为每个时间点分配一个连续的数值，跳过中午休市时间
-    time_values = []
-    time_labels = []
-    current_value = 0
-    
-    for i, date in enumerate(df.index):
-        # 将时间转换为小时和分钟
-        hour = date.hour
-        minute = date.minute
-        
-        # 添加当前时间点
-        time_values.append(current_value)
-        time_labels.append(date)
-        
-        # 如果不是最后一个时间点，计算下一个时间点的索引
-        if i < len(df.index) - 1:
-            next_date = df.index[i+1]
-            next_hour = next_date.hour
-            next_minute = next_date.minute
-            
-            # 检查是否需要跳过中午休市时间
-            # 如果当前时间是上午11:30，下一个时间是下午13:00，跳过中午休市时间
-            if hour == 11 and minute == 30 and next_hour == 13 and next_minute == 0:
-                # 跳过中午休市时间，增加较大的间隔
-                current_value += 60  # 跳过60分钟的间隔
-            else:
-                # 正常增加1分钟
-                current_value += 1
-        else:
-            # 最后一个时间点，不需要增加
-            pass
-    
-    # 绘制K线
-    for i in range(len(df)):
-        date = df.index[i]
-        open_p = df['open'].iloc[i]
-        high_p = df['high'].iloc[i]
-        low_p = df['low'].iloc[i]
-        close_p = df['close'].iloc[i]
-        
-        # 阳线（红）和阴线（绿）
-        if close_p >= open_p:
-            color = 'red'
-            bottom = open_p
-            height = close_p - open_p
-        else:
-            color = 'green'
-            bottom = close_p
-            height = open_p - close_p
-        
-        # 绘制实体
-        rect = Rectangle((time_values[i], bottom), 0.3, height, facecolor=color, edgecolor='black')
-        ax.add_patch(rect)
-        
-        # 绘制上下影线
-        ax.plot([time_values[i], time_values[i]], [low_p, high_p], color='black', linewidth=0.5)
+    minutes = df.index.hour.to_numpy() * 60 + df.index.minute.to_numpy()
+    
+    # 如果当前时间是上午11:30，下一个时间是下午13:00，跳过中午休市时间（间隔60），否则正常增加1分钟
+    is_gap = (minutes[:-1] == 690) & (minutes[1:] == 780)
+    time_values = np.zeros(len(df), dtype=np.int64)
+    time_values[1:] = np.cumsum(np.where(is_gap, 60, 1))
+    time_labels = df.index
+    
+    # 绘制K线：一次性取出各列数组，避免逐行iloc
+    opens = df['open'].to_numpy()
+    highs = df['high'].to_numpy()
+    lows = df['low'].to_numpy()
+    closes = df['close'].to_numpy()
+    # 时间到位置的映射只建立一次，后续标注直接查字典，不再逐个调用index.get_loc
+    idx_pos = {date: i for i, date in enumerate(df.index)}
+    
+    # 阳线（红）和阴线（绿）：一次遍历算出实体底部、高度和涨跌，颜色按涨跌查表
+    bottoms, heights, up = _compute_bars(opens, closes)
+    colors = BAR_COLORS[up.view(np.uint8)]
+    
+    # 绘制实体：直接按数组计算所有实体的四个顶点，放在一个集合中，只产生一个图元
+    bodies = np.empty((len(time_values), 4, 2))
+    bodies[:, [0, 3], 0] = time_values[:, None]
+    bodies[:, [1, 2], 0] = (time_values + 0.3)[:, None]
+    bodies[:, [0, 1], 1] = bottoms[:, None]
+    bodies[:, [2, 3], 1] = (bottoms + heights)[:, None]
+    ax.add_collection(PolyCollection(bodies, facecolor=colors, edgecolor='black'))
+    
+    # 绘制上下影线：所有影线作为线段放在一个集合中
+    wicks = np.stack([np.column_stack([time_values, lows]), np.column_stack([time_values, highs])], axis=1)
+    ax.add_collection(LineCollection(wicks, colors='black', linewidths=0.5))
     
     # 绘制中枢
     for i, zhongshu in enumerate(zhongshus):
         # 获取中枢对应的时间范围
         # 查找中枢开始和结束时间在time_values中的索引
-        start_idx = df.index.get_loc(zhongshu['start'])
-        end_idx = df.index.get_loc(zhongshu['end'])
+        start_idx = idx_pos[zhongshu['start']]
+        end_idx = idx_pos[zhongshu['end']]
         start_time = time_values[start_idx]
         end_time = time_values[end_idx]
         
@@ -545,24 +659,20 @@ def plot_candlestick_with_chan(df, pens, segments, zhongshus):
         )
     
     # 标记顶分型和底分型
-    top_fractals = df[df['top_fractal']]
-    bottom_fractals = df[df['bottom_fractal']]
-    
     # 获取顶分型和底分型在time_values中的索引
-    top_indices = [df.index.get_loc(date) for date in top_fractals.index]
-    bottom_indices = [df.index.get_loc(date) for date in bottom_fractals.index]
+    top_indices = np.flatnonzero(df['top_fractal'].to_numpy())
+    bottom_indices = np.flatnonzero(df['bottom_fractal'].to_numpy())
     
-    ax.scatter([time_values[i] for i in top_indices], top_fractals['high'], 
+    ax.scatter(time_values[top_indices], highs[top_indices], 
                marker='^', color='purple', s=100, label='顶分型')
-    ax.scatter([time_values[i] for i in bottom_indices], bottom_fractals['low'], 
+    ax.scatter(time_values[bottom_indices], lows[bottom_indices], 
                marker='v', color='blue', s=100, label='底分型')
     
     # 添加分型文本标注
-    for i, (date, row) in enumerate(top_fractals.iterrows()):
-        idx = df.index.get_loc(date)
+    for i, idx in enumerate(top_indices):
         ax.text(
             time_values[idx], 
-            row['high'] + 0.05, 
+            highs[idx] + 0.05, 
             f"顶分型{i+1}", 
             fontsize=8, 
             color='purple', 
@@ -570,11 +680,10 @@ def plot_candlestick_with_chan(df, pens, segments, zhongshus):
             bbox=dict(facecolor='white', alpha=0.8, boxstyle='round,pad=0.2')
         )
     
-    for i, (date, row) in enumerate(bottom_fractals.iterrows()):
-        idx = df.index.get_loc(date)
+    for i, idx in enumerate(bottom_indices):
         ax.text(
             time_values[idx], 
-            row['low'] - 0.05, 
+            lows[idx] - 0.05, 
             f"底分型{i+1}", 
             fontsize=8, 
             color='blue', 
@@ -585,8 +694,8 @@ def plot_candlestick_with_chan(df, pens, segments, zhongshus):
     # 绘制笔
     for i, pen in enumerate(pens):
         # 获取笔的开始和结束时间在time_values中的索引
-        start_idx = df.index.get_loc(pen['start'][0])
-        end_idx = df.index.get_loc(pen['end'][0])
+        start_idx = idx_pos[pen['start'][0]]
+        end_idx = idx_pos[pen['end'][0]]
         start_date = time_values[start_idx]
         start_price = pen['start'][1]
         end_date = time_values[end_idx]
@@ -613,8 +722,8 @@ def plot_candlestick_with_chan(df, pens, segments, zhongshus):
     # 绘制线段
     for i, segment in enumerate(segments):
         # 获取线段的开始和结束时间在time_values中的索引
-        start_idx = df.index.get_loc(segment['start'][0])
-        end_idx = df.index.get_loc(segment['end'][0])
+        start_idx = idx_pos[segment['start'][0]]
+        end_idx = idx_pos[segment['end'][0]]
         start_date = time_values[start_idx]
         start_price = segment['start'][1]
         end_date = time_values[end_idx]
@@ -675,9 +784,10 @@ def plot_candlestick_with_chan(df, pens, segments, zhongshus):
     # 调整布局
     plt.tight_layout()
     
-    # 保存图像
-    plt.savefig('chan_analysis.png', dpi=300)
-    print("缠论分析图已保存为 chan_analysis.png")
+    # 按需保存图像
+    if save_path:
+        fig.savefig(save_path, dpi=dpi)
+        print(f"缠论分析图已保存为 {save_path}")
     
     # 显示图像
     plt.show()
@@ -693,6 +803,8 @@ def main():
     parser = argparse.ArgumentParser(description='缠论K线分析工具')
     parser.add_argument('symbol', nargs='?', help='股票代码，例如：600000')
     parser.add_argument('days', nargs='?', type=int, default=1, help='获取数据的天数，默认：1')
+    parser.add_argument('--no-save', action='store_true', help='不保存缠论分析图图片')
+    parser.add_argument('--dpi', type=int, default=CHART_DPI, help=f'保存图片的分辨率，默认：{CHART_DPI}')
     args = parser.parse_args()
     
     # 如果命令行没有提供股票代码，则交互式输入
@@ -742,7 +854,8 @@ def main():
     
     # 绘制K线图并标记缠论结构
     print("正在绘制缠论分析图...")
-    plot_candlestick_with_chan(df, pens, segments, zhongshus)
+    plot_candlestick_with_chan(df, pens, segments, zhongshus,
+                               save_path=None if args.no_save else 'chan_analysis.png', dpi=args.dpi)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
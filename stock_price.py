@@ -1,32 +1,100 @@
 # -*- coding:utf-8 -*-
  
-import tushare as ts
+import io
+import re
+import numpy as np
+import pandas as pd
+import requests
 import os
+import sys
 import threading
 import time
+
+# Windows下执行一次空命令以启用控制台的ANSI转义序列支持
+if os.name == "nt":
+    os.system("")
  
-def get():
-    i = os.system("cls")                                          # 清屏操作
+# 请求超时时间，单位：秒
+REQUEST_TIMEOUT = 2
+# 新浪实时行情接口，所有刷新共用一个会话以保持长连接，避免每次请求重新握手
+SINA_QUOTE_URL = "http://hq.sinajs.cn/list="
+session = requests.Session()
+session.headers.update({
+    'User-Agent': 'Mozilla/5.0',
+    'Referer': 'https://finance.sina.com.cn/'
+})
+
+# 与tushare.get_realtime_quotes相同的指数简称和返回列
+INDEX_SYMBOLS = {'sh': 'sh000001', 'sz': 'sz399001', 'hs300': 'sh000300',
+                 'sz50': 'sh000016', 'zxb': 'sz399005', 'cyb': 'sz399006'}
+QUOTE_COLUMNS = ['name', 'open', 'pre_close', 'price', 'high', 'low', 'bid', 'ask',
+                 'volume', 'amount',
+                 'b1_v', 'b1_p', 'b2_v', 'b2_p', 'b3_v', 'b3_p', 'b4_v', 'b4_p', 'b5_v', 'b5_p',
+                 'a1_v', 'a1_p', 'a2_v', 'a2_p', 'a3_v', 'a3_p', 'a4_v', 'a4_p', 'a5_v', 'a5_p',
+                 'date', 'time']
+
+
+def get_realtime_quotes(symbols):
+    """
+    通过共用会话直接请求新浪实时行情，代替tushare每次新建连接的get_realtime_quotes
+    :param symbols: 股票代码或指数简称列表
+    :return: 与tushare返回列相同的DataFrame，各列均为字符串
+    """
+    codes = [INDEX_SYMBOLS.get(s) or ('sh' if s[:1] in '569' else 'sz') + s for s in symbols]
+    response = session.get(SINA_QUOTE_URL + ','.join(codes), timeout=REQUEST_TIMEOUT)
+    response.encoding = 'gbk'
+
+    # 每行形如 var hq_str_sh601168="名称,开盘价,...";
+    # 代码无效或停牌时返回空行情，与tushare一样跳过
+    rows = [(code, row) for code, row in re.findall(r'hq_str_(\w+)="([^"]*)"', response.text) if row]
+    if not rows:
+        return pd.DataFrame(columns=QUOTE_COLUMNS + ['code'], dtype=str)
+    df = pd.read_csv(io.StringIO('\n'.join(row for _, row in rows)), header=None,
+                     names=QUOTE_COLUMNS, usecols=range(len(QUOTE_COLUMNS)), dtype=str)
+    df['code'] = [code[2:] for code, _ in rows]
+    return df
 
-    df = ts.get_realtime_quotes(['sh','sz','601168'])
  
-    #print(df['code'][1] + "  " + df['name'][1] + "  " + str(round((float(df['price'][1]) - float(df['pre_close'][1])) / float(df['pre_close'][1]) * 100, 2)) + "%" + "  ")
-    print(df['code'][0] + "  " + df['name'][0] + "  " + str(round((float(df['price'][0]) - float(df['pre_close'][0])) / float(df['pre_close'][0]) * 100, 2)) + "%" + "  ")
-    print(df['code'][1] + "  " + df['name'][1] + "  " + str(round((float(df['price'][1]) - float(df['pre_close'][1])) / float(df['pre_close'][1]) * 100, 2)) + "%" + "  ")
+def get():
+    sys.stdout.write("\x1b[2J\x1b[H")                             # 清屏操作，直接输出ANSI转义序列
+    sys.stdout.flush()
+
+    df = get_realtime_quotes(['sh','sz','601168'])
+
+    # 一次取出需要的列，涨跌幅整列计算
+    code, name, price, pre, t, vol = df[['code', 'name', 'price', 'pre_close', 'time', 'volume']].to_numpy().T
+    price = price.astype(np.float64)
+    pre = pre.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.round((price - pre) / pre * 100, 2)
+
+    # 拼好整块输出后一次写入，行情数再多也只写一次
+    lines = [f"{c}  {n}  {p}%  " for c, n, p in zip(code, name, pct)]
+    lines.append(f"{code[-1]}  {t[-1]}  {price[-1]}  {vol[-1]}")
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+stop = threading.Event()
 
-    print(df['code'][2] + "  " + df['name'][2] + "  " + str(round((float(df['price'][2]) - float(df['pre_close'][2])) / float(df['pre_close'][2]) * 100, 2)) + "%" + "  ")
-    print(df['code'][2] + "  "+ df['time'][2] + "  " + str(float(df['price'][2]))+ "  " + str(df['volume'][2]))
 
-    global timer
-    timer = threading.Timer(5.0, get, [])
-    timer.start()
+def loop():
+    """在单个后台线程中定时刷新行情，首次3秒后刷新，之后每5秒一次"""
+    delay = 3.0
+    while not stop.wait(delay):
+        # 单次刷新失败（如请求超时）时只打印错误，下次继续刷新
+        try:
+            get()
+        except Exception as e:
+            print(f"获取行情失败: {type(e).__name__}: {e}")
+        delay = 5.0
  
 if __name__ == "__main__":
     try:
-        timer = threading.Timer(3.0, get, [])
-        timer.start()
+        t = threading.Thread(target=loop, daemon=True)
+        t.start()
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        timer.cancel()
-        print("\n程序已安全退出")
\ No newline at end of file
+        stop.set()
+        print("\n程序已安全退出")
@@ -3,252 +3,387 @@ import pandas as pd
 import numpy as np
 from unittest.mock import patch, MagicMock
 import datetime
-import sys
-import os
-
-# 添加源文件路径到sys.path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import requests
+from urllib.parse import urlsplit, parse_qsl
 
 # 导入被测模块
 import stock_chart
 
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """每个测试使用独立的内存缓存和临时磁盘缓存目录，避免测试之间及并行进程之间互相影响"""
+    monkeypatch.setattr(stock_chart, 'kline_cache', {})
+    monkeypatch.setattr(stock_chart, 'price_cache', {})
+    monkeypatch.setattr(stock_chart, 'KLINE_CACHE_DIR', str(tmp_path))
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    """禁止测试发出真实的网络请求，未打桩的请求直接使测试失败"""
+    def request(*args, **kwargs):
+        # pytest.fail抛出的异常不是Exception的子类，不会被被测代码的异常处理吞掉
+        pytest.fail(f"测试发出了真实的网络请求: {args[:2]}")
+    monkeypatch.setattr(stock_chart.session, 'request', request)
+
+
+# 测试只读取这些数据框而不修改，用pytest -n auto并行时每个进程只构造一次
+@pytest.fixture(scope="session")
+def mock_df():
+    """模拟数据生成返回的单行K线数据"""
+    return pd.DataFrame({
+        'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
+    })
+
+
+def kline_response(klines):
+    """构造东方财富网1分钟K线接口的响应"""
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {'data': {'klines': klines} if klines else None}
+    return response
+
+
+def request_params(mock_get):
+    """取出最近一次K线请求的地址和查询参数，call_args只读取一次"""
+    args, kwargs = mock_get.call_args
+    url = urlsplit(args[0])
+    return url, dict(parse_qsl(url.query)), kwargs
+
+
+# 两根交易时段内的1分钟K线："时间,开盘价,收盘价,最高价,最低价,成交量,成交额"
+KLINES = [
+    '2024-01-02 09:31,10.00,10.10,10.20,9.90,1000,10100.0',
+    '2024-01-02 09:32,10.10,10.20,10.30,10.00,2000,20400.0',
+]
+
+
+# 测试只读取这些响应而不修改，用pytest -n auto并行时每个进程只构造一次
+@pytest.fixture(scope="session")
+def klines_response():
+    """返回两根K线的响应"""
+    return kline_response(KLINES)
+
+
+@pytest.fixture(scope="session")
+def empty_response():
+    """返回K线数据为空的响应"""
+    return kline_response([])
+
+
 class TestGetMinuteData:
     """测试 get_minute_data 方法"""
     
-    def test_get_minute_data_sh_stock_success(self):
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_sh_stock_success(self, mock_get, mock_quotes, mock_generate, klines_response):
         """测试上证股票代码成功获取数据"""
-        # 模拟 yf.download 返回有效数据
-        mock_df = pd.DataFrame({
-            'Open': [10.0, 10.1],
-            'High': [10.2, 10.3],
-            'Low': [9.8, 9.9],
-            'Close': [10.1, 10.2],
-            'Volume': [1000, 2000]
-        })
+        mock_get.return_value = klines_response
         
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = mock_df
-            mock_generate.return_value = mock_df
-            
-            # 调用被测方法
-            result = stock_chart.get_minute_data('600000', 1)
-            
-            # 验证结果
-            assert isinstance(result, pd.DataFrame)
-            assert len(result) > 0
-            mock_download.assert_called_once()
-            mock_generate.assert_not_called()  # 不应该调用模拟数据生成
-    
-    def test_get_minute_data_sz_stock_success(self):
+        # 调用被测方法
+        result = stock_chart.get_minute_data('600000', 1)
+        
+        # 验证结果
+        assert isinstance(result, pd.DataFrame)
+        assert len(result) == 2
+        mock_get.assert_called_once()
+        mock_generate.assert_not_called()  # 不应该调用模拟数据生成
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_sz_stock_success(self, mock_get, mock_quotes, mock_generate, klines_response):
         """测试深证股票代码成功获取数据"""
-        # 模拟 yf.download 返回有效数据
-        mock_df = pd.DataFrame({
-            'open': [20.0, 20.1],
-            'high': [20.2, 20.3],
-            'low': [19.8, 19.9],
-            'close': [20.1, 20.2],
-            'volume': [3000, 4000]
-        })
+        mock_get.return_value = klines_response
         
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = mock_df
-            mock_generate.return_value = mock_df
-            
-            # 调用被测方法
-            result = stock_chart.get_minute_data('000001', 2)
-            
-            # 验证结果
-            assert isinstance(result, pd.DataFrame)
-            assert len(result) > 0
-            mock_download.assert_called_once()
-            mock_generate.assert_not_called()
-    
-    def test_get_minute_data_empty_data_fallback(self):
+        # 调用被测方法
+        result = stock_chart.get_minute_data('000001', 2)
+        
+        # 验证结果
+        assert isinstance(result, pd.DataFrame)
+        assert len(result) == 2
+        mock_get.assert_called_once()
+        mock_generate.assert_not_called()
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_empty_data_fallback(self, mock_get, mock_quotes, mock_generate, mock_df, empty_response):
         """测试空数据时回退到模拟数据"""
-        # 模拟 yf.download 返回空DataFrame
-        empty_df = pd.DataFrame()
-        
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = empty_df
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            # 调用被测方法
-            result = stock_chart.get_minute_data('600000', 1)
-            
-            # 验证结果
-            assert isinstance(result, pd.DataFrame)
-            mock_download.assert_called_once()
-            mock_generate.assert_called_once_with('600000', 1)
-    
-    def test_get_minute_data_download_exception_fallback(self):
-        """测试下载异常时回退到模拟数据"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.side_effect = Exception("Network error")
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            # 调用被测方法
-            result = stock_chart.get_minute_data('600000', 1)
-            
-            # 验证结果
-            assert isinstance(result, pd.DataFrame)
-            mock_download.assert_called_once()
-            mock_generate.assert_called_once_with('600000', 1)
-    
-    def test_get_minute_data_general_exception_fallback(self):
+        mock_get.return_value = empty_response
+        mock_quotes.return_value = {}
+        mock_generate.return_value = mock_df
+        
+        # 调用被测方法
+        result = stock_chart.get_minute_data('600000', 1)
+        
+        # 验证结果
+        assert result is mock_df
+        mock_get.assert_called_once()
+        mock_generate.assert_called_once_with('600000', 1, None)
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_download_exception_fallback(self, mock_get, mock_quotes, mock_generate, mock_df):
+        """测试请求异常时回退到模拟数据，并以实时价格作为模拟数据的基准价"""
+        mock_get.side_effect = requests.ConnectionError("Network error")
+        mock_quotes.return_value = {'600000': {'f12': '600000', 'f43': 10.5}}
+        mock_generate.return_value = mock_df
+        
+        # 调用被测方法
+        result = stock_chart.get_minute_data('600000', 1)
+        
+        # 验证结果
+        assert result is mock_df
+        mock_get.assert_called_once()
+        mock_quotes.assert_called_once_with([('1', '600000')])
+        mock_generate.assert_called_once_with('600000', 1, 10.5)
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_general_exception_fallback(self, mock_get, mock_quotes, mock_generate, mock_df):
         """测试通用异常时回退到模拟数据"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            # 模拟外层try块中的异常
-            def mock_download_side_effect(*args, **kwargs):
-                raise ValueError("Unexpected error")
-            
-            mock_download.side_effect = mock_download_side_effect
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            # 调用被测方法
-            result = stock_chart.get_minute_data('600000', 1)
-            
-            # 验证结果
-            assert isinstance(result, pd.DataFrame)
-            mock_generate.assert_called_once_with('600000', 1)
-    
-    def test_get_minute_data_symbol_format_conversion(self):
-        """测试股票代码格式转换逻辑"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = pd.DataFrame()
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            # 测试上证股票代码格式转换
-            stock_chart.get_minute_data('600000', 1)
-            call_args = mock_download.call_args[0][0]
-            assert call_args == '600000.SS'
-            
-            # 测试深证股票代码格式转换
-            stock_chart.get_minute_data('000001', 1)
-            call_args = mock_download.call_args[0][0]
-            assert call_args == '000001.SZ'
-            
-            # 测试创业板股票代码格式转换
-            stock_chart.get_minute_data('300001', 1)
-            call_args = mock_download.call_args[0][0]
-            assert call_args == '300001.SZ'
-    
-    def test_get_minute_data_days_parameter(self):
-        """测试days参数的不同取值"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = pd.DataFrame()
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            # 测试默认days值
-            stock_chart.get_minute_data('600000')
-            call_kwargs = mock_download.call_args[1]
-            start_time = call_kwargs['start']
-            end_time = call_kwargs['end']
-            time_delta = end_time - start_time
-            assert time_delta.days == 1
-            
-            # 测试自定义days值
-            stock_chart.get_minute_data('600000', 5)
-            call_kwargs = mock_download.call_args[1]
-            start_time = call_kwargs['start']
-            end_time = call_kwargs['end']
-            time_delta = end_time - start_time
-            assert time_delta.days == 5
-    
-    def test_get_minute_data_edge_cases(self):
+        
+        # 模拟响应内容无法解析；需要修改响应的行为，不使用共用的响应
+        mock_get.return_value = kline_response(KLINES)
+        mock_get.return_value.json.side_effect = ValueError("Unexpected error")
+        mock_quotes.side_effect = ValueError("Unexpected error")
+        mock_generate.return_value = mock_df
+        
+        # 调用被测方法
+        result = stock_chart.get_minute_data('600000', 1)
+        
+        # 验证结果
+        assert result is mock_df
+        mock_generate.assert_called_once_with('600000', 1, None)
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_symbol_format_conversion(self, mock_get, mock_quotes, mock_generate, mock_df, empty_response):
+        """测试股票代码转换为东方财富网的市场代码"""
+        mock_get.return_value = empty_response
+        mock_quotes.return_value = {}
+        mock_generate.return_value = mock_df
+        
+        # 测试上证股票代码格式转换
+        stock_chart.get_minute_data('600000', 1)
+        _, params, _ = request_params(mock_get)
+        assert params['secid'] == '1.600000'
+        
+        # 测试深证股票代码格式转换
+        stock_chart.get_minute_data('000001', 1)
+        _, params, _ = request_params(mock_get)
+        assert params['secid'] == '0.000001'
+        
+        # 测试港股代码格式转换
+        stock_chart.get_minute_data('00700', 1)
+        _, params, _ = request_params(mock_get)
+        assert params['secid'] == '116.00700'
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_days_parameter(self, mock_get, mock_quotes, mock_generate, mock_df, empty_response):
+        """测试days参数决定请求的时间范围"""
+        mock_get.return_value = empty_response
+        mock_quotes.return_value = {}
+        mock_generate.return_value = mock_df
+        
+        # 测试默认days值
+        stock_chart.get_minute_data('600000')
+        _, params, _ = request_params(mock_get)
+        start_time = datetime.datetime.strptime(params['beg'], '%Y%m%d%H%M%S')
+        end_time = datetime.datetime.strptime(params['end'], '%Y%m%d%H%M%S')
+        assert (end_time - start_time).days == 1
+        
+        # 测试自定义days值
+        stock_chart.get_minute_data('600000', 5)
+        _, params, _ = request_params(mock_get)
+        start_time = datetime.datetime.strptime(params['beg'], '%Y%m%d%H%M%S')
+        end_time = datetime.datetime.strptime(params['end'], '%Y%m%d%H%M%S')
+        assert (end_time - start_time).days == 5
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_edge_cases(self, mock_get, mock_quotes, mock_generate, mock_df, empty_response):
         """测试边界情况"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = pd.DataFrame()
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            # 测试days=0（边界值）
-            result = stock_chart.get_minute_data('600000', 0)
-            assert isinstance(result, pd.DataFrame)
-            
-            # 测试days为浮点数
-            result = stock_chart.get_minute_data('600000', 0.5)
-            assert isinstance(result, pd.DataFrame)
-            
-            # 测试空股票代码
-            result = stock_chart.get_minute_data('', 1)
-            assert isinstance(result, pd.DataFrame)
-    
-    def test_get_minute_data_output_structure(self):
+        mock_get.return_value = empty_response
+        mock_quotes.return_value = {}
+        mock_generate.return_value = mock_df
+        
+        # 测试days=0（边界值）
+        result = stock_chart.get_minute_data('600000', 0)
+        assert isinstance(result, pd.DataFrame)
+        
+        # 测试days为浮点数
+        result = stock_chart.get_minute_data('600000', 0.5)
+        assert isinstance(result, pd.DataFrame)
+        
+        # 测试空股票代码
+        result = stock_chart.get_minute_data('', 1)
+        assert isinstance(result, pd.DataFrame)
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_output_structure(self, mock_get, mock_quotes, mock_generate, klines_response):
         """测试输出数据结构"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            # 模拟返回标准结构的数据
-            mock_data = pd.DataFrame({
-                'open': [10.0, 10.1, 10.2],
-                'high': [10.2, 10.3, 10.4],
-                'low': [9.8, 9.9, 10.0],
-                'close': [10.1, 10.2, 10.3],
-                'volume': [1000, 2000, 3000]
-            }, index=pd.date_range('2023-01-01', periods=3, freq='1min'))
-            
-            mock_download.return_value = mock_data
-            mock_generate.return_value = mock_data
-            
-            result = stock_chart.get_minute_data('600000', 1)
-            
-            # 验证数据结构
-            assert isinstance(result, pd.DataFrame)
-            assert not result.empty
-            assert all(col in result.columns for col in ['open', 'high', 'low', 'close', 'volume'])
-            assert isinstance(result.index, pd.DatetimeIndex)
-    
-    def test_get_minute_data_yfinance_call_parameters(self):
-        """测试yfinance调用参数"""
-        with patch('yfinance.download') as mock_download, \
-             patch('stock_chart.generate_simulation_data') as mock_generate:
-            
-            mock_download.return_value = pd.DataFrame()
-            mock_generate.return_value = pd.DataFrame({
-                'open': [10.0], 'high': [10.1], 'low': [9.9], 'close': [10.0], 'volume': [1000]
-            })
-            
-            stock_chart.get_minute_data('600000', 2)
-            
-            # 验证yfinance调用参数
-            mock_download.assert_called_once()
-            call_args = mock_download.call_args
-            
-            # 验证位置参数
-            assert call_args[0][0] == '600000.SS'
-            
-            # 验证关键字参数
-            assert 'start' in call_args[1]
-            assert 'end' in call_args[1]
-            assert call_args[1]['interval'] == '1d'
-            assert call_args[1]['auto_adjust'] is True
+        mock_get.return_value = klines_response
+        
+        result = stock_chart.get_minute_data('600000', 1)
+        
+        # 验证数据结构
+        assert isinstance(result, pd.DataFrame)
+        assert list(result.columns) == ['open', 'close', 'high', 'low', 'volume']
+        assert isinstance(result.index, pd.DatetimeIndex)
+        assert result['close'].tolist() == [np.float32(10.1), np.float32(10.2)]
+        assert result['volume'].tolist() == [1000, 2000]
+
+    @patch('stock_chart.generate_simulation_data', autospec=True)
+    @patch('stock_chart.fetch_quotes', autospec=True)
+    @patch('stock_chart.session.get', autospec=True)
+    def test_get_minute_data_request_parameters(self, mock_get, mock_quotes, mock_generate, mock_df, empty_response):
+        """测试东方财富网K线接口的请求参数"""
+        mock_get.return_value = empty_response
+        mock_quotes.return_value = {}
+        mock_generate.return_value = mock_df
+        
+        stock_chart.get_minute_data('600000', 2)
+        
+        # 验证请求参数
+        mock_get.assert_called_once()
+        url, params, kwargs = request_params(mock_get)
+        
+        # 验证请求地址
+        assert (url.netloc, url.path) == ('push2his.eastmoney.com', '/api/qt/stock/kline/get')
+        assert params['secid'] == '1.600000'
+        assert params['klt'] == '1'
+        assert 'beg' in params
+        assert 'end' in params
+        
+        # 验证关键字参数
+        assert kwargs['timeout'] == stock_chart.REQUEST_TIMEOUT
+
+def make_pens(ranges):
+    """按(最低价, 最高价)列表构造首尾相接的笔"""
+    times = pd.date_range('2024-01-02 09:30', periods=len(ranges) + 1, freq='1min')
+    pens = []
+    for k, (low, high) in enumerate(ranges):
+        pens.append({
+            'start': (times[k], low, 'bottom'),
+            'end': (times[k + 1], high, 'top'),
+            'direction': 'up',
+            'high': high,
+            'low': low
+        })
+    return pens
+
+
+def reference_frame():
+    """由正弦波叠加生成的确定性1分钟K线，不依赖随机数"""
+    i = np.arange(120)
+    close = np.round(10 + 2 * np.sin(i / 6) + 0.8 * np.sin(i / 1.7) + 0.3 * np.cos(i / 0.9), 2)
+    return pd.DataFrame({'high': close + 0.05, 'low': close - 0.05},
+                        index=pd.date_range('2024-01-02 09:30', periods=len(i), freq='1min'))
+
+
+class TestReferenceSeries:
+    """测试分型、笔、中枢和K线实体与改写前的逐行实现在固定数据上的结果一致"""
+
+    def test_fractals_and_pens(self):
+        """测试分型位置和笔端点"""
+        df = stock_chart.identify_fractals(reference_frame())
+        assert np.flatnonzero(df['top_fractal']).tolist() == [5, 12, 23, 35, 45, 56, 68, 79, 86, 97, 113]
+        assert np.flatnonzero(df['bottom_fractal']).tolist() == [8, 20, 30, 37, 53, 64, 71, 82, 94, 104, 115]
+
+        # 笔首尾相接，按K线位置列出所有端点
+        pens = stock_chart.identify_pens(df)
+        position = {t: k for k, t in enumerate(df.index)}
+        endpoints = [position[pen['start'][0]] for pen in pens] + [position[pens[-1]['end'][0]]]
+        assert endpoints == [5, 8, 12, 20, 23, 30, 35, 37, 45, 53, 56, 64,
+                             68, 71, 79, 82, 86, 94, 97, 104, 113, 115]
+
+    def test_zhongshu(self):
+        """测试中枢：改写前的实现还会输出以已并入中枢的笔为起点的中枢，
+        即(2, 7)、(4, 7)、(5, 7)、(7, 10)、(10, 13)、(13, 16)、(16, 20)和(18, 20)，其余结果相同"""
+        df = stock_chart.identify_fractals(reference_frame())
+        zhongshus = stock_chart.identify_zhongshu(stock_chart.identify_pens(df))
+        assert [(zs['pens'][0], zs['pens'][-1]) for zs in zhongshus] == [
+            (0, 2), (3, 7), (8, 10), (11, 13), (14, 16), (17, 20)]
+        assert [(round(zs['high'], 2), round(zs['low'], 2)) for zs in zhongshus] == [
+            (11.91, 10.84), (9.7, 9.61), (11.28, 10.67), (9.06, 7.89), (11.96, 10.72), (9.73, 9.62)]
+
+    def test_compute_bars(self):
+        """测试K线实体：底部为开盘价和收盘价的较小值，平盘按阳线处理"""
+        opens = np.array([10.0, 10.5, 10.2, 9.8])
+        closes = np.array([10.4, 10.1, 10.2, 9.9])
+        bottoms, heights, up = stock_chart._compute_bars(opens, closes)
+        assert bottoms.tolist() == [10.0, 10.1, 10.2, 9.8]
+        assert np.allclose(heights, [0.4, 0.4, 0.0, 0.1])
+        assert up.tolist() == [True, False, True, True]
+        assert stock_chart.BAR_COLORS[up.view(np.uint8)].tolist() == ['red', 'green', 'red', 'red']
+
+
+class TestIdentifyFractalsAndPens:
+    """测试分型和笔识别"""
+
+    def test_small_reference_case(self):
+        """测试分型位置和笔端点与手工推算结果一致"""
+        high = np.array([1.0, 2.0, 3.0, 2.0, 1.0, 2.0, 3.0, 4.0, 3.0, 2.0])
+        index = pd.date_range('2024-01-02 09:30', periods=len(high), freq='1min')
+        df = pd.DataFrame({'high': high, 'low': high - 0.5}, index=index)
+
+        df = stock_chart.identify_fractals(df)
+        assert np.flatnonzero(df['top_fractal']).tolist() == [2, 7]
+        assert np.flatnonzero(df['bottom_fractal']).tolist() == [4]
+
+        pens = stock_chart.identify_pens(df)
+        assert [(pen['start'], pen['end'], pen['direction'], pen['high'], pen['low']) for pen in pens] == [
+            ((index[2], 3.0, 'top'), (index[4], 0.5, 'bottom'), 'down', 3.0, 0.5),
+            ((index[4], 0.5, 'bottom'), (index[7], 4.0, 'top'), 'up', 4.0, 0.5),
+        ]
+
+    def test_pens_skip_same_type_and_flat_fractals(self):
+        """测试同类型分型和价格相同的分型不构成笔"""
+        index = pd.date_range('2024-01-02 09:30', periods=5, freq='1min')
+        df = pd.DataFrame({
+            'high': [3.0, 4.0, 3.0, 2.0, 5.0],
+            'low': [1.0, 1.0, 2.0, 1.0, 1.0],
+            'top_fractal': [True, True, False, True, True],
+            'bottom_fractal': [False, False, True, False, False],
+        }, index=index)
+
+        # 第2个分型与起点同为顶分型被跳过，第4个顶分型价格与端点底分型相同被跳过
+        pens = stock_chart.identify_pens(df)
+        assert [(pen['start'][0], pen['end'][0]) for pen in pens] == [
+            (index[0], index[2]), (index[2], index[4])]
+
+
+class TestIdentifyZhongshu:
+    """测试中枢识别"""
+
+    def test_absorbed_pens_do_not_start_new_zhongshu(self):
+        """测试已并入中枢的笔不再作为新中枢的起点，重叠和嵌套的中枢不再输出"""
+        pens = make_pens([(10.0, 12.0), (10.5, 12.5), (10.2, 11.8), (10.4, 11.6),
+                          (13.0, 15.0), (13.5, 15.5), (14.0, 16.0)])
+
+        # 第1~3笔本身也重叠，但它们已并入第一个中枢
+        zhongshus = stock_chart.identify_zhongshu(pens)
+        assert [zs['pens'] for zs in zhongshus] == [[0, 1, 2, 3], [4, 5, 6]]
+        assert [(zs['high'], zs['low']) for zs in zhongshus] == [(11.6, 10.5), (15.0, 14.0)]
+        assert zhongshus[0]['start'] == pens[0]['start'][0]
+        assert zhongshus[0]['end'] == pens[3]['end'][0]
+        assert zhongshus[1]['start'] == pens[4]['start'][0]
+        assert zhongshus[1]['end'] == pens[6]['end'][0]
+
+    def test_fewer_than_three_pens(self):
+        """测试笔数不足3个时没有中枢"""
+        assert stock_chart.identify_zhongshu(make_pens([(10.0, 12.0), (10.5, 12.5)])) == []
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file